@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from together_bot.models import Base
+from together_bot.utils.db_toolkit import Session
+
+
+# 각 테스트마다 인메모리 DB를 새로 만들고 봇이 쓰는 Session을 연결해서 테스트 함수에 넘김.
+# engine은 테스트를 실행하는 event loop 안에서 만들어야 하므로 테스트 함수를 받아서 실행함.
+@pytest.fixture
+def run_with_db():
+    def run(test):
+        async def main():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            Session.configure(bind=engine)
+            try:
+                await test(Session)
+            finally:
+                Session.configure(bind=None)
+                await engine.dispose()
+
+        asyncio.run(main())
+
+    return run
@@ -0,0 +1,68 @@
+import datetime
+
+from sqlalchemy import select
+
+import together_bot.models.fword_detection as fword_detection
+
+DETECTED_AT = datetime.datetime(2022, 1, 1)
+
+
+async def save_all(Session, detections: list[tuple[int, int, str]]):
+    async with Session() as session:
+        await fword_detection.save_all(
+            session,
+            [
+                fword_detection.to_mapping(discord_id, guild_id, word, DETECTED_AT)
+                for discord_id, guild_id, word in detections
+            ],
+        )
+        await session.commit()
+
+
+def test_save_all(run_with_db):
+    async def test(Session):
+        # given
+        # when
+        await save_all(Session, [(1, 10, "ㅂㅅ"), (1, 10, "ㅅㅂ")])
+        # then
+        async with Session() as session:
+            result = (
+                await session.execute(select(fword_detection.FwordDetection))
+            ).scalars()
+            result = [
+                (row.discord_id, row.guild_id, row.word, row.detected_at)
+                for row in result
+            ]
+        assert result == [(1, 10, "ㅂㅅ", DETECTED_AT), (1, 10, "ㅅㅂ", DETECTED_AT)]
+
+    run_with_db(test)
+
+
+def test_count_by_user(run_with_db):
+    async def test(Session):
+        # given
+        await save_all(
+            Session, [(1, 10, "ㅂㅅ"), (2, 10, "ㅂㅅ"), (2, 10, "ㅅㅂ"), (3, 20, "ㅂㅅ")]
+        )
+        # when
+        async with Session() as session:
+            result = await fword_detection.count_by_user(session, 10)
+        # then
+        assert result == [(2, 2), (1, 1)]
+
+    run_with_db(test)
+
+
+def test_count_by_word(run_with_db):
+    async def test(Session):
+        # given
+        await save_all(
+            Session, [(1, 10, "ㅂㅅ"), (1, 10, "ㅅㅂ"), (1, 10, "ㅅㅂ"), (1, 20, "ㅂㅅ")]
+        )
+        # when
+        async with Session() as session:
+            result = await fword_detection.count_by_word(session, 1, 10, limit=1)
+        # then
+        assert result == [("ㅅㅂ", 2)]
+
+    run_with_db(test)
@@ -0,0 +1,33 @@
+import datetime
+
+import together_bot.models.job_run as job_run
+
+
+def test_last_run_is_none_before_save(run_with_db):
+    async def test(Session):
+        async with Session() as session:
+            assert await job_run.find_last_run(session, "job") is None
+
+    run_with_db(test)
+
+
+def test_save_last_run_overwrites(run_with_db):
+    async def test(Session):
+        # given
+        kst = datetime.timezone(datetime.timedelta(hours=9))
+        first = datetime.datetime(2022, 1, 1, 0, 1, tzinfo=kst)
+        second = datetime.datetime(2022, 1, 2, 0, 1, tzinfo=kst)
+        # when
+        async with Session() as session:
+            await job_run.save_last_run(session, "job", first)
+            await session.commit()
+        async with Session() as session:
+            await job_run.save_last_run(session, "job", second)
+            await session.commit()
+        # then
+        async with Session() as session:
+            last_run = await job_run.find_last_run(session, "job")
+        assert last_run == second
+        assert last_run.tzinfo == datetime.timezone.utc
+
+    run_with_db(test)
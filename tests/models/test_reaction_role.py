@@ -0,0 +1,46 @@
+import datetime
+
+import together_bot.models.reaction_role as reaction_role
+
+NOW = datetime.datetime(2022, 1, 1)
+
+
+async def save(Session, message_id: int, expires_at: datetime.datetime):
+    async with Session() as session:
+        reaction_role.save(session, message_id, 10, 100, expires_at)
+        await session.commit()
+
+
+def test_find_unexpired(run_with_db):
+    async def test(Session):
+        # given
+        await save(Session, 1, NOW - datetime.timedelta(minutes=1))
+        await save(Session, 2, NOW)
+        await save(Session, 3, NOW + datetime.timedelta(minutes=1))
+        # when
+        async with Session() as session:
+            result = await reaction_role.find_unexpired(session, NOW)
+        # then
+        assert [row.message_id for row in result] == [3]
+        assert (result[0].guild_id, result[0].role_id) == (10, 100)
+
+    run_with_db(test)
+
+
+def test_delete_expired(run_with_db):
+    async def test(Session):
+        # given
+        await save(Session, 1, NOW - datetime.timedelta(minutes=1))
+        await save(Session, 2, NOW + datetime.timedelta(minutes=1))
+        # when
+        async with Session() as session:
+            await reaction_role.delete_expired(session, NOW)
+            await session.commit()
+        # then
+        async with Session() as session:
+            result = await reaction_role.find_unexpired(
+                session, NOW - datetime.timedelta(days=1)
+            )
+        assert [row.message_id for row in result] == [2]
+
+    run_with_db(test)
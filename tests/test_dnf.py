@@ -0,0 +1,138 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+from aiohttp import test_utils, web
+
+from together_bot.dnf import _GRADE_ITEM_ID, _GRADE_JOB, Dnf, fetch_grade
+from together_bot.models import dnf_grade_channel, job_run
+from together_bot.utils.http import HttpClient
+from together_bot.utils.scheduler import utcnow
+
+
+# 던파 API의 상점 정보처럼 등급이 바뀌었을 때만 새 etag로 응답하는 서버
+def make_dnf_app(state: dict):
+    async def shop(request: web.Request):
+        assert request.query["apikey"] == "key"
+        etag = f'"{state["grade"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(
+            {"itemGradeName": state["grade"]}, headers={"ETag": etag}
+        )
+
+    app = web.Application()
+    app.router.add_get(f"/df/items/{_GRADE_ITEM_ID}/shop", shop)
+    return app
+
+
+def test_fetch_grade_uses_conditional_request():
+    # given
+    state = {"grade": "최하급"}
+
+    async def fetch_three_times():
+        client = HttpClient()
+        async with test_utils.TestServer(make_dnf_app(state)) as server:
+            api_base = str(server.make_url("/df"))
+            try:
+                first = await fetch_grade(client, "key", api_base)
+                second = await fetch_grade(client, "key", api_base)
+                state["grade"] = "최상급"
+                third = await fetch_grade(client, "key", api_base)
+            finally:
+                await client.close()
+        return first, second, third
+
+    # when
+    first, second, third = asyncio.run(fetch_three_times())
+    # then
+    assert first.json()["itemGradeName"] == "최하급" and not first.from_cache
+    assert second.from_cache and second.headers["ETag"] == first.headers["ETag"]
+    assert third.json()["itemGradeName"] == "최상급" and not third.from_cache
+
+
+def http_error(error_type, status: int):
+    return error_type(SimpleNamespace(status=status, reason="error"), "error")
+
+
+def make_bot(channels: dict, fetched: dict, shard_ids=None):
+    async def fetch_channel(channel_id: int):
+        result = fetched[channel_id]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def wait_until_ready():
+        pass
+
+    return SimpleNamespace(
+        get_channel=channels.get,
+        fetch_channel=fetch_channel,
+        wait_until_ready=wait_until_ready,
+        shard_ids=shard_ids,
+    )
+
+
+def make_channel(channel_id: int, sent: list, unavailable: bool = False):
+    async def send(content: str):
+        sent.append(channel_id)
+
+    guild = SimpleNamespace(unavailable=unavailable)
+    return SimpleNamespace(id=channel_id, guild=guild, send=send)
+
+
+# shard_ids가 있으면 다른 process가 연결한 shard의 채널일 수 있으므로 보내지 않음.
+@pytest.mark.parametrize("shard_ids, expected", [(None, [1, 2]), ([0], [])])
+def test_uncached_channels_of_other_shards_are_skipped(
+    run_with_db, shard_ids, expected
+):
+    async def test(Session):
+        # given
+        cog = Dnf(make_bot({}, {}, shard_ids))
+        cog.channel_ids.add(1)
+        cog.channel_ids.add(2)
+        # when
+        channel_ids = list(cog._Dnf__subscribed_channel_ids())
+        await cog.channel_ids.stop()
+        # then
+        async with Session() as session:
+            saved = await dnf_grade_channel.find_all_discord_ids(session)
+        assert sorted(channel_ids) == expected
+        assert sorted(saved) == [1, 2]
+
+    run_with_db(test)
+
+
+def test_announce_unsubscribes_only_missing_channels(run_with_db):
+    async def test(Session):
+        # given
+        sent = []
+        bot = make_bot(
+            {1: make_channel(1, sent)},
+            {
+                # 장애나 시작 직후라서 guild를 쓸 수 없는 채널
+                2: make_channel(2, sent, unavailable=True),
+                3: make_channel(3, sent),
+                4: http_error(discord.NotFound, 404),
+                5: http_error(discord.Forbidden, 403),
+            },
+        )
+        cog = Dnf(bot)
+        for channel_id in range(1, 6):
+            cog.channel_ids.add(channel_id)
+        await cog.channel_ids.flush()
+        cog.grade_updated_at = utcnow()
+        cog.prepared.set()
+        # when
+        await cog._Dnf__announce_grade()
+        await cog.channel_ids.stop()
+        # then
+        async with Session() as session:
+            saved = await dnf_grade_channel.find_all_discord_ids(session)
+            last_run = await job_run.find_last_run(session, _GRADE_JOB)
+        assert sorted(sent) == [1, 3]
+        assert sorted(saved) == [1, 2, 3]
+        assert last_run is not None
+
+    run_with_db(test)
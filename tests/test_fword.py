@@ -1,12 +1,31 @@
+import asyncio
+import datetime
+import unicodedata
+from array import array
+from types import SimpleNamespace
+
 import pytest
+from sqlalchemy import func, select
 
+import together_bot.models.fword_detection as fword_detection
 from together_bot.fword import (
+    FWORD_INDEX_PATH,
     FWORD_LIST_PATH,
+    AhoCorasick,
+    DetectionRecorder,
+    DoubleArrayTrie,
+    Prefilter,
+    ScanPool,
     Trie,
     TrieNode,
+    build_search_tree,
     get_detected_fwords,
+    load_search_tree,
+    normalize,
+    scan_many,
     summarize_fwords,
 )
+from together_bot.utils.db_toolkit import Session
 
 
 # Helper function
@@ -43,6 +62,12 @@ def trie():
     return Trie()
 
 
+# find_all_occurrences()는 모든 탐색 엔진이 같은 결과를 내야 함.
+@pytest.fixture(params=[Trie, AhoCorasick, DoubleArrayTrie])
+def matcher(request):
+    return request.param()
+
+
 @pytest.fixture
 def trie_with_item(trie):
     trie.insert("test")
@@ -212,59 +237,59 @@ def test_insert_family2(trie):
 
 
 # 1.c. find_all_occurrences test
-def test_find_all(trie):
+def test_find_all(matcher):
     # given
-    trie.insert("test")
+    matcher.insert("test")
     # when
-    actual = trie.find_all_occurrences("This is test sentence")
+    actual = matcher.find_all_occurrences("This is test sentence")
     # then
     expected = [range(8, 12)]
     assert all_match(expected, actual)
 
 
-def test_find_all2(trie):
+def test_find_all2(matcher):
     # given
-    trie.insert("test")
-    trie.insert("ent")
+    matcher.insert("test")
+    matcher.insert("ent")
     # when
-    actual = trie.find_all_occurrences("This is test sentence")
+    actual = matcher.find_all_occurrences("This is test sentence")
     # then
     expected = [range(8, 12), range(14, 17)]
     assert all_match(expected, actual)
 
 
-def test_find_all_longest_word(trie):
+def test_find_all_longest_word(matcher):
     # given
-    trie.insert("test")
-    trie.insert("testword")
+    matcher.insert("test")
+    matcher.insert("testword")
     # when
-    actual = trie.find_all_occurrences("testword is here")
+    actual = matcher.find_all_occurrences("testword is here")
     # then
     expected = [range(0, 8)]
     assert all_match(expected, actual)
 
 
-def test_find_all_tailing_word(trie):
+def test_find_all_tailing_word(matcher):
     # given
-    trie.insert("test")
+    matcher.insert("test")
     # when
-    actual = trie.find_all_occurrences("This is test")
+    actual = matcher.find_all_occurrences("This is test")
     # then
     expected = [range(8, 12)]
     assert all_match(expected, actual)
 
 
-def test_find_all_incomplete_word(trie):
+def test_find_all_incomplete_word(matcher):
     # given
-    trie.insert("thinking")
+    matcher.insert("thinking")
     # when
-    actual = trie.find_all_occurrences("logical think")
+    actual = matcher.find_all_occurrences("logical think")
     # then
     expected = []
     assert all_match(expected, actual)
 
 
-def test_ignore_incorrect_but_found_first(trie):
+def test_ignore_incorrect_but_found_first(matcher):
     """
     앞부분이 먼저 검색되지만 뒷부분이 틀린 단어를 무시하고 올바른 단어를 찾을 수 있는지 확인함.
     sentry와 ent라는 단어가 trie에 있을 때,
@@ -272,15 +297,514 @@ def test_ignore_incorrect_but_found_first(trie):
     하지만 sentry 는 포함되지 않는 단어이기 때문에 무시하고 s 뒤에 ent를 찾을 수 있어야 함.
     """
     # given
-    trie.insert("sentry")
-    trie.insert("ent")
+    matcher.insert("sentry")
+    matcher.insert("ent")
     # when
-    actual = trie.find_all_occurrences("this sentence")
+    actual = matcher.find_all_occurrences("this sentence")
     # then
     expected = [range(6, 9)]
     assert all_match(expected, actual)
 
 
+def test_automaton_finds_shorter_word_when_longer_is_incomplete():
+    """
+    te와 test가 있을 때, tesla에서 test는 실패하지만 te는 찾아야 함.
+    기존 Trie는 더 긴 단어가 실패하면 짧은 단어를 다시 찾지 않음.
+    """
+    # given
+    automaton = AhoCorasick()
+    automaton.insert("te")
+    automaton.insert("test")
+    # when
+    actual = automaton.find_all_occurrences("tesla")
+    # then
+    assert actual == [range(0, 2)]
+
+
+def test_find_all_overlapped_words(matcher):
+    # given
+    matcher.insert("abc")
+    matcher.insert("bcd")
+    matcher.insert("cd")
+    # when
+    actual = matcher.find_all_occurrences("abcd bcd")
+    # then
+    assert actual == [range(0, 3), range(5, 8)]
+
+
+def test_find_all_casefold(matcher):
+    # given
+    matcher.insert("test")
+    # when
+    actual = matcher.find_all_occurrences("TeST")
+    # then
+    assert actual == [range(0, 4)]
+
+
+# 1.d. DoubleArrayTrie 테스트
+def test_double_array_contains():
+    # given
+    double_array = DoubleArrayTrie()
+    for word in ["te", "test", "testword", "word"]:
+        double_array.insert(word)
+    # when
+    # then
+    assert all(word in double_array for word in ["te", "test", "testword", "word"])
+    assert not any(word in double_array for word in ["", "t", "tes", "wor", 1])
+
+
+def test_double_array_insert_after_search():
+    # given
+    double_array = DoubleArrayTrie()
+    double_array.insert("test")
+    assert double_array.find_all_occurrences("test ent") == [range(0, 4)]
+    # when
+    double_array.insert("ent")
+    # then
+    assert double_array.find_all_occurrences("test ent") == [range(0, 4), range(5, 8)]
+
+
+def test_double_array_smaller_than_trie():
+    # given
+    # when
+    # then
+    assert real_double_array.memory_usage() < real_trie.memory_usage()
+
+
+# 1.e. 미리 만든 double array 파일 테스트
+@pytest.fixture
+def fword_csv(tmp_path):
+    file_path = tmp_path / "fword_list.csv"
+    file_path.write_text("test\nent\ntestword\n", encoding="utf-8")
+    return file_path
+
+
+def test_index_round_trip(tmp_path, fword_csv):
+    # given
+    index_path = tmp_path / "fword_list.idx"
+    DoubleArrayTrie.from_file(fword_csv).save(index_path, fword_csv)
+    # when
+    double_array = DoubleArrayTrie.from_index(index_path, fword_csv)
+    # then
+    assert isinstance(double_array.check, memoryview)
+    assert "testword" in double_array
+    assert double_array.find_all_occurrences("testword sentence") == [
+        range(0, 8),
+        range(10, 13),
+    ]
+
+
+def test_index_ignored_when_csv_changed(tmp_path, fword_csv):
+    # given
+    index_path = tmp_path / "fword_list.idx"
+    DoubleArrayTrie.from_file(fword_csv).save(index_path, fword_csv)
+    fword_csv.write_text("test\nent\ntestword\nword\n", encoding="utf-8")
+    # when
+    with pytest.raises(ValueError):
+        DoubleArrayTrie.from_index(index_path, fword_csv)
+    double_array = load_search_tree(fword_csv, index_path, "double_array")
+    # then
+    assert isinstance(double_array.check, array)
+    assert "word" in double_array
+
+
+def test_index_save_keeps_mapped_reader(tmp_path, fword_csv):
+    # given
+    index_path = tmp_path / "fword_list.idx"
+    DoubleArrayTrie.from_file(fword_csv).save(index_path, fword_csv)
+    reader = DoubleArrayTrie.from_index(index_path, fword_csv)
+    old_inode = index_path.stat().st_ino
+    # when
+    DoubleArrayTrie.from_file(fword_csv).save(index_path, fword_csv)
+    # then
+    assert index_path.stat().st_ino != old_inode
+    assert list(tmp_path.glob("*.tmp")) == []
+    assert reader.find_all_occurrences("testword") == [range(0, 8)]
+
+
+@pytest.mark.parametrize("size_change", [-1, -40, 4])
+def test_index_with_wrong_size_is_ignored(tmp_path, fword_csv, size_change):
+    # given
+    index_path = tmp_path / "fword_list.idx"
+    DoubleArrayTrie.from_file(fword_csv).save(index_path, fword_csv)
+    data = index_path.read_bytes()
+    if size_change < 0:
+        index_path.write_bytes(data[:size_change])
+    else:
+        index_path.write_bytes(data + b"\0" * size_change)
+    # when
+    with pytest.raises(ValueError):
+        DoubleArrayTrie.from_index(index_path, fword_csv)
+    double_array = load_search_tree(fword_csv, index_path, "double_array")
+    # then
+    assert isinstance(double_array.check, array)
+    assert double_array.find_all_occurrences("testword") == [range(0, 8)]
+
+
+def test_load_without_index(tmp_path, fword_csv):
+    # given
+    index_path = tmp_path / "missing.idx"
+    # when
+    automaton = load_search_tree(fword_csv, index_path, "aho_corasick")
+    # then
+    assert isinstance(automaton, AhoCorasick)
+    assert "ent" in automaton
+
+
+# 1.f. Prefilter 테스트
+@pytest.mark.parametrize("sentence", ["", "t", "hello world", "tset", "a e"])
+def test_prefilter_rejects(sentence):
+    # given
+    prefilter = Prefilter(["test", "ent"])
+    # when
+    actual = prefilter.may_match(sentence)
+    # then
+    assert not actual
+    assert prefilter.rejected == 1 and prefilter.passed == 0
+
+
+@pytest.mark.parametrize("sentence", ["this is test", "sentence", "e"])
+def test_prefilter_passes(sentence):
+    # given
+    prefilter = Prefilter(["test", "ent", "e"])
+    # when
+    actual = prefilter.may_match(sentence)
+    # then
+    assert actual
+    assert prefilter.rejected == 0 and prefilter.passed == 1
+
+
+def test_prefilter_never_rejects_detected_sentence():
+    # given
+    prefilter = Prefilter(real_double_array.words())
+    sentences = ["그건 진짜지", "고잉 메리 호로 집합", "ㅂㅅ", "10jil 하네", "hello"]
+    # when
+    # then
+    for sentence in sentences:
+        if real_double_array.find_all_occurrences(sentence):
+            assert prefilter.may_match(sentence)
+
+
+# 1.g. ScanPool 테스트
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+def test_scan_pool_same_result(executor_type):
+    # given
+    sentence = "안녕 ㅂㅅ 하세요 " * 100
+    pool = ScanPool(
+        FWORD_LIST_PATH,
+        FWORD_INDEX_PATH,
+        "double_array",
+        threshold=100,
+        executor_type=executor_type,
+        workers=1,
+        max_pending=1,
+    )
+
+    async def scan_all():
+        return await asyncio.gather(
+            *(pool.find_all_normalized(real_double_array, sentence) for _ in range(3))
+        )
+
+    # when
+    try:
+        actual = asyncio.run(scan_all())
+    finally:
+        pool.shutdown()
+    # then
+    expected = real_double_array.find_all_occurrences(sentence)
+    assert len(expected) == 100
+    assert actual == [expected] * 3
+    assert pool.offloaded == 3 and len(pool.inline_times) == 0
+
+
+def test_scan_pool_uses_reloaded_list(tmp_path, fword_csv):
+    # given
+    sentence = "newword " * 20
+    search_tree, _ = build_search_tree(fword_csv, tmp_path / "none.idx", "double_array")
+    pool = ScanPool(
+        fword_csv, tmp_path / "none.idx", "double_array", threshold=10, workers=1
+    )
+
+    async def scan():
+        return await pool.find_all_normalized(search_tree, sentence)
+
+    try:
+        before = asyncio.run(scan())
+        fword_csv.write_text("newword\n", encoding="utf-8")
+        search_tree, prefilter = build_search_tree(
+            fword_csv, tmp_path / "none.idx", "double_array"
+        )
+        # when
+        pool.shutdown()
+        after = asyncio.run(scan())
+    finally:
+        pool.shutdown()
+    # then
+    assert before == []
+    assert len(after) == 20
+    assert prefilter.word_count == 1
+
+
+# 1.g.2. scan_many() 테스트
+def fake_history(contents: list[tuple[int, str]], bot_id: int = 0):
+    async def history():
+        for author_id, content in contents:
+            author = SimpleNamespace(id=author_id, bot=author_id == bot_id)
+            yield SimpleNamespace(author=author, content=content)
+
+    return history()
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 100])
+def test_scan_many(matcher, batch_size):
+    # given
+    matcher.insert("test")
+    matcher.insert("ent")
+    if hasattr(matcher, "compile"):
+        matcher.compile()
+    messages = fake_history(
+        [(1, "this is test"), (2, "hello"), (0, "bot test"), (2, "sentence"), (1, "x")]
+    )
+
+    async def scan():
+        return [
+            (message.author.id, get_detected_fwords(message.content, occurrences))
+            async for message, occurrences in scan_many(
+                messages, matcher, batch_size=batch_size
+            )
+        ]
+
+    # when
+    actual = asyncio.run(scan())
+    # then
+    assert actual == [(1, {"test"}), (2, {"ent"})]
+
+
+def test_scan_many_counts_every_occurrence(matcher):
+    # given
+    matcher.insert("test")
+    if hasattr(matcher, "compile"):
+        matcher.compile()
+    messages = fake_history([(1, "test and test again"), (2, "test")])
+
+    async def scan():
+        return [
+            (message.author.id, len(occurrences))
+            async for message, occurrences in scan_many(messages, matcher)
+        ]
+
+    # when
+    actual = asyncio.run(scan())
+    # then
+    assert actual == [(1, 2), (2, 1)]
+
+
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+def test_scan_many_with_pool(executor_type):
+    # given
+    contents = [(i % 3 + 1, f"안녕 ㅂㅅ {i}" if i % 2 else "안녕하세요") for i in range(50)]
+    prefilter = Prefilter(real_double_array.words())
+    pool = ScanPool(
+        FWORD_LIST_PATH,
+        FWORD_INDEX_PATH,
+        "double_array",
+        threshold=100,
+        executor_type=executor_type,
+    )
+
+    async def scan():
+        return [
+            (message.author.id, get_detected_fwords(message.content, occurrences))
+            async for message, occurrences in scan_many(
+                fake_history(contents), real_double_array, prefilter, pool, 20
+            )
+        ]
+
+    # when
+    try:
+        actual = asyncio.run(scan())
+    finally:
+        pool.shutdown()
+    # then
+    expected = [(author_id, {"ㅂㅅ"}) for author_id, _ in contents[1::2]]
+    assert actual == expected
+    assert pool.offloaded > 0
+    # 지난 메세지는 실제 대화의 사전 필터 통계에 넣지 않음.
+    assert prefilter.passed == prefilter.rejected == 0
+
+
+# 1.g.3. DetectionRecorder 테스트
+async def count_detections() -> int:
+    async with Session() as session:
+        result = await session.execute(
+            select(func.count(fword_detection.FwordDetection.id))
+        )
+        return result.scalar_one()
+
+
+def test_recorder_flush_when_full(run_with_db):
+    async def test(Session):
+        # given
+        recorder = DetectionRecorder(flush_size=3)
+        detected_at = datetime.datetime(2022, 1, 1)
+        recorder.record(1, 10, ["ㅂㅅ"], detected_at)
+        recorder.record(1, 10, ["ㅂㅅ"], detected_at)
+        assert len(recorder.buffer) == 2
+        # when
+        recorder.record(2, 10, ["ㅅㅂ"], detected_at)
+        # 저장은 create_task로 실행되므로 끝날 때까지 기다림.
+        while recorder.flushed == 0:
+            await asyncio.sleep(0.01)
+        # then
+        assert recorder.buffer == []
+        assert await count_detections() == 3
+
+    run_with_db(test)
+
+
+def test_recorder_stop_saves_buffer(run_with_db):
+    async def test(Session):
+        # given
+        recorder = DetectionRecorder(flush_size=100)
+        recorder.record(1, None, ["ㅂㅅ", "ㅅㅂ"], datetime.datetime(2022, 1, 1))
+        # when
+        await recorder.stop()
+        # then
+        assert await count_detections() == 2
+
+    run_with_db(test)
+
+
+def test_recorder_backs_off_and_drops_oldest_rows(monkeypatch):
+    async def test():
+        # given
+        attempts = 0
+
+        class BrokenSession:
+            async def __aenter__(self):
+                nonlocal attempts
+                attempts += 1
+                raise ConnectionError
+
+            async def __aexit__(self, *exc_info):
+                pass
+
+        monkeypatch.setattr("together_bot.fword.Session", BrokenSession)
+        recorder = DetectionRecorder(flush_size=2, max_buffer=3, retry_delay=60.0)
+        detected_at = datetime.datetime(2022, 1, 1)
+        # when
+        for word in ["a", "b", "c", "d", "e"]:
+            recorder.record(1, 10, [word], detected_at)
+            await asyncio.sleep(0)
+        await recorder.flush()
+        # then
+        # 처음 한 번 실패한 후에는 기다리는 동안 다시 시도하지 않음.
+        assert attempts == 1 and recorder.failures == 1
+        assert [row["word"] for row in recorder.buffer] == ["c", "d", "e"]
+        assert recorder.dropped == 2
+
+    asyncio.run(test())
+
+
+# 1.h. normalize() 테스트
+@pytest.mark.parametrize(
+    "sentence, expected",
+    [
+        ("TeST", "test"),
+        ("ＳＥＸ", "sex"),
+        ("s3x", "sex"),
+        ("455 dollars", "455 dollars"),
+        ("10놈", "10놈"),
+        ("시 발", "시발"),
+        ("s.e.x", "sex"),
+        ("이건 좀 극혐이다.", "이건 좀 극혐이다."),
+        ("시\u200b발", "시발"),
+        (unicodedata.normalize("NFD", "시발 닭"), "시발 닭"),
+        ("ㅅㅂ", "ㅅㅂ"),
+        ("ㅂㅓ", "ㅂㅓ"),
+    ],
+)
+def test_normalize(sentence, expected):
+    # given
+    # when
+    actual = normalize(sentence)
+    # then
+    assert actual.text == expected
+
+
+def test_normalized_range_to_original():
+    # given
+    sentence = "너 진짜 시 발 놈아"
+    matcher = AhoCorasick()
+    matcher.insert("시발")
+    # when
+    actual = matcher.find_all_occurrences(sentence)
+    # then
+    assert actual == [range(5, 8)]
+    assert get_detected_fwords(sentence, actual) == {"시 발"}
+
+
+@pytest.mark.parametrize(
+    "sentence, expected",
+    [
+        ("시 발", "시발"),
+        ("ㅅ.ㅂ", "ㅅㅂ"),
+        # 한 글자씩 띄어 쓴 구간에서 사전의 단어에 해당하는 부분만 합침.
+        ("야 시 발", "야 시발"),
+        ("씨 발 아", "씨발 아"),
+        ("야 시 발 놈아", "야 시발 놈아"),
+        ("시 발 새 끼", "시발 새끼"),
+        ("시 발 야 새 끼", "시발 야 새끼"),
+        # 단어가 아닌 글자가 두 글자 이상 이어지면 평범하게 띄어 쓴 문장으로 봄.
+        ("그 년 도 에", "그 년 도 에"),
+    ],
+)
+def test_normalize_collapses_only_dictionary_words(matcher, sentence, expected):
+    # given
+    for word in ["시발", "씨발", "새끼", "그년", "ㅅㅂ"]:
+        matcher.insert(word)
+    # when
+    actual = normalize(sentence, matcher)
+    # then
+    assert actual.text == expected
+
+
+@pytest.mark.parametrize(
+    "sentence, expected",
+    [
+        ("야 시 발", {"시 발"}),
+        ("씨 발 아", {"씨 발"}),
+        ("시 발 새 끼", {"시 발", "새 끼"}),
+    ],
+)
+def test_spaced_out_word_next_to_letters(matcher, sentence, expected):
+    # given
+    for word in ["시발", "씨발", "새끼"]:
+        matcher.insert(word)
+    # when
+    actual = matcher.find_all_occurrences(sentence)
+    # then
+    assert get_detected_fwords(sentence, actual) == expected
+
+
+def test_spaced_syllables_are_not_fword(real_matcher):
+    # given
+    # when
+    actual = real_matcher.find_all_occurrences("그 년 도 에")
+    # then
+    assert actual == []
+
+
+def test_normalized_dictionary_word(matcher):
+    # given
+    matcher.insert("10jil")
+    # when
+    actual = matcher.find_all_occurrences("너 1ojil 하냐")
+    # then
+    assert actual == [range(2, 7)]
+    assert "1OJIL" in matcher
+
+
 # 2. fword 명령어 관련 테스트
 # 2.a. get_detected_fwords() 테스트
 def test_occurrences_to_fwords():
@@ -354,40 +878,50 @@ def test_summary_over_max_represent():
 
 # 이 Trie는 변경되지 않기 때문에 fixture 대신 변수로 선언.
 real_trie = Trie.from_file(FWORD_LIST_PATH)
+real_automaton = AhoCorasick.from_file(FWORD_LIST_PATH)
+real_double_array = DoubleArrayTrie.from_file(FWORD_LIST_PATH)
+
+
+@pytest.fixture(
+    params=[real_trie, real_automaton, real_double_array],
+    ids=["trie", "aho_corasick", "double_array"],
+)
+def real_matcher(request):
+    return request.param
 
 
 @pytest.mark.parametrize("non_fword", ["쉐이더 코드", "쉑쉑버거", "쉐이빙폼"])
-def test_PR77(non_fword):
+def test_PR77(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
 
 
 @pytest.mark.parametrize("non_fword", ["해야하네", "해야한다", "해야해", "해야해요"])
-def test_PR79(non_fword):
+def test_PR79(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
 
 
-def test_PR79_2():
+def test_PR79_2(real_matcher):
     # given
     # when
-    actual = real_trie.find_all_occurrences("난 야하다")
+    actual = real_matcher.find_all_occurrences("난 야하다")
     # then
     expected = [range(2, 5)]
     assert all_match(expected, actual)
 
 
 @pytest.mark.parametrize("non_fword", ["도망가다", "구라구라꽃"])
-def test_PR87(non_fword):
+def test_PR87(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
 
@@ -395,27 +929,27 @@ def test_PR87(non_fword):
 @pytest.mark.parametrize(
     "non_fword", ["그건 진짜지", "이건 좀 극혐이다.", "이건 좀 그켬이다", "이건 좀 극1혐이다"]
 )
-def test_PR91(non_fword):
+def test_PR91(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
 
 
 @pytest.mark.parametrize("non_fword", ["analog", "assert", "albamon", "adult", "abuse"])
-def test_PR98(non_fword):
+def test_PR98(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
 
 
 @pytest.mark.parametrize("non_fword", ["고잉 메리 호로 집합", "호로록"])
-def test_PR100(non_fword):
+def test_PR100(real_matcher, non_fword):
     # given
     # when
-    actual = real_trie.find_all_occurrences(non_fword)
+    actual = real_matcher.find_all_occurrences(non_fword)
     # then
     assert len(actual) == 0
@@ -0,0 +1,168 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import discord
+
+from together_bot.role import (
+    ReactionRoleEntry,
+    ReactionRoleIndex,
+    Role,
+    iter_role_members,
+)
+
+NOW = datetime.datetime(2022, 1, 1)
+
+
+def entry(minutes: int) -> ReactionRoleEntry:
+    return ReactionRoleEntry(10, 100, NOW + datetime.timedelta(minutes=minutes))
+
+
+def test_reaction_role_index_get():
+    # given
+    index = ReactionRoleIndex()
+    index.add(1, entry(10))
+    # when
+    result = index.get(1, NOW)
+    # then
+    assert result == entry(10)
+    assert index.get(2, NOW) is None
+
+
+def test_reaction_role_index_get_evicts_expired():
+    # given
+    index = ReactionRoleIndex()
+    index.add(1, entry(0))
+    # when
+    result = index.get(1, NOW)
+    # then
+    assert result is None
+    assert len(index) == 0
+
+
+def test_reaction_role_index_prune():
+    # given
+    index = ReactionRoleIndex()
+    index.add(1, entry(-1))
+    index.add(2, entry(0))
+    index.add(3, entry(1))
+    # when
+    pruned = index.prune(NOW)
+    # then
+    assert pruned == 2
+    assert list(index.entries) == [3]
+
+
+class UncachedMemberGuild:
+    """
+    member 캐시가 꺼진 guild. fetch_member는 fetched에 있는 member만 찾음.
+    """
+
+    def __init__(self, fetched: dict):
+        self.id = 10
+        self.fetched = fetched
+        self.role = SimpleNamespace(id=100)
+
+    def get_role(self, role_id: int):
+        return self.role if role_id == self.role.id else None
+
+    def get_member(self, user_id: int):
+        return None
+
+    async def fetch_member(self, user_id: int):
+        if user_id not in self.fetched:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "")
+        return self.fetched[user_id]
+
+
+def remove_reaction(guild: UncachedMemberGuild, user_id: int):
+    bot = SimpleNamespace(get_guild=lambda guild_id: guild)
+    cog = Role(bot)
+    cog.reaction_roles.add(1, ReactionRoleEntry(10, 100, datetime.datetime.max))
+    payload = SimpleNamespace(
+        guild_id=10,
+        emoji=Role._agree_emoji,
+        message_id=1,
+        user_id=user_id,
+        member=None,
+    )
+    asyncio.run(cog.on_raw_reaction_remove(payload))
+
+
+def test_reaction_remove_fetches_uncached_member():
+    # given
+    removed = []
+
+    async def remove_roles(role):
+        removed.append(role)
+
+    member = SimpleNamespace(bot=False, remove_roles=remove_roles)
+    guild = UncachedMemberGuild({5: member})
+    # when
+    remove_reaction(guild, 5)
+    # then
+    assert removed == [guild.role]
+
+
+def test_reaction_remove_ignores_member_who_left():
+    # given
+    guild = UncachedMemberGuild({})
+    # when
+    # then
+    remove_reaction(guild, 5)
+
+
+def test_prune_reaction_roles_survives_db_error(caplog):
+    # given
+    # Session에 연결된 DB가 없으므로 SQLAlchemyError가 남.
+    cog = Role(SimpleNamespace())
+    cog.reaction_roles.add(1, entry(-1))
+    # when
+    asyncio.run(cog.prune_reaction_roles())
+    # then
+    assert len(cog.reaction_roles) == 0
+    assert "reaction role prune failed" in caplog.text
+
+
+def role_with_members(members_roles: dict[str, set[int]], role_id: int, default=False):
+    role_ids = set().union(*members_roles.values(), {role_id})
+    roles = {id_: SimpleNamespace(id=id_) for id_ in role_ids}
+    members = [
+        SimpleNamespace(name=name, roles=[roles[id_] for id_ in sorted(ids)])
+        for name, ids in members_roles.items()
+    ]
+    role = roles[role_id]
+    role.guild = SimpleNamespace(members=members)
+    role.is_default = lambda: default
+    return role
+
+
+def test_iter_role_members():
+    # given
+    role = role_with_members({"a": {1}, "b": {2}, "c": {1, 2}}, 1)
+    # when
+    result = [member.name for member in iter_role_members(role)]
+    # then
+    assert result == ["a", "c"]
+
+
+def test_iter_role_members_default_role():
+    # given
+    role = role_with_members({"a": {1}, "b": set()}, 0, default=True)
+    # when
+    result = [member.name for member in iter_role_members(role)]
+    # then
+    assert result == ["a", "b"]
+
+
+def test_iter_role_members_from_fetched_members():
+    # given
+    role = role_with_members({"cached": {1}}, 1)
+    fetched = [
+        SimpleNamespace(name="a", roles=[role]),
+        SimpleNamespace(name="b", roles=[]),
+    ]
+    # when
+    result = [member.name for member in iter_role_members(role, fetched)]
+    # then
+    assert result == ["a"]
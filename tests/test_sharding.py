@@ -0,0 +1,131 @@
+import asyncio
+import json
+import math
+
+import discord
+from aiohttp import test_utils, web
+
+from together_bot.bot import ShardedTogetherBot
+from together_bot.stats import Stats
+from together_bot.utils.metrics import metrics
+
+BOT_USER = {
+    "id": "1",
+    "username": "together-bot",
+    "discriminator": "0001",
+    "avatar": None,
+    "bot": True,
+}
+
+
+# discord.py는 content-type이 정확히 application/json일 때만 JSON으로 읽음.
+def json_response(data: dict) -> web.Response:
+    return web.Response(
+        body=json.dumps(data).encode(), headers={"Content-Type": "application/json"}
+    )
+
+
+class FakeGateway:
+    """
+    Discord의 REST API와 gateway 중 봇이 shard를 연결하는 데 필요한 부분만 흉내 냄.
+    IDENTIFY를 받으면 guild 없이 READY를 보내고, heartbeat에 응답함.
+    """
+
+    def __init__(self):
+        self.identified: list[list[int]] = []
+        self.url = ""
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v7/users/@me", self.users_me)
+        app.router.add_get("/api/v7/gateway", self.gateway)
+        app.router.add_get("/ws", self.websocket)
+        return app
+
+    async def users_me(self, request: web.Request) -> web.Response:
+        return json_response(BOT_USER)
+
+    async def gateway(self, request: web.Request) -> web.Response:
+        return json_response({"url": f"{self.url}/ws"})
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": 50}})
+        async for message in ws:
+            payload = message.json()
+            if payload["op"] == 2:
+                shard = payload["d"]["shard"]
+                self.identified.append(shard)
+                await ws.send_json(
+                    {
+                        "op": 0,
+                        "t": "READY",
+                        "s": 1,
+                        "d": {
+                            "v": 6,
+                            "user": BOT_USER,
+                            "guilds": [],
+                            "session_id": f"session-{shard[0]}",
+                            "shard": shard,
+                        },
+                    }
+                )
+            elif payload["op"] == 1:
+                await ws.send_json({"op": 11})
+        return ws
+
+
+# 테스트에서는 shard 사이에 IDENTIFY 간격을 두지 않음.
+class FastShardedBot(ShardedTogetherBot):
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        pass
+
+
+def test_shards_connect_to_fake_gateway(monkeypatch):
+    # given
+    gateway = FakeGateway()
+    loop = asyncio.new_event_loop()
+    # discord.py 1.7은 asyncio.Event 등을 get_event_loop()로 만들므로 Python 3.9에서는
+    # 봇을 실행할 loop를 현재 loop로 설정해야 함.
+    asyncio.set_event_loop(loop)
+    bot = FastShardedBot(
+        command_prefix="!",
+        shard_ids=[0, 1],
+        shard_count=2,
+        guild_ready_timeout=0.1,
+        loop=loop,
+    )
+    bot.add_cog(Stats(bot))
+    metrics.shard_states.clear()
+
+    def connected() -> bool:
+        # shard_ready 리스너는 ready 이후에 실행될 수 있고, latency는 heartbeat 응답을 받아야 정해짐.
+        return list(metrics.shard_states.values()) == ["ready", "ready"] and all(
+            math.isfinite(latency) for _, latency in metrics.shard_latencies()
+        )
+
+    async def main():
+        async with test_utils.TestServer(gateway.make_app()) as server:
+            gateway.url = str(server.make_url("")).rstrip("/")
+            monkeypatch.setattr(discord.http.Route, "BASE", f"{gateway.url}/api/v7")
+            connect = loop.create_task(bot.start("token"))
+            try:
+                await asyncio.wait_for(bot.wait_until_ready(), 5.0)
+                while not connected():
+                    await asyncio.sleep(0.01)
+                return sorted(metrics.shard_states), metrics.shard_latencies()
+            finally:
+                await bot.close()
+                await connect
+
+    # when
+    try:
+        shard_ids, latencies = loop.run_until_complete(asyncio.wait_for(main(), 10.0))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+    # then
+    assert sorted(gateway.identified) == [[0, 2], [1, 2]]
+    assert shard_ids == [0, 1]
+    assert [shard_id for shard_id, _ in latencies] == [0, 1]
@@ -1,9 +1,13 @@
+import asyncio
+import time
 from datetime import datetime, timedelta, timezone
 
+import ntplib
 import pytest
 from dateutil.parser import ParserError
 
 from together_bot.time import (
+    NtpClock,
     from_kst_time_string,
     from_utc_timestamp,
     to_pst_time_format,
@@ -105,3 +109,79 @@ def test_kst_time_invalid_arguments(kst_time, expected_error):
 def test_timestamp_overflow(timestamp):
     with pytest.raises(OverflowError):
         print(from_utc_timestamp(timestamp))
+
+
+# 자기 시계보다 offset초 빠른 시간을 응답하는 NTP 서버
+class FakeNtpServer(asyncio.DatagramProtocol):
+    def __init__(self, offset: float):
+        self.offset = offset
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        query = ntplib.NTPPacket()
+        query.from_data(data)
+        now = ntplib.system_to_ntp_time(time.time() + self.offset)
+        response = ntplib.NTPPacket(version=3, mode=4, tx_timestamp=now)
+        response.stratum = 2
+        response.orig_timestamp = query.tx_timestamp
+        response.recv_timestamp = now
+        self.transport.sendto(response.to_data(), addr)
+
+
+def test_ntp_clock_offset():
+    # given
+    async def sync():
+        loop = asyncio.get_running_loop()
+        transport, server = await loop.create_datagram_endpoint(
+            lambda: FakeNtpServer(100.0), local_addr=("127.0.0.1", 0)
+        )
+        port = transport.get_extra_info("sockname")[1]
+        clock = NtpClock("127.0.0.1", port=port, timeout=1.0)
+
+        async def wait_for_offset():
+            while clock.offset is None:
+                await asyncio.sleep(0.01)
+
+        try:
+            clock.start(loop)
+            await asyncio.wait_for(wait_for_offset(), 5.0)
+        finally:
+            clock.stop()
+            transport.close()
+        return clock, server
+
+    # when
+    clock, server = asyncio.run(sync())
+    # then
+    assert server.requests == 1
+    assert clock.offset == pytest.approx(100.0, abs=0.5)
+    assert clock.age() < 1.0
+    expected = datetime.now(timezone.utc) + timedelta(seconds=100)
+    assert abs(clock.now() - expected) < timedelta(seconds=1)
+
+
+def test_ntp_clock_without_response():
+    # given
+    async def measure():
+        loop = asyncio.get_running_loop()
+        # 응답하지 않는 서버
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0)
+        )
+        port = transport.get_extra_info("sockname")[1]
+        clock = NtpClock("127.0.0.1", port=port, timeout=0.1)
+        try:
+            with pytest.raises(ntplib.NTPException):
+                await clock.measure()
+        finally:
+            transport.close()
+        return clock
+
+    # when
+    clock = asyncio.run(measure())
+    # then
+    assert clock.offset is None
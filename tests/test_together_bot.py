@@ -1,5 +1,140 @@
+import asyncio
+
+import pytest
+from discord.ext import commands
+
 from together_bot import __version__
+from together_bot.bot import TogetherBot, client_options, setup
+from together_bot.utils.metrics import metrics
 
 
 def test_version():
     assert __version__ == "0.1.0"
+
+
+# discord.py 1.7은 봇을 만들 때 asyncio.Event 등을 get_event_loop()로 만들므로
+# Python 3.9에서는 봇의 loop를 현재 loop로 설정해야 함.
+@pytest.fixture
+def bot_loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+class TimedCog(commands.Cog):
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        pass
+
+
+def test_cog_listener_is_timed_and_removed(bot_loop):
+    # given
+    bot = TogetherBot(command_prefix="!", loop=bot_loop)
+
+    # when
+    bot.add_cog(TimedCog())
+    bot_loop.run_until_complete(bot.extra_events["on_message"][0](None))
+    bot.remove_cog("TimedCog")
+    # then
+    assert metrics.listeners["TimedCog.on_message"].count == 1
+    assert bot.extra_events["on_message"] == []
+    assert bot.timed_listeners == {}
+
+
+class PreparedCog(commands.Cog):
+    def __init__(self, fail: bool = False, fail_count: int = 0):
+        # fail이면 항상, 아니면 처음 fail_count번 실패함.
+        self.fail = fail
+        self.fail_count = fail_count
+        self.attempts = 0
+        self.prepared = False
+
+    async def prepare(self):
+        await asyncio.sleep(0)
+        self.attempts += 1
+        if self.fail or self.attempts <= self.fail_count:
+            raise RuntimeError
+        self.prepared = True
+
+
+def test_prepare_cogs_runs_every_cog(bot_loop):
+    # given
+    bot = TogetherBot(command_prefix="!", loop=bot_loop)
+    cogs = [PreparedCog(fail=True), PreparedCog(), TimedCog()]
+
+    # when
+    bot_loop.run_until_complete(bot.prepare_cogs(cogs, retries=2, retry_delay=0))
+    # then
+    assert [cog.prepared for cog in cogs[:2]] == [False, True]
+    assert list(bot.startup.prepare_times) == ["test_together_bot"]
+    assert cogs[0].attempts == 3
+
+
+def test_prepare_cogs_retries_failed_prepare(bot_loop):
+    # given
+    bot = TogetherBot(command_prefix="!", loop=bot_loop)
+    cog = PreparedCog(fail_count=2)
+
+    # when
+    bot_loop.run_until_complete(bot.prepare_cogs([cog], retries=3, retry_delay=0))
+    # then
+    assert cog.prepared
+    assert cog.attempts == 3
+
+
+def test_setup_loads_enabled_cogs_only(monkeypatch, bot_loop):
+    # given
+    monkeypatch.setenv("ENABLED_COGS", "commands, missing")
+    bot = TogetherBot(command_prefix="!", loop=bot_loop)
+
+    # when
+    setup(bot)
+    # then
+    assert list(bot.extensions) == ["together_bot.commands"]
+    assert list(bot.startup.load_times) == ["commands"]
+
+
+def test_client_options_default(monkeypatch):
+    # given
+    for name in [
+        "GATEWAY_INTENTS",
+        "MEMBER_CACHE_FLAGS",
+        "CHUNK_GUILDS_AT_STARTUP",
+        "MAX_MESSAGES",
+    ]:
+        monkeypatch.delenv(name, raising=False)
+    # when
+    options = client_options()
+    # then
+    intents = options["intents"]
+    assert intents.members and intents.guild_messages and intents.guild_reactions
+    assert not intents.typing and not intents.presences and not intents.voice_states
+    assert options["member_cache_flags"].joined
+    assert options["chunk_guilds_at_startup"] is True
+    assert options["max_messages"] == 1000
+
+
+def test_client_options_without_member_cache(monkeypatch):
+    # given
+    monkeypatch.setenv("GATEWAY_INTENTS", "guilds,guild_messages")
+    monkeypatch.setenv("MEMBER_CACHE_FLAGS", "none")
+    monkeypatch.delenv("CHUNK_GUILDS_AT_STARTUP", raising=False)
+    monkeypatch.setenv("MAX_MESSAGES", "0")
+    # when
+    options = client_options()
+    # then
+    assert not options["intents"].members
+    assert options["member_cache_flags"].value == 0
+    assert options["chunk_guilds_at_startup"] is False
+    assert options["max_messages"] is None
+
+
+def test_client_options_unknown_flag(monkeypatch):
+    # given
+    monkeypatch.setenv("MEMBER_CACHE_FLAGS", "joined,everything")
+    # when
+    # then
+    with pytest.raises(ValueError):
+        client_options()
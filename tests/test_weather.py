@@ -0,0 +1,137 @@
+import asyncio
+
+from aiohttp import test_utils, web
+
+from together_bot.utils.cache import TtlCache
+from together_bot.utils.http import HttpClient
+from together_bot.weather import (
+    fetch_current_weather,
+    format_current_weather,
+    format_forecast,
+    get_current_weather,
+    get_forecast,
+)
+
+
+def make_weather_app(requests: list = None):
+    async def current(request: web.Request):
+        if requests is not None:
+            requests.append(request.query.get("q"))
+        assert request.query["appid"] == "key"
+        if request.query.get("q") == "nowhere":
+            return web.json_response({"message": "city not found"}, status=404)
+        name = request.query.get("q", f"id {request.query.get('id')}")
+        return web.json_response(
+            {
+                "name": name,
+                "coord": {"lat": 37.57, "lon": 126.98},
+                "weather": [{"main": "Clear", "description": "맑음"}],
+            }
+        )
+
+    async def one_call(request: web.Request):
+        assert (request.query["lat"], request.query["lon"]) == ("37.57", "126.98")
+        daily = {
+            "temp": {"min": -3.2, "max": 4.6},
+            "weather": [{"main": "Snow", "description": "눈"}],
+        }
+        return web.json_response(
+            {
+                "timezone_offset": 32400,
+                # 2022-01-01 12:00 KST부터 하루씩
+                "daily": [dict(daily, dt=1641006000 + 86400 * i) for i in range(8)],
+            }
+        )
+
+    app = web.Application()
+    app.router.add_get("/weather", current)
+    app.router.add_get("/onecall", one_call)
+    return app
+
+
+def fetch_all(cities: list):
+    async def fetch():
+        client = HttpClient()
+        async with test_utils.TestServer(make_weather_app()) as server:
+            url = str(server.make_url("/weather"))
+            try:
+                return [
+                    await fetch_current_weather(client, "key", city, url)
+                    for city in cities
+                ]
+            finally:
+                await client.close()
+
+    return asyncio.run(fetch())
+
+
+def test_current_weather():
+    # given
+    # when
+    default, seoul, nowhere = fetch_all([None, "Seoul", "nowhere"])
+    # then
+    assert format_current_weather(default.json()) == "id 1835848 : Clear - 맑음"
+    assert format_current_weather(seoul.json()) == "Seoul : Clear - 맑음"
+    assert nowhere.status == 404
+
+
+def test_current_weather_is_cached_by_normalized_city():
+    # given
+    requests = []
+    cache = TtlCache(ttl=60)
+
+    async def fetch():
+        client = HttpClient()
+        async with test_utils.TestServer(make_weather_app(requests)) as server:
+            url = str(server.make_url("/weather"))
+            try:
+                first = await asyncio.gather(
+                    *(
+                        get_current_weather(client, "key", "Seoul", url, cache)
+                        for _ in range(5)
+                    )
+                )
+                second = await get_current_weather(
+                    client, "key", "  seoul ", url, cache
+                )
+                return first + [second]
+            finally:
+                await client.close()
+
+    # when
+    responses = asyncio.run(fetch())
+    # then
+    assert requests == ["seoul"]
+    assert all(response.json()["name"] == "seoul" for response in responses)
+    assert cache.misses == 1 and cache.coalesced == 4 and cache.hits == 1
+
+
+def test_forecast():
+    # given
+    cache = TtlCache(ttl=60)
+
+    async def fetch():
+        client = HttpClient()
+        async with test_utils.TestServer(make_weather_app()) as server:
+            current_url = str(server.make_url("/weather"))
+            one_call_url = str(server.make_url("/onecall"))
+            try:
+                current = await get_current_weather(
+                    client, "key", "Seoul", current_url, cache
+                )
+                coord = current.json()["coord"]
+                return await get_forecast(
+                    client, "key", coord["lat"], coord["lon"], one_call_url, cache
+                )
+            finally:
+                await client.close()
+
+    # when
+    response = asyncio.run(fetch())
+    # then
+    assert format_forecast("Seoul", response.json()) == (
+        "Seoul 예보\n"
+        "01/01 : Snow - 눈, -3~5°C\n"
+        "01/02 : Snow - 눈, -3~5°C\n"
+        "01/03 : Snow - 눈, -3~5°C"
+    )
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from together_bot.utils.broadcast import broadcast
+
+
+def http_error(error_type, status: int):
+    return error_type(SimpleNamespace(status=status, reason="error"), "error")
+
+
+def test_broadcast_bounded_concurrency():
+    # given
+    in_flight = 0
+    max_in_flight = 0
+
+    async def send(target: int):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    # when
+    report = asyncio.run(broadcast(range(20), send, concurrency=4))
+    # then
+    assert report.sent == 20
+    assert len(report.latencies) == 20
+    assert max_in_flight == 4
+    # 순서대로 보냈다면 0.2초가 걸림.
+    assert report.elapsed_time < 0.15
+
+
+def test_broadcast_retries_server_error():
+    # given
+    attempts = {1: 0, 2: 0}
+
+    async def send(target: int):
+        attempts[target] += 1
+        if target == 1 and attempts[target] < 3:
+            raise http_error(discord.DiscordServerError, 503)
+        if target == 2:
+            raise asyncio.TimeoutError
+
+    # when
+    report = asyncio.run(broadcast([1, 2], send, retries=2, retry_delay=0))
+    # then
+    assert attempts == {1: 3, 2: 3}
+    assert report.sent == 1 and report.failed == 1 and report.retried == 4
+
+
+def test_broadcast_drops_forbidden_and_not_found():
+    # given
+    errors = {
+        1: http_error(discord.Forbidden, 403),
+        2: http_error(discord.NotFound, 404),
+        3: http_error(discord.HTTPException, 400),
+    }
+    attempts = []
+
+    async def send(target: int):
+        attempts.append(target)
+        if target in errors:
+            raise errors[target]
+
+    # when
+    report = asyncio.run(broadcast([1, 2, 3, 4], send, retry_delay=0))
+    # then
+    assert sorted(attempts) == [1, 2, 3, 4]
+    assert sorted(report.dropped) == [1, 2]
+    assert report.failed == 1 and report.sent == 1
+
+
+def test_broadcast_counts_skipped_targets():
+    # given
+    async def send(target: int):
+        return target != 2
+
+    # when
+    report = asyncio.run(broadcast([1, 2, 3], send))
+    # then
+    assert report.sent == 2 and report.skipped == 1
+    assert report.dropped == [] and report.failed == 0
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from together_bot.utils.cache import TtlCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def counting_loader(calls: list, value):
+    async def load():
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    return load
+
+
+def test_hit_until_ttl():
+    # given
+    clock = FakeClock()
+    cache = TtlCache(ttl=10, clock=clock)
+    calls = []
+
+    async def run():
+        await cache.get_or_load("a", counting_loader(calls, 1))
+        clock.now = 9.9
+        await cache.get_or_load("a", counting_loader(calls, 2))
+        clock.now = 10
+        return await cache.get_or_load("a", counting_loader(calls, 3))
+
+    # when
+    value = asyncio.run(run())
+    # then
+    assert value == 3 and calls == [1, 3]
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def test_lru_eviction():
+    # given
+    cache = TtlCache(ttl=10, max_size=2)
+    calls = []
+
+    async def run():
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            await cache.get_or_load(key, counting_loader(calls, key))
+
+    # when
+    asyncio.run(run())
+    # then
+    # c를 저장할 때 가장 오래 쓰지 않은 b가 지워짐.
+    assert calls == ["a", "b", "c", "b"]
+    assert list(cache.entries) == ["a", "b"]
+
+
+def test_concurrent_lookups_are_coalesced():
+    # given
+    cache = TtlCache(ttl=10)
+    calls = []
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_load("a", counting_loader(calls, 1)) for _ in range(10))
+        )
+
+    # when
+    values = asyncio.run(run())
+    # then
+    assert values == [1] * 10 and calls == [1]
+    assert cache.misses == 1 and cache.coalesced == 9
+    assert cache.hit_rate() == pytest.approx(0.9)
+
+
+def test_failure_and_uncacheable_value_are_not_stored():
+    # given
+    cache = TtlCache(ttl=10)
+    calls = []
+
+    async def fail():
+        calls.append("fail")
+        raise RuntimeError
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("a", fail)
+        await cache.get_or_load("a", counting_loader(calls, 500), lambda v: v < 500)
+        return await cache.get_or_load("a", counting_loader(calls, 200))
+
+    # when
+    value = asyncio.run(run())
+    # then
+    assert value == 200 and calls == ["fail", 500, 200]
+    assert list(cache.entries) == ["a"]
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from discord.ext import commands
+
+from together_bot.utils.classifier import classify
+
+
+async def ping(ctx: commands.Context):
+    pass
+
+
+def make_message(message_id: int, content: str, is_bot: bool = False):
+    author = SimpleNamespace(id=1, bot=is_bot)
+    return SimpleNamespace(id=message_id, content=content, author=author)
+
+
+def run_classify(content: str, is_bot: bool = False, message_id: int = 0):
+    async def _run():
+        bot = commands.Bot(command_prefix="!")
+        bot.add_command(commands.Command(ping, name="ping"))
+        return await classify(bot, make_message(message_id, content, is_bot))
+
+    return asyncio.run(_run())
+
+
+@pytest.mark.parametrize(
+    "content, message_id", [("!ping", 1), ("!ping now", 2), ("!ping\thello", 3)]
+)
+def test_command(content, message_id):
+    # given
+    # when
+    actual = run_classify(content, message_id=message_id)
+    # then
+    assert actual.is_command
+    assert actual.prefix == "!"
+    assert actual.command.name == "ping"
+
+
+@pytest.mark.parametrize(
+    "content, message_id",
+    [("ping", 11), ("! ping", 12), ("!pong", 13), ("!", 14), ("", 15)],
+)
+def test_not_command(content, message_id):
+    # given
+    # when
+    actual = run_classify(content, message_id=message_id)
+    # then
+    assert not actual.is_command
+
+
+def test_bot_message_is_not_command():
+    # given
+    # when
+    actual = run_classify("!ping", is_bot=True, message_id=21)
+    # then
+    assert not actual.is_command
+
+
+def test_cached_by_message_id():
+    # given
+    run_classify("!ping", message_id=31)
+    # when
+    # 같은 메세지는 내용을 다시 읽지 않음.
+    actual = run_classify("hello", message_id=31)
+    # then
+    assert actual.is_command
@@ -0,0 +1,105 @@
+import asyncio
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import together_bot.utils.db_toolkit as db_toolkit
+from together_bot.utils.db_toolkit import pool_options, to_async_url
+
+
+@pytest.mark.parametrize(
+    "database_url, expected",
+    [
+        (
+            "postgres://user:pw@host:5432/db",
+            "postgresql+asyncpg://user:pw@host:5432/db",
+        ),
+        ("postgresql://user@host/db", "postgresql+asyncpg://user@host/db"),
+        ("postgresql+psycopg2://user@host/db", "postgresql+asyncpg://user@host/db"),
+        ("postgresql+asyncpg://user@host/db", "postgresql+asyncpg://user@host/db"),
+        ("sqlite:///test.db", "sqlite+aiosqlite:///test.db"),
+        ("sqlite+aiosqlite:///:memory:", "sqlite+aiosqlite:///:memory:"),
+    ],
+)
+def test_to_async_url(database_url, expected):
+    # given
+    # when
+    actual = to_async_url(database_url)
+    # then
+    assert actual == expected
+
+
+def test_pool_options_for_sqlite():
+    # given
+    # when
+    options = pool_options("sqlite+aiosqlite:///test.db")
+    # then
+    assert options["pool_pre_ping"] is True
+    assert "pool_size" not in options
+
+
+def test_pool_options_from_env(monkeypatch):
+    # given
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "60")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    # when
+    options = pool_options("postgresql+asyncpg://user@host/db")
+    # then
+    assert options["pool_size"] == 2
+    assert options["max_overflow"] == 10
+    assert options["pool_recycle"] == 60
+    assert options["pool_pre_ping"] is False
+
+
+def test_probe_counts_pool_events(tmp_path, monkeypatch):
+    # given
+    monkeypatch.setattr(db_toolkit, "engine", None)
+    monkeypatch.setattr(db_toolkit, "metrics", db_toolkit.PoolMetrics())
+
+    async def probe_twice():
+        await db_toolkit.setup(f"sqlite:///{tmp_path / 'test.db'}")
+        try:
+            await db_toolkit.probe()
+            await db_toolkit.probe()
+        finally:
+            db_toolkit.Session.configure(bind=None)
+            await db_toolkit.engine.dispose()
+
+    # when
+    asyncio.run(probe_twice())
+    # then
+    metrics = db_toolkit.metrics
+    assert len(metrics.checkout_times) == 2
+    # sqlite는 연결을 모아두지 않으므로 checkout마다 새로 연결함.
+    assert metrics.checkouts == metrics.connects == 3
+    assert metrics.checkins == 3
+
+
+def test_setup_creates_tables_of_unloaded_models(tmp_path):
+    # given
+    # 이 process는 이미 model을 import했으므로 새 process에서 확인함.
+    database_path = tmp_path / "test.db"
+    script = (
+        "import asyncio\n"
+        "import together_bot.utils.db_toolkit as db_toolkit\n"
+        f"asyncio.run(db_toolkit.setup('sqlite:///{database_path}'))\n"
+    )
+    # when
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).parent.parent.parent,
+        check=True,
+    )
+    # then
+    with sqlite3.connect(database_path) as connection:
+        tables = {
+            name
+            for name, in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+    assert {"fword_user", "dnf_grade_channel", "reaction_role", "job_run"} <= tables
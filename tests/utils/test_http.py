@@ -0,0 +1,73 @@
+import asyncio
+
+from aiohttp import test_utils, web
+
+from together_bot.utils.http import HttpClient
+
+
+def make_app(headers: dict[str, str], requests: list):
+    async def handler(request: web.Request):
+        requests.append(request.headers.copy())
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if (etag is not None and request.headers.get("If-None-Match") == etag) or (
+            last_modified is not None
+            and request.headers.get("If-Modified-Since") == last_modified
+        ):
+            return web.Response(status=304, headers=headers)
+        return web.json_response({"query": request.query_string}, headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/resource", handler)
+    return app
+
+
+def fetch_twice(headers: dict[str, str], requests: list):
+    async def fetch():
+        client = HttpClient()
+        async with test_utils.TestServer(make_app(headers, requests)) as server:
+            url = str(server.make_url("/resource"))
+            try:
+                first = await client.get(url, params={"a": "1"})
+                second = await client.get(url, params={"a": "1"})
+            finally:
+                await client.close()
+        return client, first, second
+
+    return asyncio.run(fetch())
+
+
+def test_etag_turns_repeat_fetch_into_304():
+    # given
+    requests = []
+    # when
+    client, first, second = fetch_twice({"ETag": '"v1"'}, requests)
+    # then
+    assert "If-None-Match" not in requests[0]
+    assert requests[1]["If-None-Match"] == '"v1"'
+    assert first.status == second.status == 200
+    assert not first.from_cache and second.from_cache
+    assert second.json() == first.json() == {"query": "a=1"}
+    assert client.requests == 2 and client.not_modified == 1
+
+
+def test_last_modified_turns_repeat_fetch_into_304():
+    # given
+    requests = []
+    last_modified = "Sat, 01 Jan 2022 00:00:00 GMT"
+    # when
+    client, _, second = fetch_twice({"Last-Modified": last_modified}, requests)
+    # then
+    assert requests[1]["If-Modified-Since"] == last_modified
+    assert second.from_cache and client.not_modified == 1
+
+
+def test_response_without_validator_is_not_cached():
+    # given
+    requests = []
+    # when
+    client, _, second = fetch_twice({}, requests)
+    # then
+    assert "If-None-Match" not in requests[1]
+    assert not second.from_cache
+    assert len(client.cache) == 0
@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+from together_bot.utils.loop_lag import LoopLagMonitor
+
+
+def test_blocking_call_is_measured():
+    # given
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def block_loop():
+        monitor.start(asyncio.get_running_loop())
+        await asyncio.sleep(0.05)
+        # event loop를 막는 동기 호출
+        time.sleep(0.1)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    # when
+    asyncio.run(block_loop())
+    # then
+    assert max(monitor.samples) >= 0.05
+    assert monitor.percentile(0.5) < 0.05
@@ -0,0 +1,117 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import test_utils
+
+from together_bot.utils.metrics import BotMetrics, Histogram, MetricsServer, rss_bytes
+
+
+def test_histogram_quantile():
+    # given
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    # when
+    for value in [0.005] * 90 + [0.05] * 9 + [3.0]:
+        histogram.observe(value)
+    # then
+    assert histogram.counts == [90, 9, 0, 1]
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.99) == 0.1
+    # 가장 큰 구간을 넘으면 최댓값을 반환함.
+    assert histogram.quantile(1.0) == 3.0
+    assert histogram.sum == pytest.approx(3.9)
+
+
+def test_histogram_quantile_is_not_above_max():
+    # given
+    histogram = Histogram(buckets=(0.01, 0.1))
+    # when
+    histogram.observe(0.02)
+    # then
+    assert histogram.quantile(0.5) == 0.02
+
+
+def test_timed_listener_records_failure():
+    # given
+    metrics = BotMetrics()
+
+    @metrics.timed_listener("Cog.on_message")
+    async def on_message():
+        raise RuntimeError()
+
+    # when
+    with pytest.raises(RuntimeError):
+        asyncio.run(on_message())
+    # then
+    assert metrics.listeners["Cog.on_message"].count == 1
+    assert on_message.__name__ == "on_message"
+
+
+def test_to_prometheus():
+    # given
+    metrics = BotMetrics()
+    metrics.observe_command("dnf grade", 0.2)
+    metrics.observe_command("dnf grade", 20.0)
+    # when
+    text = metrics.to_prometheus()
+    # then
+    lines = text.splitlines()
+    assert "# TYPE together_bot_command_latency_seconds histogram" in lines
+    assert (
+        'together_bot_command_latency_seconds_bucket{command="dnf grade",le="0.25"} 1'
+        in lines
+    )
+    assert (
+        'together_bot_command_latency_seconds_bucket{command="dnf grade",le="+Inf"} 2'
+        in lines
+    )
+    assert 'together_bot_command_latency_seconds_count{command="dnf grade"} 2' in lines
+    assert "together_bot_loop_lag_seconds_count 0" in lines
+
+
+def test_report_orders_by_total_time():
+    # given
+    metrics = BotMetrics()
+    metrics.observe_command("time now", 0.01)
+    metrics.observe_command("weather current", 0.5)
+    # when
+    report = metrics.report().splitlines()
+    # then
+    assert report[1].startswith("`weather current`: 1회")
+    assert report[2].startswith("`time now`: 1회")
+    assert report[4] == "측정값 없음"
+
+
+def test_metrics_server():
+    # given
+    metrics = BotMetrics()
+    metrics.observe_listener("Fword.on_message", 0.001)
+
+    async def main():
+        port = test_utils.unused_port()
+        server = MetricsServer(metrics, "127.0.0.1", port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    return response.status, response.content_type, await response.text()
+        finally:
+            await server.stop()
+
+    # when
+    status, content_type, text = asyncio.run(main())
+    # then
+    assert status == 200
+    assert content_type == "text/plain"
+    assert (
+        'together_bot_listener_latency_seconds_count{listener="Fword.on_message"} 1'
+        in text
+    )
+
+
+def test_rss_bytes():
+    # given
+    # when
+    rss = rss_bytes()
+    # then
+    assert rss > 0
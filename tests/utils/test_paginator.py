@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+from together_bot.utils.paginator import LazyPages, paginate, send_pages
+
+
+def test_paginate_respects_limit():
+    # given
+    items = [f"`member{i}`" for i in range(100)]
+    # when
+    pages = list(paginate(items, 50))
+    # then
+    assert all(len(page) <= 50 for page in pages)
+    assert ", ".join(pages).split(", ") == items
+
+
+def test_paginate_truncates_long_item():
+    # given
+    # when
+    pages = list(paginate(["a" * 20, "b"], 10))
+    # then
+    assert pages == ["a" * 9 + "…", "b"]
+
+
+def test_paginate_is_lazy():
+    # given
+    consumed = 0
+
+    def items():
+        nonlocal consumed
+        for i in range(1000):
+            consumed += 1
+            yield str(i)
+
+    # when
+    first = next(paginate(items(), 10))
+    # then
+    assert first == "0, 1, 2, 3"
+    # 첫 페이지를 넘치게 만든 항목까지만 꺼냄.
+    assert consumed == 5
+
+
+def test_lazy_pages():
+    # given
+    pages = LazyPages(iter(["a", "b", "c"]))
+    # when
+    # then
+    assert pages.get(1) == "b"
+    assert pages.total() is None
+    assert pages.get(0) == "a"
+    assert pages.get(3) is None
+    assert pages.total() == 3
+    assert pages.get(-1) is None
+
+
+def test_send_pages_single_page():
+    # given
+    sent = []
+
+    async def send(content):
+        sent.append(content)
+        return SimpleNamespace(content=content)
+
+    ctx = SimpleNamespace(send=send)
+    # when
+    message = asyncio.run(send_pages(ctx, "Members", iter(["`a`, `b`"])))
+    # then
+    assert message.content == "Members (1/1)\n`a`, `b`"
+    assert sent == ["Members (1/1)\n`a`, `b`"]
+
+
+def test_send_pages_empty():
+    # given
+    ctx = SimpleNamespace()
+    # when
+    message = asyncio.run(send_pages(ctx, "Members", iter([])))
+    # then
+    assert message is None
@@ -0,0 +1,204 @@
+import asyncio
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from together_bot.utils.scheduler import KST, Scheduler, next_run_time, poll, utcnow
+
+MIDNIGHT_KST = time(0, 0, tzinfo=KST)
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (
+            datetime(2022, 1, 1, 14, 59, tzinfo=timezone.utc),
+            datetime(2022, 1, 1, 15, 0, tzinfo=timezone.utc),
+        ),
+        (
+            datetime(2022, 1, 1, 15, 0, tzinfo=timezone.utc),
+            datetime(2022, 1, 2, 15, 0, tzinfo=timezone.utc),
+        ),
+        (
+            datetime(2022, 1, 1, 16, 0, tzinfo=timezone.utc),
+            datetime(2022, 1, 2, 15, 0, tzinfo=timezone.utc),
+        ),
+    ],
+)
+def test_next_run_time(now, expected):
+    # given
+    # when
+    actual = next_run_time(now, MIDNIGHT_KST)
+    # then
+    assert actual == expected
+
+
+def test_every_day_requires_timezone():
+    with pytest.raises(ValueError):
+        Scheduler().every_day("job", time(0, 0), None)
+
+
+def test_job_runs_at_time():
+    # given
+    scheduler = Scheduler()
+    runs = []
+
+    async def job():
+        runs.append(utcnow())
+
+    async def run():
+        at = (utcnow() + timedelta(seconds=0.05)).astimezone(KST).timetz()
+        scheduler.every_day("job", at, job)
+        scheduler.start(asyncio.get_running_loop())
+        await asyncio.sleep(0.2)
+        scheduler.stop()
+        return at
+
+    # when
+    at = asyncio.run(run())
+    # then
+    assert len(runs) == 1
+    job_status = scheduler.jobs["job"]
+    assert job_status.runs == 1 and job_status.missed == 0
+    assert job_status.next_run == next_run_time(runs[0], at)
+
+
+def test_job_missed_after_grace():
+    # given
+    now = datetime(2022, 1, 1, 14, 59, 59, 990000, tzinfo=timezone.utc)
+    scheduler = Scheduler(clock=lambda: now)
+    runs = []
+
+    async def job():
+        runs.append(now)
+
+    async def run():
+        nonlocal now
+        scheduler.every_day("job", MIDNIGHT_KST, job, misfire_grace=timedelta(1 / 24))
+        scheduler.start(asyncio.get_running_loop())
+        await asyncio.sleep(0)
+        # event loop가 오래 멈춘 것처럼 시계를 옮김.
+        now += timedelta(hours=2)
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    # when
+    asyncio.run(run())
+    # then
+    assert runs == []
+    job_status = scheduler.jobs["job"]
+    assert job_status.missed == 1
+    assert job_status.next_run == datetime(2022, 1, 2, 15, 0, tzinfo=timezone.utc)
+
+
+def test_job_runs_late_within_grace():
+    # given
+    now = datetime(2022, 1, 1, 14, 59, 59, 990000, tzinfo=timezone.utc)
+    scheduler = Scheduler(clock=lambda: now)
+    runs = []
+
+    async def job():
+        runs.append(now)
+
+    async def run():
+        nonlocal now
+        scheduler.every_day("job", MIDNIGHT_KST, job)
+        scheduler.start(asyncio.get_running_loop())
+        await asyncio.sleep(0)
+        now += timedelta(minutes=3)
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    # when
+    asyncio.run(run())
+    # then
+    assert len(runs) == 1 and scheduler.jobs["job"].missed == 0
+
+
+def test_catch_up_job_runs_once_after_grace():
+    # given
+    now = datetime(2022, 1, 1, 14, 59, 59, 990000, tzinfo=timezone.utc)
+    scheduler = Scheduler(clock=lambda: now)
+    runs = []
+
+    async def job():
+        runs.append(now)
+
+    async def run():
+        nonlocal now
+        scheduler.every_day(
+            "job", MIDNIGHT_KST, job, catch_up=True, last_run=now - timedelta(hours=1)
+        )
+        scheduler.start(asyncio.get_running_loop())
+        await asyncio.sleep(0)
+        # 이틀 넘게 멈춘 것처럼 시계를 옮겨도 한 번만 실행함.
+        now += timedelta(days=2, hours=2)
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    # when
+    asyncio.run(run())
+    # then
+    assert runs == [now]
+    job_status = scheduler.jobs["job"]
+    assert job_status.caught_up == 1 and job_status.missed == 0
+    assert job_status.next_run == datetime(2022, 1, 4, 15, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "last_run, expected_runs",
+    [
+        (None, 1),
+        (datetime(2022, 1, 1, 14, 0, tzinfo=timezone.utc), 1),
+        (datetime(2022, 1, 1, 15, 0, 30, tzinfo=timezone.utc), 0),
+    ],
+)
+def test_catch_up_job_runs_on_start_when_missed(last_run, expected_runs):
+    # given
+    now = datetime(2022, 1, 1, 18, 0, tzinfo=timezone.utc)
+    scheduler = Scheduler(clock=lambda: now)
+    runs = []
+
+    async def job():
+        runs.append(now)
+
+    async def run():
+        scheduler.every_day("job", MIDNIGHT_KST, job, catch_up=True, last_run=last_run)
+        scheduler.start(asyncio.get_running_loop())
+        await asyncio.sleep(0.05)
+        scheduler.stop()
+
+    # when
+    asyncio.run(run())
+    # then
+    assert len(runs) == expected_runs
+    job_status = scheduler.jobs["job"]
+    assert job_status.caught_up == expected_runs
+    assert job_status.next_run == datetime(2022, 1, 2, 15, 0, tzinfo=timezone.utc)
+
+
+def test_poll_until_true():
+    # given
+    results = iter([False, False, True])
+    calls = 0
+
+    async def check():
+        nonlocal calls
+        calls += 1
+        return next(results)
+
+    # when
+    updated = asyncio.run(poll(check, interval=0, jitter=0.01, timeout=1))
+    # then
+    assert updated is True and calls == 3
+
+
+def test_poll_timeout():
+    # given
+    async def check():
+        return False
+
+    # when
+    updated = asyncio.run(poll(check, interval=0.02, jitter=0, timeout=0.05))
+    # then
+    assert updated is False
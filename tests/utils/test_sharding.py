@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from together_bot.utils.sharding import (
+    owns_all_shards,
+    owns_guild,
+    shard_id_for,
+    split_shards,
+)
+
+
+def test_split_shards():
+    # given
+    # when
+    # then
+    assert split_shards(10, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert split_shards(4, 2) == [[0, 1], [2, 3]]
+    # shard보다 process가 많으면 process를 줄임.
+    assert split_shards(2, 4) == [[0], [1]]
+
+
+def test_shard_id_for():
+    # given
+    guild_id = (123 << 22) | 456
+    # when
+    # then
+    assert shard_id_for(guild_id, 10) == 3
+    assert shard_id_for(guild_id, 1) == 0
+
+
+def test_owns_guild():
+    # given
+    bot = SimpleNamespace(shard_ids=[2, 3], shard_count=4)
+    # when
+    # then
+    assert owns_guild(bot, 2 << 22)
+    assert not owns_guild(bot, 1 << 22)
+    assert not owns_all_shards(bot)
+
+
+def test_owns_guild_without_shard_ids():
+    # given
+    bot = SimpleNamespace(shard_id=None, shard_count=None)
+    # when
+    # then
+    assert owns_guild(bot, 1 << 22)
+    assert owns_all_shards(bot)
@@ -0,0 +1,58 @@
+import sys
+
+from together_bot.utils.startup import ImportProfiler, ImportTime, StartupReport
+
+
+def test_import_profiler_times_new_modules(tmp_path, monkeypatch):
+    # given
+    tmp_path.joinpath("startup_child.py").write_text("VALUE = 1\n")
+    tmp_path.joinpath("startup_parent.py").write_text(
+        "import startup_child\n\nVALUE = startup_child.VALUE + 1\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = ImportProfiler()
+
+    # when
+    with profiler:
+        import startup_parent
+    sys.modules.pop("startup_parent")
+    sys.modules.pop("startup_child")
+    # then
+    assert startup_parent.VALUE == 2
+    assert profiler not in sys.meta_path
+    parent = profiler.times["startup_parent"]
+    child = profiler.times["startup_child"]
+    assert parent.cumulative >= child.cumulative
+    assert abs(parent.cumulative - parent.self_time - child.cumulative) < 1e-6
+
+
+def test_import_profiler_report_is_limited():
+    # given
+    profiler = ImportProfiler()
+    profiler.times = {
+        "fast": ImportTime(0.001, 0.001),
+        "slow": ImportTime(0.5, 0.6),
+        "medium": ImportTime(0.01, 0.02),
+    }
+
+    # when
+    report = profiler.report(limit=2)
+    # then
+    lines = report.splitlines()
+    assert "3 modules" in lines[0]
+    assert lines[1].endswith("slow") and lines[2].endswith("medium")
+    assert len(lines) == 3
+
+
+def test_startup_report_lists_cogs():
+    # given
+    report = StartupReport()
+    report.load_times = {"fword": 0.2, "role": 0.01}
+    report.prepare_times = {"fword": 1.5, "dnf": 0.3}
+
+    # when
+    lines = str(report).splitlines()
+    # then
+    assert lines[1] == "   200.0 |   1500.0 | fword"
+    assert lines[2] == "    10.0 |        - | role"
+    assert lines[3] == "       - |    300.0 | dnf"
@@ -0,0 +1,135 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy.exc import OperationalError
+
+import together_bot.models.fword_user as fword_user
+from together_bot.utils.db_toolkit import Session
+from together_bot.utils.write_behind import WriteBehindSet
+
+
+async def saved_ids() -> list[int]:
+    async with Session() as session:
+        return sorted(await fword_user.find_all_discord_ids(session))
+
+
+def test_add_and_discard_are_coalesced(run_with_db):
+    async def test(Session):
+        # given
+        users = WriteBehindSet(fword_user)
+        # when
+        for _ in range(10):
+            users.add(1)
+            users.discard(1)
+        users.add(1)
+        users.add(2)
+        users.discard(2)
+        # then
+        assert users.pending == {1: True, 2: False}
+        await users.flush()
+        assert users.pending == {}
+        assert await saved_ids() == [1]
+
+    run_with_db(test)
+
+
+def test_flush_deletes_saved_ids(run_with_db):
+    async def test(Session):
+        # given
+        users = WriteBehindSet(fword_user)
+        users.add(1)
+        users.add(2)
+        await users.flush()
+        # when
+        users.discard(1)
+        users.add(3)
+        await users.flush()
+        # then
+        assert await saved_ids() == [2, 3]
+
+    run_with_db(test)
+
+
+def test_load_keeps_pending_changes(run_with_db):
+    async def test(Session):
+        # given
+        saved = WriteBehindSet(fword_user)
+        saved.add(1)
+        saved.add(2)
+        await saved.flush()
+        users = WriteBehindSet(fword_user)
+        users.add(3)
+        users.items.add(1)
+        users.discard(1)
+        # when
+        await users.load()
+        # then
+        assert set(users) == {2, 3}
+
+    run_with_db(test)
+
+
+def test_failed_flush_is_retried(run_with_db):
+    async def test(Session):
+        # given
+        async def fail(session, discord_ids):
+            raise RuntimeError("DB is down")
+
+        model = SimpleNamespace(
+            __name__="broken", save_all=fail, delete_all=fword_user.delete_all
+        )
+        users = WriteBehindSet(model)
+        users.add(1)
+        users.add(2)
+        # when
+        await users.flush()
+        # then
+        assert users.pending == {1: True, 2: True}
+
+    run_with_db(test)
+
+
+def test_reload_loop_reads_changes_of_other_process(run_with_db):
+    async def test(Session):
+        # given
+        users = WriteBehindSet(fword_user, reload_interval=0.01)
+        other_process = WriteBehindSet(fword_user)
+        other_process.add(1)
+        await other_process.flush()
+        # when
+        users.start()
+        await asyncio.sleep(0.05)
+        await users.stop()
+        # then
+        assert 1 in users
+
+    run_with_db(test)
+
+
+def test_reload_loop_keeps_running_after_db_error(run_with_db, monkeypatch):
+    async def test(Session):
+        # given
+        users = WriteBehindSet(fword_user, reload_interval=0.01)
+        other_process = WriteBehindSet(fword_user)
+        other_process.add(1)
+        await other_process.flush()
+        find_all_discord_ids = fword_user.find_all_discord_ids
+        calls = 0
+
+        async def fail_once(session):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise OperationalError("SELECT", {}, Exception("database is locked"))
+            return await find_all_discord_ids(session)
+
+        monkeypatch.setattr(fword_user, "find_all_discord_ids", fail_once)
+        # when
+        users.start()
+        await asyncio.sleep(0.05)
+        await users.stop()
+        # then
+        assert calls > 1
+        assert 1 in users
+
+    run_with_db(test)
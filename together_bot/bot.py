@@ -1,21 +1,29 @@
+import asyncio
 import logging
 import logging.config
+import multiprocessing
+import signal
+import time
 from os import getenv
 from pathlib import Path
+from typing import Callable, Optional, Union
 
 import discord
 import yaml
 from discord.ext import commands
 from dotenv import load_dotenv
 
-import together_bot.channel
-import together_bot.commands
-import together_bot.dnf
-import together_bot.fword
-import together_bot.role
-import together_bot.time
 import together_bot.utils.db_toolkit as db_toolkit
-import together_bot.weather
+from together_bot.utils.classifier import classify
+from together_bot.utils.http import HttpClient
+from together_bot.utils.metrics import metrics, rss_bytes
+from together_bot.utils.scheduler import scheduler
+from together_bot.utils.sharding import (
+    IDENTIFY_INTERVAL,
+    fetch_recommended_shard_count,
+    split_shards,
+)
+from together_bot.utils.startup import StartupReport
 
 ROOT_DIR = Path(__file__).parent.parent
 CONFIG_PATH = ROOT_DIR.joinpath("logging.yml")
@@ -26,49 +34,291 @@ load_dotenv()
 
 DISCORD_BOT_TOKEN = getenv("DISCORD_BOT_TOKEN")
 
-intents = discord.Intents.default()
-intents.members = True
-bot = commands.Bot(command_prefix=commands.when_mentioned_or("!"), intents=intents)
 
+# 설정하면 AutoShardedBot으로 연결함. auto면 Discord가 권장하는 shard 수를 씀.
+SHARD_COUNT = getenv("SHARD_COUNT")
+# 1보다 크면 shard를 이 수의 process로 나눠서 실행함.
+SHARD_PROCESSES = int(getenv("SHARD_PROCESSES") or "1")
 
-@bot.event
-async def on_ready():
-    logging.info(f"We have logged in as {bot.user}")
+# 읽을 cog 목록. 각 이름은 setup(bot)을 가진 together_bot의 모듈이고 이 순서대로 읽음.
+_DEFAULT_COGS = "commands,db,channel,role,time,weather,fword,dnf,stats"
 
+# 봇이 쓰는 이벤트: 서버, 멤버 참가(player 역할), 명령어 메세지, 역할 반응
+_DEFAULT_INTENTS = "guilds,members,guild_messages,dm_messages,guild_reactions"
+
+# cog의 prepare()가 실패하면 1초부터 두 배씩, 최대 60초 간격으로 이 횟수만큼 다시 시도함.
+_PREPARE_RETRIES = int(getenv("COG_PREPARE_RETRIES") or "10")
+_PREPARE_RETRY_DELAY = 1.0
+_PREPARE_MAX_RETRY_DELAY = 60.0
+
+
+class TogetherBot(commands.Bot):
+    def __init__(self, *args, worker_index: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 외부 API를 부르는 cog는 모두 이 client를 씀.
+        self.http_client = HttpClient()
+        # 여러 process로 실행할 때 이 process의 순서
+        self.worker_index = worker_index
+
+        # cog의 리스너를 감싼 함수. remove_listener에서 원래 함수로 찾음.
+        self.timed_listeners: dict[Callable, Callable] = {}
+        # 시작 시간과 메모리는 처음 준비됐을 때 한 번만 기록함.
+        self.created_at = time.perf_counter()
+        self.startup_reported = False
+        self.startup = StartupReport()
+
+        self.before_invoke(start_command_timer)
+        self.after_invoke(record_command_time)
+
+    async def close(self):
+        await self.http_client.close()
+        await super().close()
+
+    # 모든 리스너가 걸린 시간을 "Cog.on_event" 이름으로 기록함.
+    def add_listener(self, func: Callable, name: Optional[str] = None):
+        timed = metrics.timed_listener(func.__qualname__)(func)
+        self.timed_listeners[func] = timed
+        super().add_listener(timed, name)
+
+    def remove_listener(self, func: Callable, name: Optional[str] = None):
+        super().remove_listener(self.timed_listeners.pop(func, func), name)
+
+    # 연결된 후에 추가된 cog는 바로 준비함.
+    def add_cog(self, cog: commands.Cog):
+        super().add_cog(cog)
+        if self.is_ready():
+            self.loop.create_task(self.prepare_cogs([cog]))
+
+    async def on_ready(self):
+        logging.info(f"We have logged in as {self.user}")
+        if not self.startup_reported:
+            self.startup_reported = True
+            await self.prepare_cogs(list(self.cogs.values()))
+            logging.info(self.startup_report())
+            logging.info(self.startup)
+
+    async def prepare_cogs(
+        self,
+        cogs: list[commands.Cog],
+        retries: int = _PREPARE_RETRIES,
+        retry_delay: float = _PREPARE_RETRY_DELAY,
+    ):
+        """
+        cog의 prepare()를 동시에 실행함. 탐색 엔진을 만들거나 DB를 읽는 것처럼 오래 걸리는 준비는
+        로그인을 늦추지 않도록 __init__ 대신 prepare()에서 함.
+        DB 연결 오류처럼 잠깐 실패할 수 있으므로 실패하면 retries번까지 간격을 늘려가며 다시 시도함.
+        """
+
+        async def prepare(cog: commands.Cog):
+            begin = time.perf_counter()
+            for attempt in range(retries + 1):
+                try:
+                    await cog.prepare()
+                    break
+                except Exception:
+                    logging.exception(
+                        f"{cog.qualified_name}: prepare failed "
+                        f"({attempt + 1}/{retries + 1})"
+                    )
+                if attempt < retries:
+                    await asyncio.sleep(
+                        min(retry_delay * 2**attempt, _PREPARE_MAX_RETRY_DELAY)
+                    )
+            name = cog.__module__.rpartition(".")[2]
+            self.startup.prepare_times[name] = time.perf_counter() - begin
+
+        await asyncio.gather(*(prepare(cog) for cog in cogs if hasattr(cog, "prepare")))
+
+    def startup_report(self) -> str:
+        cached_members = sum(len(guild.members) for guild in self.guilds)
+        return (
+            f"startup - ready in {time.perf_counter() - self.created_at:.1f}s, "
+            f"RSS {rss_bytes() / 2**20:.1f}MiB, guilds: {len(self.guilds)}, "
+            f"cached members: {cached_members}, "
+            f"cached messages: {len(self.cached_messages)}"
+        )
+
+    @metrics.timed_listener("on_message")
+    async def on_message(self, message: discord.Message):
+        if message.author == self.user:
+            return
+        if message.mentions and self.user in message.mentions:
+            content = message.content.strip()
+            mention_prefix = (self.user.mention, "<@!{}>".format(self.user.id))
+            if content.startswith(mention_prefix):
+                len_mention = content.find(">")
+                content = message.content[len_mention + 1 :].strip()
+                # remains for later
+
+        # 명령어가 아닌 메세지는 get_context()를 부르지 않음.
+        if not (await classify(self, message)).is_command:
+            return
+        await self.process_commands(message)
+
+
+# TogetherBot의 기능을 그대로 쓰면서 shard마다 gateway에 연결함.
+class ShardedTogetherBot(TogetherBot, commands.AutoShardedBot):
+    pass
+
+
+async def start_command_timer(ctx: commands.Context):
+    # 그룹과 하위 명령어는 차례대로 before, after가 불리므로 하나만 저장해도 됨.
+    ctx.invoke_started_at = time.perf_counter()
+
+
+async def record_command_time(ctx: commands.Context):
+    elapsed_time = time.perf_counter() - ctx.invoke_started_at
+    metrics.observe_command(ctx.command.qualified_name, elapsed_time)
 
-@bot.event
-async def on_message(message: discord.Message):
-    if message.author == bot.user:
-        return
-    if message.mentions and bot.user in message.mentions:
-        content = message.content.strip()
-        mention_prefix = (bot.user.mention, "<@!{}>".format(bot.user.id))
-        if content.startswith(mention_prefix):
-            len_mention = content.find(">")
-            content = message.content[len_mention + 1 :].strip()
-            # remains for later
 
-    await bot.process_commands(message)
+def create_bot(sharded: bool = False, **options) -> TogetherBot:
+    bot_class = ShardedTogetherBot if sharded else TogetherBot
+    cache_options = client_options()
+    # 설정마다 시작 시간과 메모리를 비교할 수 있도록 startup_report()와 함께 기록함.
+    logging.info(
+        "client options - "
+        + ", ".join(f"{name}: {value}" for name, value in cache_options.items())
+    )
+    return bot_class(
+        command_prefix=commands.when_mentioned_or("!"), **cache_options, **options
+    )
 
 
-def setup(bot: commands.Bot):
-    together_bot.commands.setup(bot)
-    together_bot.channel.setup(bot)
-    together_bot.role.setup(bot)
-    together_bot.time.setup(bot)
-    together_bot.weather.setup(bot)
-    together_bot.fword.setup(bot)
-    together_bot.dnf.setup(bot)
+def client_options() -> dict:
+    """
+    gateway intent와 캐시 설정을 환경 변수에서 읽음.
+    기본값은 봇이 쓰는 이벤트만 받고, 멤버는 discord.py의 기본 규칙대로 캐시함.
+    """
+    intent_names = getenv("GATEWAY_INTENTS") or _DEFAULT_INTENTS
+    intents = discord.Intents.none()
+    for name in intent_names.split(","):
+        set_flag(intents, name.strip())
+
+    member_cache = getenv("MEMBER_CACHE_FLAGS")
+    if not member_cache:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        member_cache_flags = discord.MemberCacheFlags.none()
+        for name in member_cache.split(","):
+            if name.strip() != "none":
+                set_flag(member_cache_flags, name.strip())
+
+    # 설정하지 않으면 members intent가 있을 때만 시작할 때 모든 멤버를 받음.
+    chunk_guilds_at_startup = getenv("CHUNK_GUILDS_AT_STARTUP")
+    max_messages = int(getenv("MAX_MESSAGES") or "1000")
+    return dict(
+        intents=intents,
+        member_cache_flags=member_cache_flags,
+        chunk_guilds_at_startup=(
+            intents.members
+            if not chunk_guilds_at_startup
+            else chunk_guilds_at_startup.lower() != "false"
+        ),
+        # 0이면 메세지를 캐시하지 않음.
+        max_messages=max_messages or None,
+    )
+
+
+def set_flag(flags: Union[discord.Intents, discord.MemberCacheFlags], name: str):
+    if name not in flags.VALID_FLAGS:
+        raise ValueError(f"unknown flag: {name}")
+    setattr(flags, name, True)
+
+
+def setup(bot: TogetherBot):
+    """
+    ENABLED_COGS의 cog만 extension으로 읽음. 꺼진 cog의 모듈과 의존성은 import하지 않음.
+    모듈마다 import 시간을 재서 cog별 시간과 함께 기록함.
+    """
+    names = (getenv("ENABLED_COGS") or _DEFAULT_COGS).split(",")
+    with bot.startup.imports:
+        for name in map(str.strip, names):
+            begin = time.perf_counter()
+            try:
+                bot.load_extension(f"together_bot.{name}")
+            except commands.ExtensionError:
+                logging.exception(f"failed to load cog: {name}")
+                continue
+            bot.startup.load_times[name] = time.perf_counter() - begin
+    logging.info(bot.startup.imports.report())
+
+
+def run_bot(sharded: bool = False, **options):
+    bot = create_bot(sharded, **options)
+    # engine의 연결은 봇과 같은 event loop에서 써야 함.
+    bot.loop.run_until_complete(db_toolkit.setup())
+    setup(bot)
+    scheduler.start(bot.loop)
+    metrics.loop_lag.start(bot.loop)
+    bot.run(DISCORD_BOT_TOKEN)
+
+
+def launch_workers(shard_count: int, processes: int):
+    """
+    shard를 processes개의 범위로 나눠서 process마다 AutoShardedBot을 실행하고 모두 끝날 때까지 기다림.
+    SIGTERM을 받으면 모든 process에 전달함.
+    """
+    # 여러 process가 동시에 테이블을 만들지 않도록 먼저 만들어 둠.
+    asyncio.run(prepare_database())
+
+    context = multiprocessing.get_context("spawn")
+    workers: list[multiprocessing.process.BaseProcess] = []
+
+    def terminate(signum, frame):
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    shard_ranges = split_shards(shard_count, processes)
+    for worker_index, shard_ids in enumerate(shard_ranges):
+        worker = context.Process(
+            target=run_bot,
+            kwargs=dict(
+                sharded=True,
+                shard_ids=shard_ids,
+                shard_count=shard_count,
+                worker_index=worker_index,
+            ),
+            name=f"shard-worker-{worker_index}",
+        )
+        worker.start()
+        workers.append(worker)
+        logging.info(f"{worker.name}: pid {worker.pid}, shards {shard_ids}")
+        # IDENTIFY는 process끼리 조율하지 않으므로 앞 process의 shard가 모두 연결한 후에 시작함.
+        if worker_index < len(shard_ranges) - 1:
+            time.sleep(IDENTIFY_INTERVAL * len(shard_ids))
+
+    for worker in workers:
+        worker.join()
+        if worker.exitcode != 0:
+            logging.error(f"{worker.name}: exit code {worker.exitcode}")
+
+
+async def prepare_database():
+    await db_toolkit.setup()
+    await db_toolkit.engine.dispose()
 
 
 def start():
     logging.info("Start bot")
-    if DISCORD_BOT_TOKEN:
-        db_toolkit.setup()
-        setup(bot)
-        bot.run(DISCORD_BOT_TOKEN)
-    else:
+    if not DISCORD_BOT_TOKEN:
         logging.error("MUST NEED BOT TOKEN")
+        return
+
+    shard_count = None
+    if SHARD_COUNT and SHARD_COUNT != "auto":
+        shard_count = int(SHARD_COUNT)
+
+    if SHARD_PROCESSES > 1:
+        if shard_count is None:
+            shard_count = asyncio.run(fetch_recommended_shard_count(DISCORD_BOT_TOKEN))
+        logging.info(f"shard count: {shard_count}, processes: {SHARD_PROCESSES}")
+        launch_workers(shard_count, SHARD_PROCESSES)
+    elif SHARD_COUNT:
+        run_bot(sharded=True, shard_count=shard_count)
+    else:
+        run_bot()
 
 
 if __name__ == "__main__":
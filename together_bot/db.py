@@ -0,0 +1,27 @@
+import logging
+
+from discord.ext import commands
+from sqlalchemy.exc import SQLAlchemyError
+
+import together_bot.utils.db_toolkit as db_toolkit
+
+
+@commands.command(brief="DB 연결 상태를 보여줌", help="연결을 하나 빌려서 걸린 시간과 pool 상태를 보여줌")
+@commands.is_owner()
+async def db(ctx: commands.Context):
+    try:
+        elapsed_time = await db_toolkit.probe()
+    except SQLAlchemyError:
+        logging.exception("DB probe failed")
+        await ctx.send("DB에 연결할 수 없음")
+        return
+
+    await ctx.send(
+        f"이번 checkout: {elapsed_time * 1000:.1f}ms\n"
+        f"{db_toolkit.pool_status()}\n"
+        f"{db_toolkit.metrics}"
+    )
+
+
+def setup(bot: commands.Bot):
+    bot.add_command(db)
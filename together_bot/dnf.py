@@ -2,30 +2,54 @@ import asyncio
 import datetime
 import logging
 import os
+from typing import Iterator, Optional
 
 import aiohttp
 import discord
-from discord.ext import commands, tasks
-from psycopg2 import IntegrityError
+from discord.ext import commands
 
-from together_bot.models import dnf_grade_channel
+from together_bot.models import dnf_grade_channel, job_run
+from together_bot.utils.broadcast import broadcast
 from together_bot.utils.db_toolkit import Session
+from together_bot.utils.http import HttpClient, HttpResponse
+from together_bot.utils.scheduler import KST, next_run_time, poll, scheduler, utcnow
+from together_bot.utils.sharding import owns_all_shards
+from together_bot.utils.write_behind import WriteBehindSet
 
 _DNF_API_BASE = "https://api.neople.co.kr/df"
 
 _APP_ID = os.getenv("DNF_API_KEY")
 
+_GRADE_ITEM_ID = "ff3bdb021bcf73864005e78316dd961c"
+
+# 오늘의 등급이 갱신되는 시각
+_GRADE_UPDATE_TIME = datetime.time(0, 0, tzinfo=KST)
+_GRADE_JOB = "dnf_grade"
+# 갱신 시각부터 이 시간(초) 동안 interval초에 0~interval초를 더한 간격으로 등급을 확인함.
+_GRADE_POLL_TIMEOUT = 600.0
+_GRADE_POLL_INTERVAL = 5.0
+# 등급은 갱신 시각부터 1분 안에 바뀌므로 그 후에 읽은 등급은 오늘의 등급임.
+_GRADE_SETTLE_TIME = datetime.timedelta(minutes=1)
+
+# 오늘의 등급 알림을 동시에 보내는 채널 수
+_BROADCAST_CONCURRENCY = int(os.getenv("DNF_BROADCAST_CONCURRENCY") or "10")
+
 
 class Dnf(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.channels: set[discord.TextChannel] = set()
+        # 채널 객체는 봇이 준비된 후에야 얻을 수 있으므로 id를 저장함.
+        self.channel_ids = WriteBehindSet(dnf_grade_channel)
         self.today_grade = None
         self.last_etag = None
-        self.loop_call_grade.start()
+        # 등급을 마지막으로 갱신한 시각(UTC)
+        self.grade_updated_at: Optional[datetime.datetime] = None
+        self.prepared = asyncio.Event()
+        self.channel_ids.start()
 
     def cog_unload(self):
-        self.loop_call_grade.cancel()
+        scheduler.remove(_GRADE_JOB)
+        self.channel_ids.stop()
         return super().cog_unload()
 
     @commands.group(brief="던파 도구")
@@ -37,36 +61,21 @@ class Dnf(commands.Cog):
     @dnf.command(brief="오늘의 등급 알림 등록")
     async def sub(self, ctx: commands.Context):
         channel: discord.TextChannel = ctx.channel
-        if channel in self.channels:
+        # DB에는 주기적으로 한 번에 저장함.
+        if not self.channel_ids.add(channel.id):
             logging.info(f"이미 등록된 채널: [{channel.id}] {channel.name}")
             return
 
-        try:
-            with Session() as session:
-                dnf_grade_channel.save(session, channel.id)
-                session.commit()
-        except IntegrityError as e:
-            if "UNIQUE constraint failed: " not in repr(e):
-                raise
-        self.channels.add(channel)
-
         logging.info(f"던파 오늘의 등급 알림 추가: [{channel.id}] {channel.name}")
         await ctx.send("던파 오늘의 등급 알림을 이 채널에 추가함.")
 
     @dnf.command(brief="오늘의 등급 알림 등록 해제")
     async def unsub(self, ctx: commands.Context):
         channel: discord.TextChannel = ctx.channel
-        if channel not in self.channels:
+        if not self.channel_ids.discard(channel.id):
             logging.info(f"등록되지 않은 채널: [{channel.id}] {channel.name}")
             return
 
-        with Session() as session:
-            channel_in_db = dnf_grade_channel.find_by_discord_id(session, channel.id)
-            if channel_in_db is not None:
-                session.delete(channel_in_db)
-                session.commit()
-        self.channels.discard(channel)
-
         logging.info(f"던파 오늘의 등급 알림 제거: [{channel.id}] {channel.name}")
         await ctx.send("던파 오늘의 등급 알림을 제거함.")
 
@@ -81,77 +90,127 @@ class Dnf(commands.Cog):
         grade_text = self.today_grade if self.today_grade is not None else "갱신되지 않음."
         await channel.send(f"던파 오늘의 등급: {grade_text}")
 
-    @tasks.loop(seconds=10)
-    async def loop_call_grade(self):
-        # KST 0시 0분에 등급을 알려줌.
-        current = datetime.datetime.utcnow()
-        if not (current.hour == 15 and current.minute == 0):
-            return
-
-        updated = await self.__try_update_grade()
-        if not updated:
-            return
+    # 매일 KST 0시에 scheduler가 실행함. 놓쳤으면 봇이 시작할 때나 늦게 깨어났을 때 실행함.
+    async def __announce_grade(self):
+        await self.prepared.wait()
+        # 시작하면서 놓친 알림을 보낼 때는 guild를 모두 받을 때까지 기다림.
+        await self.bot.wait_until_ready()
 
-        for channel in self.channels:
-            await self.__send_grade(channel)
-        await asyncio.sleep(60.0)
+        # 등급은 0시 0분과 1분 사이에 갱신되므로 갱신될 때까지 반복해서 확인함.
+        # 늦게 실행해서 이미 오늘의 등급을 읽었으면 기다리지 않음.
+        if not self.__has_today_grade():
+            updated = await poll(
+                self.__try_update_grade,
+                interval=_GRADE_POLL_INTERVAL,
+                jitter=_GRADE_POLL_INTERVAL,
+                timeout=_GRADE_POLL_TIMEOUT,
+            )
+            if not updated:
+                logging.warning("dnf grade: 오늘의 등급이 갱신되지 않음.")
+                return
+
+        # 채널마다 순서대로 기다리지 않고 동시에 보냄.
+        report = await broadcast(
+            self.__subscribed_channel_ids(),
+            self.__send_grade_to,
+            concurrency=_BROADCAST_CONCURRENCY,
+        )
+        # 403, 404를 받은 채널은 봇이 나갔거나 삭제된 채널이므로 구독을 해제함.
+        for channel_id in report.dropped:
+            self.channel_ids.discard(channel_id)
+        logging.info(f"dnf grade broadcast - {report}")
+        # 재시작한 후에 같은 날 다시 알리지 않도록 저장함.
+        async with Session() as session:
+            await job_run.save_last_run(session, _GRADE_JOB, utcnow())
+            await session.commit()
+
+    def __has_today_grade(self) -> bool:
+        if self.grade_updated_at is None:
+            return False
+        now = utcnow()
+        last_update = next_run_time(now, _GRADE_UPDATE_TIME) - datetime.timedelta(1)
+        return self.grade_updated_at >= last_update + _GRADE_SETTLE_TIME
+
+    def __subscribed_channel_ids(self) -> Iterator[int]:
+        owns_all = owns_all_shards(self.bot)
+        # 알림을 보내는 동안 구독이 바뀌어도 되도록 복사함.
+        for channel_id in list(self.channel_ids):
+            # 다른 process가 연결한 shard의 채널은 그 process가 보냄.
+            if not owns_all and self.bot.get_channel(channel_id) is None:
+                continue
+            yield channel_id
+
+    async def __send_grade_to(self, channel_id: int) -> bool:
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            # 캐시에 없으면 API로 찾음. 삭제됐거나 봇이 볼 수 없는 채널이면 NotFound, Forbidden이
+            # 나고 broadcast가 dropped에 모음.
+            channel = await self.bot.fetch_channel(channel_id)
+        # 장애 등으로 guild를 쓸 수 없거나 아직 받지 못했으면 구독을 남겨두고 다음에 보냄.
+        # 받지 못한 guild는 fetch_channel()이 discord.Object로 채우므로 unavailable이 없음.
+        guild = getattr(channel, "guild", None)
+        if guild is not None and getattr(guild, "unavailable", True):
+            logging.warning(f"dnf grade: [{channel_id}] guild를 쓸 수 없어서 건너뜀.")
+            return False
+        await self.__send_grade(channel)
+        return True
 
     async def __try_update_grade(self):
-        url = (
-            _DNF_API_BASE
-            + "/items/ff3bdb021bcf73864005e78316dd961c/shop?apikey="
-            + _APP_ID
-        )
         RETRY_COUNT = 3
         RETRY_DELAY = 1.0
-        async with aiohttp.ClientSession() as session:
-            for _ in range(RETRY_COUNT):
-                async with session.get(url) as response:
-                    logging.info(f"DnF API status : {response.status}")
-                    if response.status == 200:
-                        etag = response.headers["etag"]
-                        logging.info("DnF etag: " + etag)
-                        if etag == self.last_etag:
-                            return False
-
-                        content = await response.json()
-                        self.last_etag = etag
-                        self.today_grade = content["itemGradeName"]
-                        return True
+        for _ in range(RETRY_COUNT):
+            try:
+                response = await fetch_grade(self.bot.http_client, _APP_ID)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"DnF API error : {e!r}")
                 await asyncio.sleep(RETRY_DELAY)
+                continue
+            logging.info(f"DnF API status : {response.status}")
+            if response.status == 200:
+                # 바뀌지 않았으면 서버가 본문 없이 304를 응답함.
+                etag = response.headers["etag"]
+                logging.info("DnF etag: " + etag)
+                if response.from_cache or etag == self.last_etag:
+                    return False
+
+                self.last_etag = etag
+                self.today_grade = response.json()["itemGradeName"]
+                self.grade_updated_at = utcnow()
+                return True
+            await asyncio.sleep(RETRY_DELAY)
 
         return False
 
-    @loop_call_grade.before_loop
-    async def before_loop(self):
-        logging.info("DNF scheduler: wait for bot ready")
-        await self.bot.wait_until_ready()
-        self.__load_channels()
+    async def prepare(self):
+        await self.__load_channels()
         # 0시 0분과 1분 사이에 등급이 던파 서버에서 갱신되기 직전에 봇이 재시작해버리면
-        # 봇이 전날 등급이 최신인줄 알고 알릴 수 있으므로, 루프 전에 etag를 초기화함.
+        # 봇이 전날 등급이 최신인줄 알고 알릴 수 있으므로, 알림 전에 etag를 초기화함.
         await self.__try_update_grade()
+        self.prepared.set()
+
+        # 재시작하는 동안 0시의 알림을 놓쳤으면 scheduler가 바로 알림.
+        async with Session() as session:
+            last_run = await job_run.find_last_run(session, _GRADE_JOB)
+        scheduler.every_day(
+            _GRADE_JOB,
+            _GRADE_UPDATE_TIME,
+            self.__announce_grade,
+            catch_up=True,
+            last_run=last_run,
+        )
 
-    @loop_call_grade.after_loop
-    async def after_loop(self):
-        logging.info("DNF scheduler: stop loop")
+    async def __load_channels(self):
+        await self.channel_ids.load()
+        logging.info(f"dnf subscribed channel count: {len(self.channel_ids)}")
 
-    def __load_channels(self):
-        if self.bot is None:
-            return
 
-        with Session() as session:
-            for (channel_id,) in session.query(
-                dnf_grade_channel.DnfGradeChannel.discord_id
-            ):
-                new_channel = self.bot.get_channel(channel_id)
-                if new_channel is None or new_channel is not discord.TextChannel:
-                    logging.warn(
-                        f"dnf load channels: [{channel_id}] 존재하지 않는 채널이거나 텍스트 채널이 아님."
-                    )
-                    continue
-
-                self.channels.add(new_channel)
-        logging.info(f"dnf subscribed channel count: {len(self.channels)}")
+# 오늘의 등급을 알려주는 아이템의 상점 정보를 가져옴.
+async def fetch_grade(
+    http_client: HttpClient, app_id: str, api_base: str = _DNF_API_BASE
+) -> HttpResponse:
+    return await http_client.get(
+        f"{api_base}/items/{_GRADE_ITEM_ID}/shop", params={"apikey": app_id}
+    )
 
 
 def setup(bot: commands.Bot):
@@ -1,31 +1,146 @@
 from __future__ import annotations
 
+import asyncio
 import csv
+import datetime
+import functools
+import hashlib
 import logging
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import tempfile
 import time
-from itertools import islice
+import unicodedata
+from array import array
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Union,
+)
 
 import discord
-from discord.ext import commands
-from sqlalchemy.exc import IntegrityError
+from discord.ext import commands, tasks
 
+import together_bot.models.fword_detection as fword_detection
 import together_bot.models.fword_user as fword_user
+from together_bot.utils.classifier import classify
 from together_bot.utils.db_toolkit import Session
+from together_bot.utils.metrics import metrics
+from together_bot.utils.sharding import owns_all_shards
+from together_bot.utils.write_behind import WriteBehindSet
 
 ROOT_DIR = Path(__file__).parent.parent
 FWORD_LIST_PATH = ROOT_DIR.joinpath("fword_list.csv")
+# tools/fword_list_refinery.py --index 로 미리 만들어 둔 double_array 파일.
+FWORD_INDEX_PATH = ROOT_DIR.joinpath("fword_list.idx")
+
+# 비속어 탐색 엔진. trie는 기존 방식, aho_corasick은 메세지를 한 번만 훑는 방식,
+# double_array는 aho_corasick을 array로 저장해서 미리 만든 파일을 mmap으로 읽을 수 있는 방식임.
+# tools/fword_benchmark.py로 재면 double_array는 메모리를 1/5 정도만 쓰지만
+# 대부분의 채팅인 짧은 메세지를 30~50% 느리게 탐색함. 그래서 기본값은 처리량이 높은 aho_corasick이고,
+# 메모리가 부족하거나 여러 process가 같은 파일을 공유할 때만 double_array를 씀.
+_FWORD_MATCHER = os.getenv("FWORD_MATCHER") or "aho_corasick"
+
+# 이 글자 수 이상인 메세지는 event loop를 막지 않도록 worker에서 탐색함. 0이면 항상 직접 탐색함.
+_OFFLOAD_THRESHOLD = int(os.getenv("FWORD_OFFLOAD_THRESHOLD") or "1000")
+# process 또는 thread
+_OFFLOAD_EXECUTOR = os.getenv("FWORD_OFFLOAD_EXECUTOR") or "process"
+_OFFLOAD_WORKERS = int(os.getenv("FWORD_OFFLOAD_WORKERS") or "1")
+# 동시에 worker에 맡기는 탐색의 최대 개수. 넘으면 자리가 날 때까지 기다림.
+_OFFLOAD_MAX_PENDING = int(os.getenv("FWORD_OFFLOAD_MAX_PENDING") or "8")
+
+# fword audit, stats 결과로 보여줄 항목 수
+_REPORT_SIZE = 10
+# 명령어는 준비가 끝나길 이 시간(초)까지만 기다림.
+_PREPARE_TIMEOUT = 30.0
+# fword audit 한 번에 읽을 수 있는 최대 메세지 수
+_AUDIT_MAX_LIMIT = int(os.getenv("FWORD_AUDIT_MAX_LIMIT") or "5000")
+
+# 탐지 기록은 모아뒀다가 이 개수가 쌓이거나 이 시간(초)이 지나면 한 번에 저장함.
+_RECORD_FLUSH_SIZE = int(os.getenv("FWORD_RECORD_FLUSH_SIZE") or "100")
+_RECORD_FLUSH_INTERVAL = float(os.getenv("FWORD_RECORD_FLUSH_INTERVAL") or "30")
+# DB에 저장하지 못한 기록은 이 개수까지만 들고 있고, 넘으면 오래된 것부터 버림.
+_RECORD_MAX_BUFFER = int(os.getenv("FWORD_RECORD_MAX_BUFFER") or "10000")
+# shard를 여러 process로 나눠 실행할 때 감시 대상을 DB에서 다시 읽는 간격(초)
+_USER_RELOAD_INTERVAL = float(os.getenv("FWORD_USER_RELOAD_INTERVAL") or "60")
 
 
 # 원래는 컨벤션에 따라 f랑 word를 구분해야 하지만 명령어에서 구분하지 않기 때문에 일관성을 위해 코드에서도 구분하지 않음.
 class Fword(commands.Cog):
-    # 매번 비속어 검사를 할 때마다 DB를 읽지 않기 위해 저장함.
-    user_ids: set[int] = set()
-
-    def __init__(self, bot: commands.Bot):
+    def __init__(self, bot: commands.Bot, matcher: str = _FWORD_MATCHER):
         self.bot: commands.Bot = bot
-        self.__init_search_tree(FWORD_LIST_PATH)
-        self.__load_users()
+        self.matcher = matcher
+        self.reloading = asyncio.Lock()
+        # 탐색 엔진은 연결된 후 prepare()에서 만듦. 그 전에는 메세지를 검사하지 않음.
+        self.search_tree: Optional[Union[Trie, AhoCorasick, DoubleArrayTrie]] = None
+        self.prefilter: Optional[Prefilter] = None
+        self.prepared = asyncio.Event()
+        # 매번 비속어 검사를 할 때마다 DB를 읽지 않기 위해 저장함.
+        # DB는 event loop에서 비동기로 읽으므로 prepare()에서 채워짐.
+        # 사용자는 여러 shard의 guild에 있으므로 다른 process에서 켠 감시도 주기적으로 읽음.
+        self.user_ids = WriteBehindSet(
+            fword_user,
+            reload_interval=None if owns_all_shards(bot) else _USER_RELOAD_INTERVAL,
+        )
+        self.user_ids.start()
+        self.scan_pool = ScanPool(
+            FWORD_LIST_PATH,
+            FWORD_INDEX_PATH,
+            matcher,
+            threshold=_OFFLOAD_THRESHOLD,
+            executor_type=_OFFLOAD_EXECUTOR,
+            workers=_OFFLOAD_WORKERS,
+            max_pending=_OFFLOAD_MAX_PENDING,
+        )
+        # 봇 전체가 함께 쓰는 monitor이고 bot.start()에서 시작함.
+        self.loop_lag = metrics.loop_lag
+        self.recorder = DetectionRecorder(
+            flush_size=_RECORD_FLUSH_SIZE,
+            flush_interval=_RECORD_FLUSH_INTERVAL,
+            max_buffer=_RECORD_MAX_BUFFER,
+        )
+        self.recorder.start()
+
+    def cog_unload(self):
+        self.scan_pool.shutdown()
+        # cog_unload는 기다릴 수 없으므로 남은 기록의 저장은 task로 실행함.
+        self.recorder.stop()
+        self.user_ids.stop()
+        return super().cog_unload()
+
+    async def prepare(self):
+        # 탐색 엔진 생성은 CPU를 쓰므로 executor에서 하고, 그 동안 감시 대상을 DB에서 읽음.
+        await asyncio.gather(
+            self.bot.loop.run_in_executor(
+                None,
+                self.__init_search_tree,
+                FWORD_LIST_PATH,
+                FWORD_INDEX_PATH,
+                self.matcher,
+            ),
+            self.__load_users(),
+        )
+        self.prepared.set()
+
+    async def cog_before_invoke(self, ctx: commands.Context):
+        # 준비하는 동안은 기다리지만, 준비에 계속 실패해도 명령어가 멈춰 있지 않도록 포기함.
+        try:
+            await asyncio.wait_for(self.prepared.wait(), _PREPARE_TIMEOUT)
+        except asyncio.TimeoutError:
+            await ctx.send("비속어 탐지기를 아직 준비하지 못함", delete_after=15.0)
+            raise commands.CommandError("fword is not prepared") from None
 
     @commands.group(brief="비속어 탐지기")
     async def fword(self, ctx: commands.Context):
@@ -39,65 +154,449 @@ class Fword(commands.Cog):
         author_id = ctx.author.id
         author_display_name = ctx.author.display_name
         if is_on == "on":
-            if author_id not in self.user_ids:
-                try:
-                    with Session() as session:
-                        fword_user.save(session, author_id)
-                        session.commit()
-                # discord_id가 이미 있을 때만 무시함.
-                except IntegrityError as e:
-                    if "UNIQUE constraint failed: fword_user.discord_id" not in repr(e):
-                        raise
-
+            # DB에는 주기적으로 한 번에 저장함.
             self.user_ids.add(author_id)
             await ctx.send(f"`{author_display_name}`에 대한 비속어 탐지 켜짐")
         elif is_on == "off":
-            if author_id in self.user_ids:
-                with Session() as session:
-                    user = fword_user.find_by_discord_id(session, author_id)
-                    if user is not None:
-                        session.delete(user)
-                        session.commit()
             self.user_ids.discard(author_id)
             await ctx.send(f"`{author_display_name}`에 대한 비속어 탐지 꺼짐")
 
+    @fword.command(brief="긴 메세지 탐색을 맡는 worker와 event loop 지연 시간을 보여줌")
+    async def pool(self, ctx: commands.Context):
+        await ctx.send(f"{self.scan_pool}\n{self.loop_lag}")
+
+    # self.prefilter와 헷갈리지 않도록 메서드 이름을 다르게 하고 명령어 이름만 prefilter로 씀.
+    @fword.command(name="prefilter", brief="비속어 탐색 전에 걸러낸 메세지 수를 보여줌")
+    async def prefilter_stats(self, ctx: commands.Context):
+        await ctx.send(str(self.prefilter))
+
+    @fword.command(
+        brief="채널의 지난 메세지에서 사용자별 비속어 사용 횟수를 셈",
+        help=(
+            "channel을 생략하면 현재 채널, limit은 최근 메세지 수 "
+            f"(기본 1000개, 최대 {_AUDIT_MAX_LIMIT}개). "
+            "그 채널의 메세지 관리 권한이 있어야 함."
+        ),
+    )
+    @commands.guild_only()
+    async def audit(
+        self,
+        ctx: commands.Context,
+        channel: Optional[discord.TextChannel] = None,
+        limit: int = 1000,
+    ):
+        channel = channel or ctx.channel
+        # 권한은 명령어를 입력한 채널이 아니라 읽을 채널에서 확인함.
+        # 다른 서버의 채널은 있는지도 알려주지 않음.
+        if channel.guild != ctx.guild:
+            await ctx.send("이 서버의 채널만 검사할 수 있음")
+            return
+        permissions = channel.permissions_for(ctx.author)
+        if not (permissions.read_message_history and permissions.manage_messages):
+            await ctx.send(f"{channel.mention}의 메세지를 관리할 권한 없음")
+            return
+        limit = max(1, min(limit, _AUDIT_MAX_LIMIT))
+
+        # 사용자 수만큼만 저장하고 메세지는 저장하지 않음.
+        counts: Counter[discord.abc.User] = Counter()
+        async with ctx.typing():
+            async for message, occurrences in scan_many(
+                channel.history(limit=limit, before=ctx.message),
+                self.search_tree,
+                self.prefilter,
+                self.scan_pool,
+            ):
+                counts[message.author] += len(occurrences)
+
+        if not counts:
+            await ctx.send(f"{channel.mention}의 최근 메세지 {limit}개에서 비속어 없음")
+            return
+
+        ranking = "\n".join(
+            f"`{user.display_name}`: {count}회"
+            for user, count in counts.most_common(_REPORT_SIZE)
+        )
+        await ctx.send(f"{channel.mention}의 최근 메세지 {limit}개 비속어 사용 횟수\n{ranking}")
+
+    @fword.command(
+        brief="서버의 비속어 탐지 통계를 보여줌",
+        help="member를 입력하면 그 사용자가 많이 쓴 비속어를 보여줌",
+    )
+    @commands.guild_only()
+    async def stats(
+        self, ctx: commands.Context, member: Optional[discord.Member] = None
+    ):
+        # 아직 저장하지 않은 기록도 통계에 포함함.
+        await self.recorder.flush()
+        guild_id = ctx.guild.id
+        if member is None:
+            async with Session() as session:
+                rows = await fword_detection.count_by_user(
+                    session, guild_id, limit=_REPORT_SIZE
+                )
+            lines = []
+            for user_id, count in rows:
+                user = ctx.guild.get_member(user_id)
+                name = user.display_name if user is not None else str(user_id)
+                lines.append(f"`{name}`: {count}회")
+            title = "비속어 탐지 횟수"
+        else:
+            async with Session() as session:
+                rows = await fword_detection.count_by_word(
+                    session, member.id, guild_id, limit=_REPORT_SIZE
+                )
+            lines = [f"`{word}`: {count}회" for word, count in rows]
+            title = f"`{member.display_name}`이(가) 많이 쓴 비속어"
+
+        if not lines:
+            await ctx.send("탐지 기록 없음")
+            return
+        await ctx.send(title + "\n" + "\n".join(lines))
+
+    @fword.command(brief="비속어 목록을 봇 재시작 없이 다시 읽음")
+    @commands.is_owner()
+    async def reload(self, ctx: commands.Context):
+        if self.reloading.locked():
+            await ctx.send("이미 비속어 목록을 다시 읽는 중")
+            return
+
+        async with self.reloading:
+            old_words = self.prefilter.word_count
+            old_memory = self.search_tree.memory_usage()
+            begin = time.perf_counter()
+            # 새 탐색 엔진은 event loop 밖에서 만들고, 다 만든 후에 한 번에 바꿈.
+            # 이미 탐색 중인 메세지는 이전 탐색 엔진을 계속 씀.
+            loop = asyncio.get_running_loop()
+            search_tree, prefilter = await loop.run_in_executor(
+                None, build_search_tree, FWORD_LIST_PATH, FWORD_INDEX_PATH, self.matcher
+            )
+            prefilter.rejected += self.prefilter.rejected
+            prefilter.passed += self.prefilter.passed
+            self.search_tree, self.prefilter = search_tree, prefilter
+            # process worker는 시작할 때 읽은 탐색 엔진을 갖고 있으므로 종료하고,
+            # 다음 긴 메세지가 올 때 새로 만듦. 이전 worker는 맡은 탐색을 끝내고 종료됨.
+            self.scan_pool.shutdown()
+            elapsed_time = time.perf_counter() - begin
+
+        new_memory = search_tree.memory_usage()
+        logging.info(
+            f"fword list reload - elapsed time: {elapsed_time}, "
+            f"words: {old_words} -> {prefilter.word_count}, "
+            f"memory: {old_memory} -> {new_memory} bytes"
+        )
+        await ctx.send(
+            f"비속어 목록 다시 읽음 ({elapsed_time:.2f}초)\n"
+            f"단어: {prefilter.word_count}개 ({prefilter.word_count - old_words:+d})\n"
+            f"메모리: {new_memory} bytes ({new_memory - old_memory:+d})"
+        )
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        if message.author.bot:
+        if message.author.bot or not self.prepared.is_set():
             return
 
         if message.author.id not in self.user_ids:
             return
 
+        # fword reload로 바뀌어도 이 메세지는 같은 목록으로 검사함.
+        search_tree, prefilter = self.search_tree, self.prefilter
+
+        # 정규화는 한 번만 하고 사전 필터와 탐색에서 함께 씀.
+        origin = message.content
+        normalized = normalize(origin, search_tree)
+
+        # 비속어가 나올 수 없는 메세지는 명령어 확인과 탐색을 모두 건너뜀.
+        if not prefilter.may_match(normalized.text):
+            return
+
+        # 명령어는 검사하지 않음. 분류 결과는 bot.py의 on_message와 공유함.
+        if (await classify(self.bot, message)).is_command:
+            return
+
         # 비속어 탐지
-        ctx = await self.bot.get_context(message)
-        if not ctx.valid:
-            origin = message.content
-            occurrences = self.search_tree.find_all_occurrences(origin)
-            if len(occurrences) == 0:
+        normalized_occurrences = await self.scan_pool.find_all_normalized(
+            search_tree, normalized.text
+        )
+        if len(normalized_occurrences) == 0:
+            return
+
+        # 통계에는 정규화된 비속어를 저장해서 변형된 표기를 하나로 묶음.
+        self.recorder.record(
+            message.author.id,
+            message.guild.id if message.guild is not None else None,
+            (normalized.text[r.start : r.stop] for r in normalized_occurrences),
+            message.created_at,
+        )
+
+        # 찾은 범위는 원래 메세지의 범위로 바꿈.
+        occurrences = normalized.to_original(normalized_occurrences)
+
+        # 중복된 비속어는 한번만 출력해야 함.
+        detected_fwords = get_detected_fwords(origin, occurrences)
+        logging.info(
+            f'fword detect - {message.author.id}: {", ".join(detected_fwords)}'
+        )
+
+        await message.reply(
+            "비속어 감지 - " + summarize_fwords(detected_fwords), mention_author=False
+        )
+
+    def __init_search_tree(self, file_path: Path, index_path: Path, matcher: str):
+        timestamp_load_begin = time.perf_counter()
+        self.search_tree, self.prefilter = build_search_tree(
+            file_path, index_path, matcher
+        )
+        elapsed_time = time.perf_counter() - timestamp_load_begin
+        logging.info(
+            f"fword list load - matcher: {matcher}, elapsed time: {elapsed_time}, "
+            f"memory: {self.search_tree.memory_usage()} bytes"
+        )
+
+    async def __load_users(self):
+        await self.user_ids.load()
+        logging.info(f"fword user count: {len(self.user_ids)}")
+
+
+class DetectionRecorder:
+    """
+    비속어 탐지 기록을 메모리에 모았다가 한 번에 DB에 저장함.
+    flush_size개가 쌓이거나 flush_interval초마다 저장해서
+    탐지할 때마다 Session을 열고 commit하지 않음.
+    저장에 실패하면 retry_delay초부터 두 배씩 늘려 max_retry_delay초까지 기다렸다가 다시 시도하고,
+    그동안 쌓인 기록이 max_buffer개를 넘으면 오래된 것부터 버림.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = 100,
+        flush_interval: float = 30.0,
+        max_buffer: int = 10000,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 300.0,
+    ):
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.buffer: list[dict] = []
+        self.lock = asyncio.Lock()
+        self.flushed = 0
+        self.dropped = 0
+        # 연속으로 실패한 횟수와 다음에 다시 시도할 수 있는 event loop 시각
+        self.failures = 0
+        self.retry_at = 0.0
+        self.flush_loop.change_interval(seconds=flush_interval)
+
+    def start(self):
+        self.flush_loop.start()
+
+    # 남은 기록을 저장하는 task를 반환함.
+    def stop(self) -> asyncio.Task:
+        self.flush_loop.cancel()
+        return asyncio.get_running_loop().create_task(self.flush(force=True))
+
+    def record(
+        self,
+        discord_id: int,
+        guild_id: Optional[int],
+        words: Iterable[str],
+        detected_at: datetime.datetime,
+    ):
+        self.buffer.extend(
+            fword_detection.to_mapping(discord_id, guild_id, word, detected_at)
+            for word in words
+        )
+        self.__drop_overflow()
+        if (
+            len(self.buffer) >= self.flush_size
+            and not self.lock.locked()
+            and not self.__backing_off()
+        ):
+            asyncio.get_running_loop().create_task(self.flush())
+
+    # force가 아니면 실패한 후 기다리는 동안에는 저장하지 않음.
+    async def flush(self, force: bool = False):
+        async with self.lock:
+            if not self.buffer or (self.__backing_off() and not force):
                 return
 
-            # 중복된 비속어는 한번만 출력해야 함.
-            detected_fwords = get_detected_fwords(origin, occurrences)
-            logging.info(
-                f'fword detect - {message.author.id}: {", ".join(detected_fwords)}'
-            )
+            rows, self.buffer = self.buffer, []
+            try:
+                async with Session() as session:
+                    await fword_detection.save_all(session, rows)
+                    await session.commit()
+            except Exception:
+                # 저장에 실패하면 기다렸다가 다시 시도함.
+                self.failures += 1
+                delay = min(
+                    self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay
+                )
+                self.retry_at = asyncio.get_running_loop().time() + delay
+                logging.exception(
+                    f"fword detection flush failed: {len(rows)} rows, "
+                    f"retry in {delay:.0f}s"
+                )
+                self.buffer[:0] = rows
+                self.__drop_overflow()
+                return
+            self.failures = 0
+            self.flushed += len(rows)
 
-            await message.reply(
-                "비속어 감지 - " + summarize_fwords(detected_fwords), mention_author=False
+    def __backing_off(self) -> bool:
+        return self.failures > 0 and asyncio.get_running_loop().time() < self.retry_at
+
+    def __drop_overflow(self):
+        overflow = len(self.buffer) - self.max_buffer
+        if overflow > 0:
+            del self.buffer[:overflow]
+            self.dropped += overflow
+            logging.warning(
+                f"fword detection buffer is full: dropped {overflow} oldest rows "
+                f"({self.dropped} in total)"
             )
 
-    def __init_search_tree(self, file_path: str):
-        timestamp_load_begin = time.process_time()
-        self.search_tree = Trie.from_file(file_path)
-        elapsed_time = time.process_time() - timestamp_load_begin
-        logging.info(f"fword list load - elapsed time: {elapsed_time}")
+    @tasks.loop(seconds=30.0)
+    async def flush_loop(self):
+        await self.flush()
 
-    def __load_users(self):
-        with Session() as session:
-            for (user_id,) in session.query(fword_user.FwordUser.discord_id):
-                self.user_ids.add(user_id)
-        logging.info(f"fword user count: {len(self.user_ids)}")
+
+class ScanPool:
+    """
+    threshold 글자 이상인 메세지의 탐색을 executor에서 실행해서 event loop를 막지 않음.
+    process executor의 worker는 시작할 때 탐색 엔진을 한 번만 읽어두고 메세지만 받음.
+    동시에 맡길 수 있는 탐색은 max_pending개이고, 넘으면 자리가 날 때까지 기다림.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        index_path: Path,
+        matcher: str,
+        threshold: int,
+        executor_type: str = "process",
+        workers: int = 1,
+        max_pending: int = 8,
+    ):
+        if executor_type not in ("process", "thread"):
+            raise ValueError(f"unknown executor type: {executor_type}")
+
+        self.file_path = file_path
+        self.index_path = index_path
+        self.matcher = matcher
+        self.threshold = threshold
+        self.executor_type = executor_type
+        self.workers = workers
+        self.max_pending = max_pending
+        # 실제로 긴 메세지가 올 때까지 worker를 만들지 않음.
+        self.executor: Optional[Executor] = None
+        # Python 3.9의 Semaphore는 만들 때의 event loop에 묶이므로 처음 맡길 때 만듦.
+        self.pending: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.offloaded = 0
+        # 직접 탐색한 시간. 이 시간 동안 event loop가 막힘.
+        self.inline_times: deque[float] = deque(maxlen=1000)
+
+    def __create_executor(self) -> Executor:
+        if self.executor_type == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix="fword")
+        # 봇은 여러 thread를 쓰므로 fork 대신 새 interpreter로 worker를 시작함.
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.file_path, self.index_path, self.matcher),
+        )
+
+    # normalize()를 거친 문장을 받아서 find_all_normalized()의 결과를 반환함.
+    async def find_all_normalized(
+        self, search_tree: Union[Trie, AhoCorasick, DoubleArrayTrie], sentence: str
+    ) -> list[range]:
+        if self.threshold <= 0 or len(sentence) < self.threshold:
+            begin = time.perf_counter()
+            occurrences = search_tree.find_all_normalized(sentence)
+            self.inline_times.append(time.perf_counter() - begin)
+            return occurrences
+
+        return await self.__offload(
+            search_tree.find_all_normalized, _find_in_worker, sentence
+        )
+
+    # normalize()를 거친 문장 여러 개를 탐색함. 합친 길이가 threshold 이상이면 worker에 한 번에 맡김.
+    async def find_many_normalized(
+        self,
+        search_tree: Union[Trie, AhoCorasick, DoubleArrayTrie],
+        sentences: list[str],
+    ) -> list[list[range]]:
+        if self.threshold <= 0 or sum(map(len, sentences)) < self.threshold:
+            begin = time.perf_counter()
+            occurrences = _find_many(search_tree, sentences)
+            self.inline_times.append(time.perf_counter() - begin)
+            return occurrences
+
+        return await self.__offload(
+            functools.partial(_find_many, search_tree), _find_many_in_worker, sentences
+        )
+
+    async def __offload(self, thread_func, worker_func, argument):
+        if self.pending is None:
+            self.pending = asyncio.Semaphore(self.max_pending)
+        self.waiting += 1
+        try:
+            await self.pending.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            self.offloaded += 1
+            if self.executor is None:
+                self.executor = self.__create_executor()
+            loop = asyncio.get_running_loop()
+            if self.executor_type == "thread":
+                return await loop.run_in_executor(self.executor, thread_func, argument)
+            return await loop.run_in_executor(self.executor, worker_func, argument)
+        finally:
+            self.pending.release()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def __str__(self) -> str:
+        inline_ms = [elapsed * 1000 for elapsed in self.inline_times]
+        inline = (
+            f"평균 {sum(inline_ms) / len(inline_ms):.2f}ms, 최대 {max(inline_ms):.2f}ms"
+            if inline_ms
+            else "없음"
+        )
+        return (
+            f"직접 탐색(최근 {len(inline_ms)}회): {inline}\n"
+            f"worker 탐색({self.executor_type} {self.workers}개, "
+            f"{self.threshold}자 이상): {self.offloaded}회, 대기 {self.waiting}"
+        )
+
+
+# process worker마다 한 번만 읽어두는 탐색 엔진
+_worker_search_tree: Optional[Union[Trie, AhoCorasick, DoubleArrayTrie]] = None
+
+
+def _init_worker(file_path: Path, index_path: Path, matcher: str):
+    global _worker_search_tree
+    _worker_search_tree = load_search_tree(file_path, index_path, matcher)
+
+
+def _find_in_worker(sentence: str) -> list[range]:
+    return _worker_search_tree.find_all_normalized(sentence)
+
+
+def _find_many_in_worker(sentences: list[str]) -> list[list[range]]:
+    return _find_many(_worker_search_tree, sentences)
+
+
+def _find_many(
+    search_tree: Union[Trie, AhoCorasick, DoubleArrayTrie], sentences: list[str]
+) -> list[list[range]]:
+    return list(map(search_tree.find_all_normalized, sentences))
 
 
 def get_detected_fwords(origin: str, occurrences: list[range]) -> set[str]:
@@ -117,6 +616,61 @@ def summarize_fwords(detected_fwords: set[str], max_represent=3) -> str:
     )
 
 
+async def scan_many(
+    messages: AsyncIterable[discord.Message],
+    search_tree: Union[Trie, AhoCorasick, DoubleArrayTrie],
+    prefilter: Optional[Prefilter] = None,
+    scan_pool: Optional[ScanPool] = None,
+    batch_size: int = 100,
+) -> AsyncIterator[tuple[discord.Message, list[range]]]:
+    """
+    channel.history() 같은 메세지 스트림을 batch_size개씩 탐색해서
+    비속어가 있는 메세지와 원래 메세지에서 비속어가 차지하는 범위를 차례대로 내보냄.
+    한 번에 batch_size개의 메세지만 들고 있으므로 긴 기록도 메모리를 일정하게 씀.
+    """
+    batch: list[tuple[discord.Message, NormalizedText]] = []
+    async for message in messages:
+        if message.author.bot:
+            continue
+
+        normalized = normalize(message.content, search_tree)
+        # 지난 메세지는 실제 대화의 사전 필터 통계에 넣지 않음.
+        if prefilter is not None and not prefilter.may_match(
+            normalized.text, count=False
+        ):
+            continue
+
+        batch.append((message, normalized))
+        if len(batch) >= batch_size:
+            for hit in await _scan_batch(batch, search_tree, scan_pool):
+                yield hit
+            batch = []
+
+    if batch:
+        for hit in await _scan_batch(batch, search_tree, scan_pool):
+            yield hit
+
+
+async def _scan_batch(
+    batch: list[tuple[discord.Message, NormalizedText]],
+    search_tree: Union[Trie, AhoCorasick, DoubleArrayTrie],
+    scan_pool: Optional[ScanPool],
+) -> list[tuple[discord.Message, list[range]]]:
+    sentences = [normalized.text for _, normalized in batch]
+    if scan_pool is not None:
+        results = await scan_pool.find_many_normalized(search_tree, sentences)
+    else:
+        results = _find_many(search_tree, sentences)
+        # 직접 탐색했으면 다음 batch 전에 다른 작업이 실행될 수 있게 양보함.
+        await asyncio.sleep(0)
+
+    hits = []
+    for (message, normalized), occurrences in zip(batch, results):
+        if occurrences:
+            hits.append((message, normalized.to_original(occurrences)))
+    return hits
+
+
 def setup(bot: commands.Bot):
     if FWORD_LIST_PATH.exists():
         bot.add_cog(Fword(bot))
@@ -124,6 +678,35 @@ def setup(bot: commands.Bot):
         logging.warning("Skip to add fword command")
 
 
+def build_search_tree(
+    file_path: Path, index_path: Path, matcher: str
+) -> tuple[Union[Trie, AhoCorasick, DoubleArrayTrie], Prefilter]:
+    search_tree = load_search_tree(file_path, index_path, matcher)
+    return search_tree, Prefilter(search_tree.words())
+
+
+def load_search_tree(
+    file_path: Path, index_path: Path, matcher: str
+) -> Union[Trie, AhoCorasick, DoubleArrayTrie]:
+    if matcher not in MATCHERS:
+        raise ValueError(f"unknown fword matcher: {matcher}")
+
+    # 미리 만든 파일이 없거나 csv가 바뀌었으면 csv로부터 새로 만듦.
+    if matcher == "double_array" and index_path.exists():
+        try:
+            return DoubleArrayTrie.from_index(index_path, file_path)
+        except ValueError as e:
+            logging.warning(f"fword index is ignored: {e}")
+    return MATCHERS[matcher].from_file(file_path)
+
+
+def read_fwords(file_path: str) -> Iterator[str]:
+    with open(file_path, newline="", encoding="utf-8") as file:
+        csv_reader = csv.reader(file, skipinitialspace=True)
+        for row in csv_reader:
+            yield from row
+
+
 class TrieNode:
     def __init__(self, value: str):
         self.value: str = value
@@ -137,11 +720,8 @@ class Trie:
     @classmethod
     def from_file(cls, file_path: str) -> Trie:
         trie = cls()
-        with open(file_path, newline="", encoding="utf-8") as file:
-            csv_reader = csv.reader(file, skipinitialspace=True)
-            for row in csv_reader:
-                for col in row:
-                    trie.insert(col)
+        for word in read_fwords(file_path):
+            trie.insert(word)
         return trie
 
     def insert(self, new_value: str):
@@ -151,6 +731,7 @@ class Trie:
         if not isinstance(new_value, str):
             raise TypeError
 
+        new_value = normalize(new_value).text
         if len(new_value) == 0:
             return
 
@@ -193,6 +774,7 @@ class Trie:
             return False
 
         if isinstance(value, str):
+            value = normalize(value).text
             current_node = self.root
             for c in value:
                 if c not in current_node.child:
@@ -201,12 +783,39 @@ class Trie:
             return current_node.value == value
         return False
 
+    def words(self) -> list[str]:
+        words: list[str] = []
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if node.value is not None:
+                words.append(node.value)
+            nodes.extend(node.child.values())
+        return words
+
+    def memory_usage(self) -> int:
+        # 노드 객체, 노드의 __dict__, 자식 dict와 그 키, 저장된 문자열의 크기를 합함.
+        size = sys.getsizeof(self)
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            size += sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+            size += sys.getsizeof(node.child) + sum(map(sys.getsizeof, node.child))
+            if node.value is not None:
+                size += sys.getsizeof(node.value)
+            nodes.extend(node.child.values())
+        return size
+
     def find_all_occurrences(self, sentence: str) -> list[range]:
-        occurrences: list[range] = []
         if sentence is None:
             return None
 
-        sentence = sentence.casefold()
+        normalized = normalize(sentence, self)
+        return normalized.to_original(self.find_all_normalized(normalized.text))
+
+    # normalize()를 거친 문장에서 찾은 범위를 반환함.
+    def find_all_normalized(self, sentence: str) -> list[range]:
+        occurrences: list[range] = []
         substr_start = 0
         while substr_start < len(sentence):
             # 부분 문자열을 읽으면서 가장 비슷한 비속어를 탐색함.
@@ -235,3 +844,700 @@ class Trie:
             substr_start = substr_start + 1
 
         return occurrences
+
+
+class AhoCorasick:
+    """
+    Trie와 같은 인터페이스를 가진 Aho-Corasick 오토마타.
+    실패 링크와 출력 링크를 미리 계산해두고, 문장을 한 번만 훑어서 모든 비속어를 찾음.
+    결과는 Trie와 같이 가장 왼쪽에서 시작하는 가장 긴 단어를 겹치지 않게 고름.
+    """
+
+    def __init__(self):
+        # 상태 0은 root이고, 각 상태의 정보는 같은 인덱스의 리스트 원소에 저장함.
+        self.goto: list[dict[str, int]] = [{}]
+        # 해당 상태에서 끝나는 단어의 길이. 단어가 끝나지 않으면 0.
+        self.word_length: list[int] = [0]
+        self.fail: list[int] = [0]
+        # 실패 링크를 따라가면서 만나는 가장 가까운 단어가 끝나는 상태. 없으면 0.
+        self.output: list[int] = [0]
+        self.compiled = True
+
+    @classmethod
+    def from_file(cls, file_path: str) -> AhoCorasick:
+        automaton = cls()
+        for word in read_fwords(file_path):
+            automaton.insert(word)
+        automaton.compile()
+        return automaton
+
+    def insert(self, new_value: str):
+        if not isinstance(new_value, str):
+            raise TypeError
+
+        new_value = normalize(new_value).text
+        if len(new_value) == 0:
+            return
+
+        state = 0
+        for char in new_value:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.word_length.append(0)
+            state = next_state
+        self.word_length[state] = len(new_value)
+        # 단어가 추가되면 실패 링크를 다시 계산해야 함.
+        self.compiled = False
+
+    def compile(self):
+        # 루트에서 가까운 상태부터 너비 우선으로 실패 링크와 출력 링크를 계산함.
+        self.fail = [0] * len(self.goto)
+        self.output = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                fail_state = self.goto[fail_state].get(char, 0)
+                self.fail[next_state] = fail_state
+                self.output[next_state] = (
+                    fail_state
+                    if self.word_length[fail_state]
+                    else self.output[fail_state]
+                )
+                queue.append(next_state)
+        self.compiled = True
+
+    def __contains__(self, value: str):
+        if not isinstance(value, str):
+            return False
+        value = normalize(value).text
+        if len(value) == 0:
+            return False
+
+        state = 0
+        for char in value:
+            state = self.goto[state].get(char)
+            if state is None:
+                return False
+        return self.word_length[state] == len(value)
+
+    def words(self) -> list[str]:
+        words: list[str] = []
+        states = [(0, "")]
+        while states:
+            state, prefix = states.pop()
+            if self.word_length[state]:
+                words.append(prefix)
+            for char, next_state in self.goto[state].items():
+                states.append((next_state, prefix + char))
+        return words
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self)
+        for states in (self.word_length, self.fail, self.output):
+            size += sys.getsizeof(states)
+        size += sys.getsizeof(self.goto)
+        for transitions in self.goto:
+            size += sys.getsizeof(transitions) + sum(map(sys.getsizeof, transitions))
+        return size
+
+    def find_all_occurrences(self, sentence: str) -> list[range]:
+        if sentence is None:
+            return None
+
+        normalized = normalize(sentence, self)
+        return normalized.to_original(self.find_all_normalized(normalized.text))
+
+    def find_all_normalized(self, sentence: str) -> list[range]:
+        if not self.compiled:
+            self.compile()
+
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        word_length = self.word_length
+
+        # 시작 위치별로 가장 긴 단어의 길이만 기록함.
+        longest: dict[int, int] = {}
+        state = 0
+        for index, char in enumerate(sentence):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match = state if word_length[state] else output[state]
+            while match:
+                length = word_length[match]
+                start = index - length + 1
+                if longest.get(start, 0) < length:
+                    longest[start] = length
+                match = output[match]
+
+        return select_leftmost_longest(longest)
+
+
+# 시작 위치별 가장 긴 단어 길이에서, 왼쪽부터 겹치지 않는 단어 범위를 고름.
+def select_leftmost_longest(longest: dict[int, int]) -> list[range]:
+    occurrences: list[range] = []
+    end = 0
+    for start in sorted(longest):
+        if start >= end:
+            end = start + longest[start]
+            occurrences.append(range(start, end))
+    return occurrences
+
+
+class DoubleArrayTrie:
+    """
+    TrieNode 객체와 dict 대신 몇 개의 array에 모든 상태를 저장하는 double-array trie.
+    상태 s에서 문자 코드 c로 가는 상태는 t = base[s] + c 이고, check[t] == s 일 때만 유효함.
+    AhoCorasick과 같은 실패 링크와 출력 링크도 array로 가지고 있어서 문장을 한 번만 훑음.
+
+    array는 단어를 추가할 때마다 고치기 어렵기 때문에, insert()로 추가한 단어는 모아뒀다가
+    다음 탐색 전에 전체를 다시 만듦.
+    """
+
+    # 단어 목록을 하나의 문자열로 이어 붙일 때 쓰는 구분자.
+    _SEPARATOR = "\0"
+
+    # 미리 만든 파일의 형식. 형식이 바뀌면 버전을 올려서 이전 파일을 무시하게 함.
+    # magic, 버전, little endian 여부, csv의 sha256, 상태 개수, 문자 목록과 단어 목록의 byte 수
+    _INDEX_MAGIC = b"TBFW"
+    # 2: normalize()를 거친 단어를 저장함.
+    _INDEX_VERSION = 2
+    _INDEX_HEADER = struct.Struct("<4sHB32sIII")
+
+    def __init__(self):
+        # 문자별 코드. 자주 나오는 문자일수록 작은 코드를 받음. 0은 사전에 없는 문자임.
+        self.codes: dict[str, int] = {}
+        self.base = array("i", [0])
+        self.check = array("i", [-1])
+        self.word_length = array("i", [0])
+        self.fail = array("i", [0])
+        self.output = array("i", [0])
+        # 다시 만들 때 필요한 단어 목록. list[str]보다 작은 하나의 문자열로 저장함.
+        self.lexicon: str = ""
+        self.pending: set[str] = set()
+        # from_index()로 읽었을 때 array 대신 쓰는 mmap.
+        self.index: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_file(cls, file_path: str) -> DoubleArrayTrie:
+        double_array = cls()
+        for word in read_fwords(file_path):
+            double_array.insert(word)
+        double_array.compile()
+        return double_array
+
+    @classmethod
+    def from_index(cls, index_path: Path, source_path: Path) -> DoubleArrayTrie:
+        """
+        save()로 만든 파일을 mmap으로 읽음. array를 복사하지 않고 파일의 페이지를 그대로 쓰기 때문에
+        시작할 때 trie를 만들지 않고, 같은 호스트의 여러 프로세스가 같은 페이지를 공유함.
+        파일이 source_path의 csv로 만든 게 아니거나 형식이 다르면 ValueError를 던짐.
+        """
+        with open(index_path, "rb") as file:
+            index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls.__from_mmap(index, source_path)
+        except Exception:
+            index.close()
+            raise
+
+    @classmethod
+    def __from_mmap(cls, index: mmap.mmap, source_path: Path) -> DoubleArrayTrie:
+        header = cls._INDEX_HEADER
+        if len(index) < header.size:
+            raise ValueError("index file is too short")
+        (
+            magic,
+            version,
+            little_endian,
+            checksum,
+            state_count,
+            alphabet_size,
+            lexicon_size,
+        ) = header.unpack_from(index)
+        if magic != cls._INDEX_MAGIC or version != cls._INDEX_VERSION:
+            raise ValueError(f"unsupported index version: {magic!r} {version}")
+        if bool(little_endian) != (sys.byteorder == "little"):
+            raise ValueError("index file has different byte order")
+        if checksum != file_checksum(source_path):
+            raise ValueError(f"index file is stale: {source_path} is changed")
+        # 쓰다 만 파일이나 잘린 파일을 그대로 읽으면 단어를 놓치거나 cast가 실패함.
+        expected_size = (
+            _align(header.size) + state_count * 4 * 5 + alphabet_size + lexicon_size
+        )
+        if len(index) != expected_size:
+            raise ValueError(
+                f"index file size is {len(index)} bytes, expected {expected_size}"
+            )
+
+        # 문자열을 먼저 읽어서, 잘못된 utf-8이면 memoryview를 만들기 전에 실패하게 함.
+        # memoryview가 남아 있으면 from_index()가 mmap을 닫을 수 없음.
+        offset = _align(header.size) + state_count * 4 * 5
+        alphabet = index[offset : offset + alphabet_size].decode("utf-8")
+        offset += alphabet_size
+        lexicon = index[offset : offset + lexicon_size].decode("utf-8")
+
+        double_array = cls()
+        view = memoryview(index)
+        offset = _align(header.size)
+        states = []
+        for _ in range(5):
+            states.append(view[offset : offset + state_count * 4].cast("i"))
+            offset += state_count * 4
+        (
+            double_array.base,
+            double_array.check,
+            double_array.word_length,
+            double_array.fail,
+            double_array.output,
+        ) = states
+        double_array.lexicon = lexicon
+        double_array.codes = {char: code for code, char in enumerate(alphabet, 1)}
+        # memoryview가 가리키는 mmap을 닫지 않도록 참조를 유지함.
+        double_array.index = index
+        return double_array
+
+    def save(self, index_path: Path, source_path: Path):
+        if self.pending:
+            self.compile()
+
+        alphabet = "".join(sorted(self.codes, key=self.codes.get)).encode("utf-8")
+        lexicon = self.lexicon.encode("utf-8")
+        header = self._INDEX_HEADER.pack(
+            self._INDEX_MAGIC,
+            self._INDEX_VERSION,
+            sys.byteorder == "little",
+            file_checksum(source_path),
+            len(self.check),
+            len(alphabet),
+            len(lexicon),
+        )
+        # 실행 중인 봇이 기존 파일을 mmap으로 읽고 있을 수 있으므로 그 자리에서 덮어쓰지 않음.
+        # 같은 디렉토리의 임시 파일에 쓰고 교체해서, 읽던 프로세스는 이전 파일을 계속 씀.
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=Path(index_path).parent, suffix=".tmp", delete=False
+        ) as file:
+            try:
+                file.write(header.ljust(_align(len(header)), b"\0"))
+                for states in (
+                    self.base,
+                    self.check,
+                    self.word_length,
+                    self.fail,
+                    self.output,
+                ):
+                    file.write(array("i", states).tobytes())
+                file.write(alphabet)
+                file.write(lexicon)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, index_path)
+
+    def insert(self, new_value: str):
+        if not isinstance(new_value, str):
+            raise TypeError
+
+        new_value = normalize(new_value).text
+        if len(new_value) == 0:
+            return
+
+        self.pending.add(new_value)
+
+    def words(self) -> list[str]:
+        return self.lexicon.split(self._SEPARATOR) if self.lexicon else []
+
+    def compile(self):
+        words = sorted(self.pending.union(self.words()))
+        self.pending = set()
+        self.lexicon = self._SEPARATOR.join(words)
+
+        frequency = Counter(chain.from_iterable(words))
+        self.codes = {
+            char: code
+            for code, (char, _) in enumerate(frequency.most_common(), start=1)
+        }
+        self.base = array("i", [0])
+        self.check = array("i", [-1])
+        self.word_length = array("i", [0])
+        self.fail = array("i", [0])
+        self.output = array("i", [0])
+
+        # 같은 접두사를 가진 단어들은 정렬된 words에서 연속된 구간 [lo, hi)에 있음.
+        # 너비 우선으로 상태를 배치해야 실패 링크를 계산할 때 더 얕은 상태가 이미 배치되어 있음.
+        queue = deque([(0, 0, 0, len(words))])
+        used = bytearray(b"\x01")
+        while queue:
+            state, depth, lo, hi = queue.popleft()
+            children: list[tuple[int, int, int]] = []
+            index = lo + 1 if len(words[lo]) == depth else lo
+            while index < hi:
+                char = words[index][depth]
+                end = index + 1
+                while end < hi and words[end][depth] == char:
+                    end += 1
+                children.append((self.codes[char], index, end))
+                index = end
+            if not children:
+                continue
+
+            children.sort()
+            base = self.__find_base(children, used)
+            self.base[state] = base
+            for code, child_lo, child_hi in children:
+                child = base + code
+                self.check[child] = state
+                if len(words[child_lo]) == depth + 1:
+                    self.word_length[child] = depth + 1
+                fail = self.__next_state(self.fail[state], code) if state else 0
+                self.fail[child] = fail
+                self.output[child] = (
+                    fail if self.word_length[fail] else self.output[fail]
+                )
+                queue.append((child, depth + 1, child_lo, child_hi))
+
+    def __find_base(self, children: list[tuple[int, int, int]], used: bytearray) -> int:
+        # 가장 작은 코드의 자식을 빈 칸에 하나씩 놓아보면서 나머지 자식도 빈 칸에 들어가는 base를 찾음.
+        # 빈 칸은 used에서 C 수준의 find()로 건너뛰며 찾음.
+        min_code = children[0][0]
+        max_code = children[-1][0]
+        position = min_code + 1
+        while True:
+            position = used.find(0, position)
+            if position == -1:
+                position = len(used)
+            base = position - min_code
+            if base + max_code >= len(used):
+                grow = base + max_code + 1 - len(used)
+                used.extend(bytes(grow))
+                self.check.extend(array("i", [-1]) * grow)
+                for states in (self.base, self.word_length, self.fail, self.output):
+                    states.extend(array("i", [0]) * grow)
+            if all(not used[base + code] for code, _, _ in children):
+                for code, _, _ in children:
+                    used[base + code] = 1
+                return base
+            position += 1
+
+    def __next_state(self, state: int, code: int) -> int:
+        base, check, fail = self.base, self.check, self.fail
+        while True:
+            next_state = base[state] + code
+            if next_state < len(check) and check[next_state] == state:
+                return next_state
+            if not state:
+                return 0
+            state = fail[state]
+
+    def __contains__(self, value: str):
+        if not isinstance(value, str):
+            return False
+        value = normalize(value).text
+        if len(value) == 0:
+            return False
+        if self.pending:
+            self.compile()
+
+        state = 0
+        for char in value:
+            next_state = self.base[state] + self.codes.get(char, 0)
+            if next_state >= len(self.check) or self.check[next_state] != state:
+                return False
+            state = next_state
+        return self.word_length[state] == len(value)
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self) + sys.getsizeof(self.lexicon)
+        size += sys.getsizeof(self.codes) + sum(map(sys.getsizeof, self.codes))
+        for states in (self.base, self.check, self.word_length, self.fail, self.output):
+            # mmap으로 읽은 경우에는 memoryview 객체 대신 가리키는 페이지의 크기를 셈.
+            if isinstance(states, memoryview):
+                size += states.nbytes
+            else:
+                size += sys.getsizeof(states)
+        return size
+
+    def find_all_occurrences(self, sentence: str) -> list[range]:
+        if sentence is None:
+            return None
+
+        normalized = normalize(sentence, self)
+        return normalized.to_original(self.find_all_normalized(normalized.text))
+
+    def find_all_normalized(self, sentence: str) -> list[range]:
+        if self.pending:
+            self.compile()
+
+        codes = self.codes
+        base = self.base
+        check = self.check
+        fail = self.fail
+        output = self.output
+        word_length = self.word_length
+        size = len(check)
+
+        longest: dict[int, int] = {}
+        state = 0
+        for index, char in enumerate(sentence):
+            code = codes.get(char)
+            if code is None:
+                state = 0
+                continue
+            while True:
+                next_state = base[state] + code
+                if next_state < size and check[next_state] == state:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+
+            match = state if word_length[state] else output[state]
+            while match:
+                length = word_length[match]
+                start = index - length + 1
+                if longest.get(start, 0) < length:
+                    longest[start] = length
+                match = output[match]
+
+        return select_leftmost_longest(longest)
+
+
+# 자모로 풀어 쓴(NFD) 한글을 음절로 조합할 때 쓰는 조합형 자모의 범위.
+# 호환용 자모(ㄱ, ㅏ)는 사전에 자모 그대로 등록된 단어(ㅂㅓ, ㅅㅐ 등)가 있어서 조합하지 않음.
+_LEADS = range(0x1100, 0x1113)
+_VOWELS = range(0x1161, 0x1176)
+_TAILS = range(0x11A8, 0x11C3)
+_JAMO_PAIR = re.compile("[\u1100-\u1112][\u1161-\u1175]")
+
+# 영문자와 붙어 있을 때만 글자로 바꾸는 숫자와 기호. 숫자만 있는 토큰(예: 10놈)은 그대로 둠.
+_LEET = str.maketrans("013457@$", "oieastas")
+_LEET_CHARS = frozenset("013457@$")
+_LEET_TOKEN = re.compile("[0-9a-z@$]*[a-z][0-9a-z@$]*")
+
+# 한 글자씩 띄어 쓴 단어(시 발, s.e.x). 모든 토큰이 한 글자인 구간을 찾고 구분자를 지움.
+_SEPARATOR = r"[\s.,\-_*~·]"
+_NOT_SEPARATOR = r"[^\s.,\-_*~·]"
+_LETTER = r"[^\W\d_]"
+_SPACED_OUT = re.compile(
+    rf"(?<!{_NOT_SEPARATOR}){_LETTER}"
+    rf"(?:{_SEPARATOR}+{_LETTER}(?!{_NOT_SEPARATOR}))+"
+)
+_SEPARATORS = re.compile(rf"{_SEPARATOR}+")
+_ZERO_WIDTH = frozenset("\u200b\u200c\u200d\u2060\ufeff")
+
+
+@functools.lru_cache(maxsize=None)
+def _normalize_table() -> dict[int, str]:
+    """
+    str.translate()에 쓰는 한 글자 대 한 글자 변환표.
+    대소문자 구분 제거, 전각 문자를 반각으로, 반각 한글을 호환용 자모로 바꿈.
+    한 글자가 여러 글자로 바뀌는 경우(예: ß의 casefold)는 원래 문자열의 위치와 맞지 않으므로 제외함.
+    """
+    table: dict[int, str] = {0x3000: " "}
+    for code in range(0x10000):
+        char = chr(code)
+        if 0xFF01 <= code <= 0xFF5E:
+            char = chr(code - 0xFEE0)
+        elif 0xFFA0 <= code <= 0xFFDC:
+            # 반각 한글의 분해는 "<narrow> 3131" 처럼 호환용 자모를 가리킴.
+            decomposition = unicodedata.decomposition(char).split()
+            if len(decomposition) == 2:
+                char = chr(int(decomposition[1], 16))
+        folded = char.casefold()
+        if len(folded) == 1:
+            char = folded
+        if char != chr(code):
+            table[code] = char
+    return table
+
+
+class NormalizedText(NamedTuple):
+    text: str
+    # 정규화된 문자열의 각 글자가 원래 문자열에서 차지하던 범위. 길이가 같으면 None.
+    starts: Optional[array] = None
+    ends: Optional[array] = None
+
+    def to_original(self, occurrences: list[range]) -> list[range]:
+        if self.starts is None:
+            return occurrences
+        return [
+            range(self.starts[occurrence.start], self.ends[occurrence.stop - 1])
+            for occurrence in occurrences
+        ]
+
+
+def normalize(
+    sentence: str, matcher: Optional[Union[Trie, AhoCorasick, DoubleArrayTrie]] = None
+) -> NormalizedText:
+    """
+    비속어를 가리기 위해 바꾼 문장을 사전의 단어와 비교할 수 있게 바꿈.
+    글자 단위 변환은 str.translate() 한 번으로 끝내고, 글자를 지우거나 합쳐서 길이가 바뀔 때만
+    한 번 더 훑으면서 원래 문자열의 위치를 기록함.
+
+    한 글자씩 띄어 쓴 구간은 matcher로 사전의 단어를 찾아서 그 단어에 해당하는 부분만 합침.
+    matcher가 없으면 모두 합치고, 사전의 단어를 정규화할 때 씀.
+    """
+    text = sentence.translate(_normalize_table())
+    if not _LEET_CHARS.isdisjoint(text):
+        text = _LEET_TOKEN.sub(lambda match: match[0].translate(_LEET), text)
+
+    spaced_out: list[tuple[int, int]] = []
+    for run in _SPACED_OUT.finditer(text):
+        # 구분자 k는 구간의 k번째 글자와 k+1번째 글자 사이에 있음.
+        separators = list(_SEPARATORS.finditer(run[0]))
+        if matcher is None:
+            words = [range(len(separators) + 1)]
+        else:
+            words = _find_spaced_out_words(_SEPARATORS.sub("", run[0]), matcher)
+        offset = run.start()
+        for word in words:
+            spaced_out.extend(
+                (offset + match.start(), offset + match.end())
+                for match in separators[word.start : word.stop - 1]
+            )
+    if not spaced_out and _ZERO_WIDTH.isdisjoint(text) and not _JAMO_PAIR.search(text):
+        return NormalizedText(text)
+    return _rebuild(text, spaced_out)
+
+
+def _find_spaced_out_words(
+    letters: str, matcher: Union[Trie, AhoCorasick, DoubleArrayTrie]
+) -> list[range]:
+    # 한 글자씩 띄어 쓴 구간의 글자를 이어 붙인 letters에서 사전의 단어가 차지하는 범위를 찾음.
+    normalized = normalize(letters)
+    words = normalized.to_original(matcher.find_all_normalized(normalized.text))
+    # 단어가 아닌 글자가 두 글자 이상 이어지면 "그 년 도 에"처럼 평범하게 띄어 쓴 문장으로 보고
+    # 합치지 않음. "야 시 발"의 "야"처럼 한 글자만 남으면 단어에 붙은 글자로 봄.
+    covered = 0
+    for word in chain(words, [range(len(letters), len(letters))]):
+        if word.start - covered > 1:
+            return []
+        covered = word.stop
+    return words
+
+
+def _rebuild(text: str, spaced_out: list[tuple[int, int]]) -> NormalizedText:
+    # 구분자와 폭이 없는 문자를 지우고, 풀어 쓴 자모를 음절로 조합함.
+    chars: list[str] = []
+    starts = array("I")
+    ends = array("I")
+    # 마지막으로 내보낸 글자가 조합 중인 초성이나 음절이면 그 코드
+    syllable: Optional[int] = None
+
+    def emit(char: str, start: int, end: int):
+        chars.append(char)
+        starts.append(start)
+        ends.append(end)
+
+    spans = iter(spaced_out)
+    skip_start, skip_end = next(spans, (len(text), len(text)))
+    for index, char in enumerate(text):
+        if index >= skip_start:
+            if index < skip_end:
+                continue
+            skip_start, skip_end = next(spans, (len(text), len(text)))
+        if char in _ZERO_WIDTH:
+            continue
+
+        code = ord(char)
+        if syllable is not None:
+            # 초성 뒤의 중성, 받침이 없는 음절 뒤의 종성은 앞 글자에 합침.
+            if code in _VOWELS and syllable in _LEADS:
+                syllable = 0xAC00 + ((syllable - 0x1100) * 21 + code - 0x1161) * 28
+                ends[-1] = index + 1
+                chars[-1] = chr(syllable)
+                continue
+            if (
+                code in _TAILS
+                and 0xAC00 <= syllable <= 0xD7A3
+                and (syllable - 0xAC00) % 28 == 0
+            ):
+                syllable += code - 0x11A7
+                ends[-1] = index + 1
+                chars[-1] = chr(syllable)
+                syllable = None
+                continue
+        syllable = code if code in _LEADS else None
+        emit(char, index, index + 1)
+
+    return NormalizedText("".join(chars), starts, ends)
+
+
+class Prefilter:
+    """
+    사전의 단어가 하나도 나올 수 없는 메세지를 탐색 전에 빠르게 걸러냄.
+    단어의 첫 글자 집합과 가장 짧은 단어의 길이로 먼저 거르고, 남은 메세지는
+    한 글자 단어나 단어의 첫 두 글자가 메세지에 있는지 확인함.
+    사전이 작기 때문에 bloom filter 대신 정확한 set을 쓰고, 모든 확인은 set의 C 구현에서 끝남.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.first_chars: set[str] = set()
+        self.single_chars: set[str] = set()
+        self.bigrams: set[tuple[str, str]] = set()
+        self.min_length = 0
+        self.word_count = 0
+        for word in words:
+            if len(word) == 0:
+                continue
+            self.word_count += 1
+            self.first_chars.add(word[0])
+            if len(word) == 1:
+                self.single_chars.add(word)
+            else:
+                self.bigrams.add((word[0], word[1]))
+            if self.min_length == 0 or len(word) < self.min_length:
+                self.min_length = len(word)
+        # 걸러낸 메세지와 탐색하게 둔 메세지의 수
+        self.rejected = 0
+        self.passed = 0
+
+    # sentence는 normalize()를 거친 문장이어야 함. count가 False면 통계에 넣지 않음.
+    def may_match(self, sentence: str, count: bool = True) -> bool:
+        matched = not (
+            len(sentence) < self.min_length
+            or self.first_chars.isdisjoint(sentence)
+            or (
+                self.single_chars.isdisjoint(sentence)
+                and self.bigrams.isdisjoint(zip(sentence, islice(sentence, 1, None)))
+            )
+        )
+        if count:
+            if matched:
+                self.passed += 1
+            else:
+                self.rejected += 1
+        return matched
+
+    def __str__(self) -> str:
+        total = self.rejected + self.passed
+        ratio = self.rejected / total if total else 0.0
+        return f"탐색 생략: {self.rejected}, 탐색: {self.passed} " f"(생략 비율 {ratio:.1%})"
+
+
+def file_checksum(file_path: Path) -> bytes:
+    with open(file_path, "rb") as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+# mmap 위의 array가 정렬된 주소에서 시작하도록 8 byte 단위로 맞춤.
+def _align(size: int, alignment: int = 8) -> int:
+    return (size + alignment - 1) // alignment * alignment
+
+
+MATCHERS: dict[str, type[Union[Trie, AhoCorasick, DoubleArrayTrie]]] = {
+    "trie": Trie,
+    "aho_corasick": AhoCorasick,
+    "double_array": DoubleArrayTrie,
+}
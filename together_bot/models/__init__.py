@@ -1,3 +1,12 @@
+import importlib
+import pkgutil
+
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
+
+
+# cog는 필요할 때 읽으므로 테이블을 만들기 전에 모든 model을 Base에 등록함.
+def import_all():
+    for module in pkgutil.iter_modules(__path__):
+        importlib.import_module(f"{__name__}.{module.name}")
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, Integer
+from sqlalchemy import BigInteger, Column, Integer, delete, select
 
 from together_bot.models import Base
 
@@ -12,15 +12,50 @@ class DnfGradeChannel(Base):
 
 # 편의를 위해 만든 shortcut function임.
 # 모든 DB 접근에 대해 session을 함수로 감싸지 않아도 됨.
+# session은 AsyncSession이고, DB에 접근하는 함수는 await 해야 함.
 def save(session, discord_id: int) -> DnfGradeChannel:
     channel = DnfGradeChannel(discord_id=discord_id)
     session.add(channel)
     return channel
 
 
-def find_by_discord_id(session, discord_id: int) -> DnfGradeChannel:
-    return session.query(DnfGradeChannel).filter_by(discord_id=discord_id).one_or_none()
+async def find_by_discord_id(session, discord_id: int) -> DnfGradeChannel:
+    result = await session.execute(
+        select(DnfGradeChannel).filter_by(discord_id=discord_id)
+    )
+    return result.scalar_one_or_none()
 
 
-def find_all(session) -> list[DnfGradeChannel]:
-    return session.query(DnfGradeChannel).all()
+async def find_all(session) -> list[DnfGradeChannel]:
+    result = await session.execute(select(DnfGradeChannel).order_by(DnfGradeChannel.id))
+    return result.scalars().all()
+
+
+async def find_all_discord_ids(session) -> list[int]:
+    result = await session.execute(select(DnfGradeChannel.discord_id))
+    return result.scalars().all()
+
+
+# 이미 저장된 discord_id는 건너뛰고 나머지를 저장함.
+async def save_all(session, discord_ids: list[int]):
+    if not discord_ids:
+        return
+    result = await session.execute(
+        select(DnfGradeChannel.discord_id).where(
+            DnfGradeChannel.discord_id.in_(discord_ids)
+        )
+    )
+    saved = set(result.scalars())
+    session.add_all(
+        DnfGradeChannel(discord_id=discord_id)
+        for discord_id in discord_ids
+        if discord_id not in saved
+    )
+
+
+async def delete_all(session, discord_ids: list[int]):
+    if not discord_ids:
+        return
+    await session.execute(
+        delete(DnfGradeChannel).where(DnfGradeChannel.discord_id.in_(discord_ids))
+    )
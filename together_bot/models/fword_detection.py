@@ -0,0 +1,72 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    func,
+    insert,
+    select,
+)
+
+from together_bot.models import Base
+
+
+class FwordDetection(Base):
+    __tablename__ = "fword_detection"
+
+    id = Column(Integer, primary_key=True)
+    discord_id = Column(BigInteger, index=True, nullable=False)
+    guild_id = Column(BigInteger, index=True)
+    # normalize()를 거친 비속어
+    word = Column(String, nullable=False)
+    detected_at = Column(DateTime, nullable=False)
+
+
+def to_mapping(
+    discord_id: int,
+    guild_id: Optional[int],
+    word: str,
+    detected_at: datetime.datetime,
+) -> dict:
+    return dict(
+        discord_id=discord_id, guild_id=guild_id, word=word, detected_at=detected_at
+    )
+
+
+# 여러 탐지 기록을 한 번의 insert(executemany)로 저장함. 각 원소는 to_mapping()의 결과임.
+async def save_all(session, mappings: list[dict]):
+    await session.execute(insert(FwordDetection), mappings)
+
+
+# 탐지 횟수가 많은 사용자 순으로 (discord_id, 횟수)를 반환함.
+async def count_by_user(
+    session, guild_id: Optional[int], limit: int = 10
+) -> list[tuple[int, int]]:
+    count = func.count(FwordDetection.id)
+    result = await session.execute(
+        select(FwordDetection.discord_id, count)
+        .filter_by(guild_id=guild_id)
+        .group_by(FwordDetection.discord_id)
+        .order_by(count.desc(), FwordDetection.discord_id)
+        .limit(limit)
+    )
+    return result.all()
+
+
+# 사용자가 많이 쓴 비속어 순으로 (비속어, 횟수)를 반환함.
+async def count_by_word(
+    session, discord_id: int, guild_id: Optional[int], limit: int = 10
+) -> list[tuple[str, int]]:
+    count = func.count(FwordDetection.id)
+    result = await session.execute(
+        select(FwordDetection.word, count)
+        .filter_by(discord_id=discord_id, guild_id=guild_id)
+        .group_by(FwordDetection.word)
+        .order_by(count.desc(), FwordDetection.word)
+        .limit(limit)
+    )
+    return result.all()
@@ -0,0 +1,29 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, String, select
+
+from together_bot.models import Base
+
+
+# scheduler 작업을 마지막으로 실행한 시각. 봇이 재시작해도 같은 날 다시 실행하지 않기 위해 저장함.
+class JobRun(Base):
+    __tablename__ = "job_run"
+
+    name = Column(String(64), primary_key=True)
+    # UTC 기준
+    last_run = Column(DateTime, nullable=False)
+
+
+# 편의를 위해 만든 shortcut function임.
+# 모든 DB 접근에 대해 session을 함수로 감싸지 않아도 됨.
+# session은 AsyncSession이고, DB에 접근하는 함수는 await 해야 함.
+async def find_last_run(session, name: str) -> Optional[datetime.datetime]:
+    result = await session.execute(select(JobRun.last_run).filter_by(name=name))
+    last_run = result.scalar_one_or_none()
+    return last_run.replace(tzinfo=datetime.timezone.utc) if last_run else None
+
+
+async def save_last_run(session, name: str, last_run: datetime.datetime):
+    naive = last_run.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    await session.merge(JobRun(name=name, last_run=naive))
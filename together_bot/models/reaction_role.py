@@ -0,0 +1,45 @@
+import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, delete, select
+
+from together_bot.models import Base
+
+
+# role get으로 만든 메세지에 반응하면 받는 역할
+class ReactionRole(Base):
+    __tablename__ = "reaction_role"
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(BigInteger, unique=True, nullable=False)
+    guild_id = Column(BigInteger, nullable=False)
+    role_id = Column(BigInteger, nullable=False)
+    # UTC 기준. 이 시각에 메세지가 삭제됨.
+    expires_at = Column(DateTime, index=True, nullable=False)
+
+
+# 편의를 위해 만든 shortcut function임.
+# 모든 DB 접근에 대해 session을 함수로 감싸지 않아도 됨.
+# session은 AsyncSession이고, DB에 접근하는 함수는 await 해야 함.
+def save(
+    session,
+    message_id: int,
+    guild_id: int,
+    role_id: int,
+    expires_at: datetime.datetime,
+) -> ReactionRole:
+    reaction_role = ReactionRole(
+        message_id=message_id, guild_id=guild_id, role_id=role_id, expires_at=expires_at
+    )
+    session.add(reaction_role)
+    return reaction_role
+
+
+async def find_unexpired(session, now: datetime.datetime) -> list[ReactionRole]:
+    result = await session.execute(
+        select(ReactionRole).where(ReactionRole.expires_at > now)
+    )
+    return result.scalars().all()
+
+
+async def delete_expired(session, now: datetime.datetime):
+    await session.execute(delete(ReactionRole).where(ReactionRole.expires_at <= now))
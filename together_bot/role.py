@@ -1,10 +1,64 @@
 import asyncio
+import datetime
 import logging
 import re
-from typing import Dict, Optional
+from typing import Iterable, Iterator, NamedTuple, Optional
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+from sqlalchemy.exc import SQLAlchemyError
+
+from together_bot.models import reaction_role
+from together_bot.utils.db_toolkit import Session
+from together_bot.utils.paginator import MESSAGE_LIMIT, paginate, send_pages
+from together_bot.utils.sharding import owns_guild
+
+# 페이지 앞에 붙는 제목과 페이지 번호에 남겨둘 글자 수
+_PAGE_HEADER_SIZE = 200
+
+
+class ReactionRoleEntry(NamedTuple):
+    guild_id: int
+    role_id: int
+    expires_at: datetime.datetime
+
+
+class ReactionRoleIndex:
+    """
+    반응하면 역할을 받는 메세지의 id로 역할을 찾음.
+    메세지는 정해진 시간 후에 삭제되므로 만료된 항목은 찾을 때와 prune()에서 지움.
+    """
+
+    def __init__(self):
+        self.entries: dict[int, ReactionRoleEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, message_id: int, entry: ReactionRoleEntry):
+        self.entries[message_id] = entry
+
+    def get(
+        self, message_id: int, now: datetime.datetime
+    ) -> Optional[ReactionRoleEntry]:
+        entry = self.entries.get(message_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            del self.entries[message_id]
+            return None
+        return entry
+
+    # 만료된 항목을 지우고 지운 개수를 반환함.
+    def prune(self, now: datetime.datetime) -> int:
+        expired = [
+            message_id
+            for message_id, entry in self.entries.items()
+            if entry.expires_at <= now
+        ]
+        for message_id in expired:
+            del self.entries[message_id]
+        return len(expired)
 
 
 class Role(commands.Cog):
@@ -12,7 +66,17 @@ class Role(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.guild_message_role: Dict[discord.Guild, Dict[int, discord.Role]] = {}
+        # 봇이 재시작해도 반응으로 역할을 받을 수 있도록 DB에도 저장함.
+        self.reaction_roles = ReactionRoleIndex()
+
+    def cog_unload(self):
+        self.prune_reaction_roles.cancel()
+        return super().cog_unload()
+
+    async def prepare(self):
+        # 저장된 반응 역할을 먼저 읽어야 만료된 항목을 정리할 수 있음.
+        await self.load_reaction_roles()
+        self.prune_reaction_roles.start()
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
@@ -22,25 +86,77 @@ class Role(commands.Cog):
         else:
             logging.error("Role 'player' doesn't exist.")
 
+    # 메세지가 discord.py의 캐시에 없어도 받을 수 있도록 raw 이벤트를 씀.
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User):
-        if user.bot is True:
-            return
-
-        if reaction.message.guild is not None:
-            if message_role := self.guild_message_role.get(reaction.message.guild):
-                if role := message_role.get(reaction.message.id):
-                    await user.add_roles(role)
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if target := await self.__find_reaction_role(payload):
+            member, role = target
+            await member.add_roles(role)
 
     @commands.Cog.listener()
-    async def on_reaction_remove(self, reaction: discord.Reaction, user: discord.User):
-        if user.bot is True:
-            return
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if target := await self.__find_reaction_role(payload):
+            member, role = target
+            await member.remove_roles(role)
+
+    async def __find_reaction_role(
+        self, payload: discord.RawReactionActionEvent
+    ) -> Optional[tuple[discord.Member, discord.Role]]:
+        if payload.guild_id is None or str(payload.emoji) != self._agree_emoji:
+            return None
 
-        if reaction.message.guild is not None:
-            if message_role := self.guild_message_role.get(reaction.message.guild):
-                if role := message_role.get(reaction.message.id):
-                    await user.remove_roles(role)
+        entry = self.reaction_roles.get(payload.message_id, datetime.datetime.utcnow())
+        if entry is None or entry.guild_id != payload.guild_id:
+            return None
+
+        guild = self.bot.get_guild(payload.guild_id)
+        if guild is None:
+            return None
+        role = guild.get_role(entry.role_id)
+        if role is None:
+            return None
+        # reaction_remove 이벤트에는 member가 없고, member 캐시를 끄면 캐시에도 없음.
+        member = payload.member or guild.get_member(payload.user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(payload.user_id)
+            except discord.NotFound:
+                # 반응을 지운 뒤 서버를 나간 경우
+                return None
+        if member.bot:
+            return None
+        return member, role
+
+    @tasks.loop(minutes=10)
+    async def prune_reaction_roles(self):
+        now = datetime.datetime.utcnow()
+        pruned = self.reaction_roles.prune(now)
+        # tasks.loop는 DB 오류가 나면 멈추므로 기록만 하고 다음 실행 때 다시 지움.
+        try:
+            async with Session() as session:
+                await reaction_role.delete_expired(session, now)
+                await session.commit()
+        except SQLAlchemyError:
+            logging.exception("reaction role prune failed")
+        if pruned:
+            logging.info(
+                f"reaction role pruned: {pruned}, left: {len(self.reaction_roles)}"
+            )
+
+    async def load_reaction_roles(self):
+        async with Session() as session:
+            saved = await reaction_role.find_unexpired(
+                session, datetime.datetime.utcnow()
+            )
+        # 다른 process가 연결한 shard의 guild는 이 process로 반응 이벤트가 오지 않음.
+        for item in saved:
+            if not owns_guild(self.bot, item.guild_id):
+                continue
+            self.reaction_roles.add(
+                item.message_id,
+                ReactionRoleEntry(item.guild_id, item.role_id, item.expires_at),
+            )
+        logging.info(f"reaction role count: {len(self.reaction_roles)}")
 
     @commands.group(brief="역할 관련 명령어 모음.")
     async def role(self, ctx: commands.Context):
@@ -91,9 +207,15 @@ class Role(commands.Cog):
             )
             await message.add_reaction(self._agree_emoji)
 
-            if self.guild_message_role.get(ctx.guild) is None:
-                self.guild_message_role[ctx.guild] = {}
-            self.guild_message_role[ctx.guild][message.id] = role
+            entry = ReactionRoleEntry(
+                ctx.guild.id,
+                role.id,
+                datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+            )
+            self.reaction_roles.add(message.id, entry)
+            async with Session() as session:
+                reaction_role.save(session, message.id, *entry)
+                await session.commit()
 
             await ctx.message.delete(delay=delay)
 
@@ -119,15 +241,16 @@ class Role(commands.Cog):
         )
         await reply.add_reaction(self._agree_emoji)
 
-        def check(reaction: discord.Reaction, user: discord.User):
+        # 메세지 캐시를 끄거나 줄여도 동작하도록 raw 이벤트를 기다림.
+        def check(payload: discord.RawReactionActionEvent):
             return (
-                user == author
-                and str(reaction.emoji) == self._agree_emoji
-                and reaction.message.id == reply.id
+                payload.user_id == author.id
+                and str(payload.emoji) == self._agree_emoji
+                and payload.message_id == reply.id
             )
 
         try:
-            await ctx.bot.wait_for("reaction_add", check=check, timeout=60.0)
+            await ctx.bot.wait_for("raw_reaction_add", check=check, timeout=60.0)
             role = await ctx.guild.create_role(name=name, mentionable=True)
             await ctx.send(f"Create role {role.mention}")
         except asyncio.TimeoutError:
@@ -153,17 +276,23 @@ class Role(commands.Cog):
     async def cleanup(self, ctx: commands.Context):
         pass
 
-    @role.command(brief="특정 역할에 속한 사람들의 이름을 전부 출력함.", help="name에 보고 싶은 역할의 이름을 입력함.")
+    @role.command(
+        brief="특정 역할에 속한 사람들의 이름을 전부 출력함.",
+        help="name에 보고 싶은 역할의 이름을 입력함. 페이지가 여러 개면 반응으로 페이지를 넘김.",
+    )
     async def members(self, ctx: commands.Context, name: str):
         logging.info(f"Call members commands with name: `{name}`")
         guild = ctx.guild
 
         if role := discord.utils.get(guild.roles, name=name):
-            if len(role.members) == 0:
+            members = await self.__role_members(role)
+            pages = paginate(
+                (f"`{member.name}`" for member in members),
+                MESSAGE_LIMIT - _PAGE_HEADER_SIZE,
+            )
+            message = await send_pages(ctx, f"Members of `{role.name}`", pages)
+            if message is None:
                 await ctx.send(f"No one is in role `{role.name}`.")
-                return None
-            member_names = ", ".join([f"`{member.name}`" for member in role.members])
-            await ctx.send(f"Members of `{role.name}`: {member_names}")
 
     @members.error
     async def members_error(self, ctx: commands.Context, error: commands.CommandError):
@@ -173,6 +302,56 @@ class Role(commands.Cog):
             )
             await ctx.message.delete()
 
+    @role.command(brief="특정 역할에 속한 사람의 수를 출력함.", help="name에 보고 싶은 역할의 이름을 입력함.")
+    async def count(self, ctx: commands.Context, name: str):
+        logging.info(f"Call count commands with name: `{name}`")
+
+        if role := discord.utils.get(ctx.guild.roles, name=name):
+            # 수만 세기 위해 전체 멤버를 받지 않고 캐시된 멤버로 셈.
+            count = sum(1 for _ in iter_role_members(role))
+            if ctx.guild.chunked:
+                await ctx.send(f"`{role.name}` has {count} members.")
+            else:
+                await ctx.send(
+                    f"`{role.name}` has at least {count} members "
+                    "(only cached members are counted)."
+                )
+
+    async def __role_members(self, role: discord.Role) -> Iterator[discord.Member]:
+        guild = role.guild
+        # 시작할 때 멤버를 받지 않았으면 필요할 때 받음. members intent가 없으면 캐시만 봄.
+        if guild.chunked or not self.bot.intents.members:
+            return iter_role_members(role)
+        logging.info(f"Fetch members of guild `{guild.name}`")
+        # 멤버 캐시 설정에 따라 저장되지 않을 수 있으므로 받은 목록에서 찾음.
+        return iter_role_members(role, await guild.chunk())
+
+    @count.error
+    async def count_error(self, ctx: commands.Context, error: commands.CommandError):
+        if isinstance(error, commands.MissingRequiredArgument):
+            await ctx.send(
+                "To count members of the role : `role count {role}`", delete_after=10.0
+            )
+            await ctx.message.delete()
+
+
+def iter_role_members(
+    role: discord.Role, members: Optional[Iterable[discord.Member]] = None
+) -> Iterator[discord.Member]:
+    """
+    role.members와 같은 멤버를 반환하지만 리스트를 만들지 않고 하나씩 반환함.
+    members를 주지 않으면 캐시된 guild.members에서 찾음.
+    guild.members는 호출한 시점의 복사본이므로 중간에 멤버가 바뀌어도 안전함.
+    """
+    if members is None:
+        members = role.guild.members
+    if role.is_default():
+        yield from members
+        return
+    for member in members:
+        if role in member.roles:
+            yield member
+
 
 def setup(bot: commands.Bot):
     bot.add_cog(Role(bot))
@@ -0,0 +1,90 @@
+import functools
+import logging
+import math
+import os
+from collections import Counter
+from typing import Optional
+
+from discord.ext import commands
+
+from together_bot.utils.metrics import MetricsServer, metrics
+from together_bot.utils.sharding import shard_latencies
+
+# 설정하면 Prometheus 형식의 /metrics를 이 포트에서 제공함.
+_METRICS_PORT = os.getenv("METRICS_PORT")
+_METRICS_HOST = os.getenv("METRICS_HOST") or "127.0.0.1"
+
+
+class Stats(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot: commands.Bot = bot
+        self.server: Optional[MetricsServer] = None
+        metrics.shard_latencies = functools.partial(shard_latencies, bot)
+        if _METRICS_PORT:
+            # 여러 process로 실행하면 process마다 다음 포트를 씀.
+            port = int(_METRICS_PORT) + getattr(bot, "worker_index", 0)
+            self.server = MetricsServer(metrics, _METRICS_HOST, port)
+            bot.loop.create_task(self.__start_server())
+
+    def cog_unload(self):
+        if self.server is not None:
+            # cog_unload는 기다릴 수 없으므로 서버 종료는 task로 실행함.
+            self.bot.loop.create_task(self.server.stop())
+        return super().cog_unload()
+
+    async def __start_server(self):
+        try:
+            await self.server.start()
+        except OSError:
+            logging.exception("metrics server: failed to start")
+
+    @commands.Cog.listener()
+    async def on_shard_connect(self, shard_id: int):
+        metrics.shard_states[shard_id] = "connected"
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        logging.info(f"shard {shard_id}: ready")
+        metrics.shard_states[shard_id] = "ready"
+
+    # discord.py는 guild가 없는 shard에는 shard_ready를 보내지 않으므로 ready에서 함께 기록함.
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for shard_id, _ in shard_latencies(self.bot):
+            metrics.shard_states[shard_id] = "ready"
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id: int):
+        logging.info(f"shard {shard_id}: resumed")
+        metrics.shard_states[shard_id] = "ready"
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id: int):
+        logging.warning(f"shard {shard_id}: disconnected")
+        metrics.shard_states[shard_id] = "disconnected"
+
+    @commands.command(brief="명령어와 리스너가 걸린 시간, event loop 지연 시간을 보여줌")
+    @commands.is_owner()
+    async def stats(self, ctx: commands.Context):
+        await ctx.send(metrics.report())
+
+    @commands.command(brief="이 process가 연결한 shard의 상태와 heartbeat 응답 시간을 보여줌")
+    @commands.is_owner()
+    async def shards(self, ctx: commands.Context):
+        guild_counts = Counter(guild.shard_id for guild in self.bot.guilds)
+        lines = []
+        for shard_id, latency in shard_latencies(self.bot):
+            # AutoShardedBot이 아니면 shard 이벤트가 없으므로 봇의 상태를 씀.
+            state = metrics.shard_states.get(
+                shard_id, "ready" if self.bot.is_ready() else "connecting"
+            )
+            latency_text = f"{latency * 1000:.0f}ms" if math.isfinite(latency) else "-"
+            lines.append(
+                f"shard {shard_id}: {state}, latency {latency_text}, "
+                f"guilds {guild_counts[shard_id]}"
+            )
+        await ctx.send("\n".join(lines))
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Stats(bot))
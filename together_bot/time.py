@@ -1,5 +1,9 @@
+import asyncio
+import functools
 import logging
+import time as _time
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 import ntplib
 from dateutil.parser import ParserError, parse
@@ -8,12 +12,20 @@ from discord.ext import commands
 tz_pst = timezone(-timedelta(hours=8))
 tz_kst = timezone(timedelta(hours=9))
 TIME_SERVER = "pool.ntp.org"
+# NTP 서버와 시간 차이를 다시 재는 간격(초). 실패하면 RETRY_INTERVAL초 후에 다시 잼.
+SYNC_INTERVAL = 3600.0
+RETRY_INTERVAL = 60.0
 
 
 class Time(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
-        self.ntp_client = ntplib.NTPClient()
+        self.clock = NtpClock(TIME_SERVER)
+        self.clock.start(bot.loop)
+
+    def cog_unload(self):
+        self.clock.stop()
+        return super().cog_unload()
 
     @commands.group(brief="시간 관련 명령어 모음")
     async def time(self, ctx: commands.Context):
@@ -23,17 +35,19 @@ class Time(commands.Cog):
 
     @time.command(brief="현재 시간을 UTC와 PST로 보여줌.")
     async def now(self, ctx: commands.Context):
+        # NTP 서버에 매번 묻지 않고 미리 재둔 시간 차이로 계산함.
+        if self.clock.offset is None:
+            await ctx.send("NTP 서버에 연결할 수 없습니다. 나중에 다시 시도해주세요.")
+            return
+
         try:
-            response = self.ntp_client.request(TIME_SERVER, version=3)
-            dt = from_utc_timestamp(response.orig_time)
+            dt = self.clock.now()
             await ctx.send(
                 f"UTC: {to_utc_time_format(dt)}\n"
                 + f"PST: {to_pst_time_format(dt)}\n"
-                + f"이 정보는 `{TIME_SERVER}` 로부터 제공받았습니다."
+                + f"이 정보는 `{self.clock.server}` 로부터 "
+                + f"{self.clock.age():.0f}초 전에 맞춘 시간입니다."
             )
-        except ntplib.NTPException:
-            logging.error("NTP server doesn't respond")
-            await ctx.send("NTP 서버에 연결할 수 없습니다. 나중에 다시 시도해주세요.")
         except OverflowError:
             logging.error("Timestamp overflow")
             await ctx.send("잠시 후 다시 시도해주세요.")
@@ -68,6 +82,75 @@ class Time(commands.Cog):
             await ctx.send("date is too large")
 
 
+class NtpClock:
+    """
+    NTP 서버와 이 컴퓨터의 시간 차이(offset)를 주기적으로 재서 저장함.
+    ntplib은 응답을 기다리는 동안 멈추므로 executor에서 실행함.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        port: int = 123,
+        timeout: float = 5.0,
+        interval: float = SYNC_INTERVAL,
+        retry_interval: float = RETRY_INTERVAL,
+    ):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.ntp_client = ntplib.NTPClient()
+        self.offset: Optional[float] = None
+        # offset을 잰 시각. 시스템 시간이 바뀌어도 영향받지 않는 monotonic 시간임.
+        self.measured_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.__sync())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def measure(self) -> float:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None,
+            functools.partial(
+                self.ntp_client.request,
+                self.server,
+                version=3,
+                port=self.port,
+                timeout=self.timeout,
+            ),
+        )
+        self.offset = response.offset
+        self.measured_at = _time.monotonic()
+        return self.offset
+
+    async def __sync(self):
+        while True:
+            try:
+                offset = await self.measure()
+                logging.info(f"NTP offset: {offset:.3f}s")
+                delay = self.interval
+            except (ntplib.NTPException, OSError) as e:
+                logging.error(f"NTP server doesn't respond: {e}")
+                delay = self.retry_interval
+            await asyncio.sleep(delay)
+
+    def now(self) -> datetime:
+        return from_utc_timestamp(_time.time() + self.offset)
+
+    # offset을 잰 후 지난 시간(초)
+    def age(self) -> float:
+        return _time.monotonic() - self.measured_at
+
+
 def from_utc_timestamp(timestamp: int) -> datetime:
     return datetime.fromtimestamp(timestamp, timezone.utc)
 
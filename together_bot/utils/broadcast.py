@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Generic, Iterable, TypeVar
+
+import aiohttp
+import discord
+
+T = TypeVar("T")
+
+
+class BroadcastReport(Generic[T]):
+    def __init__(self):
+        self.sent = 0
+        # 지금은 보낼 수 없어서 다음에 다시 보낼 대상
+        self.skipped = 0
+        self.failed = 0
+        self.retried = 0
+        # 403, 404를 받아서 더 이상 보낼 수 없는 대상
+        self.dropped: list[T] = []
+        # 대상마다 재시도를 포함해서 보내는 데 걸린 시간
+        self.latencies: list[float] = []
+        self.elapsed_time = 0.0
+
+    def percentile(self, ratio: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+    def __str__(self) -> str:
+        return (
+            f"sent: {self.sent}, skipped: {self.skipped}, failed: {self.failed}, "
+            f"dropped: {len(self.dropped)}, "
+            f"retried: {self.retried}, elapsed time: {self.elapsed_time:.2f}s, "
+            f"latency p50: {self.percentile(0.5) * 1000:.0f}ms, "
+            f"p90: {self.percentile(0.9) * 1000:.0f}ms, "
+            f"p99: {self.percentile(0.99) * 1000:.0f}ms"
+        )
+
+
+async def broadcast(
+    targets: Iterable[T],
+    send: Callable[[T], Awaitable[object]],
+    concurrency: int = 10,
+    retries: int = 3,
+    retry_delay: float = 1.0,
+) -> BroadcastReport[T]:
+    """
+    targets마다 send를 실행하되 동시에 concurrency개까지만 실행함.
+    route별 rate limit은 discord.py의 HTTPClient가 bucket마다 기다려서 맞추고, 여기서는
+    전역 rate limit에 닿지 않도록 동시에 보내는 수만 제한함.
+    5xx 응답이나 연결 오류는 retries번까지 다시 보내고, 403, 404를 받은 대상은 dropped에 모음.
+    send가 False를 반환하면 지금은 보낼 수 없어서 건너뛴 대상으로 셈.
+    """
+    report: BroadcastReport[T] = BroadcastReport()
+    iterator = iter(targets)
+
+    async def worker():
+        # 다른 worker와 같은 iterator에서 다음 대상을 꺼내므로 대상을 미리 리스트로 만들지 않음.
+        for target in iterator:
+            await _send_with_retry(target, send, report, retries, retry_delay)
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    report.elapsed_time = time.perf_counter() - begin
+    return report
+
+
+async def _send_with_retry(
+    target: T,
+    send: Callable[[T], Awaitable[object]],
+    report: BroadcastReport[T],
+    retries: int,
+    retry_delay: float,
+):
+    begin = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            sent = await send(target)
+        except (discord.Forbidden, discord.NotFound) as e:
+            logging.warning(f"broadcast: drop {target}: {e}")
+            report.dropped.append(target)
+            return
+        except discord.HTTPException as e:
+            if e.status < 500:
+                logging.error(f"broadcast: failed to send to {target}: {e}")
+                report.failed += 1
+                return
+            error = e
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            error = e
+        else:
+            if sent is False:
+                report.skipped += 1
+                return
+            report.sent += 1
+            report.latencies.append(time.perf_counter() - begin)
+            return
+
+        if attempt < retries:
+            report.retried += 1
+            await asyncio.sleep(retry_delay * 2**attempt)
+
+    logging.error(f"broadcast: failed to send to {target}: {error}")
+    report.failed += 1
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Hashable, NamedTuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Entry(NamedTuple):
+    value: object
+    expires_at: float
+
+
+class TtlCache(Generic[K, V]):
+    """
+    ttl초 동안 값을 저장하고, max_size개를 넘으면 가장 오래 쓰지 않은 값부터 지움.
+    같은 키를 동시에 여러 번 요청하면 load는 한 번만 실행하고 결과를 나눠 가짐.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int = 128,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.entries: OrderedDict[K, _Entry] = OrderedDict()
+        self.inflight: dict[K, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        # 이미 실행 중인 load를 기다린 횟수
+        self.coalesced = 0
+
+    async def get_or_load(
+        self,
+        key: K,
+        load: Callable[[], Awaitable[V]],
+        should_cache: Callable[[V], bool] = lambda value: True,
+    ) -> V:
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires_at > self.clock():
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry.value
+            del self.entries[key]
+
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.get_running_loop().create_task(
+                self.__load(key, load, should_cache)
+            )
+            self.inflight[key] = task
+        # 기다리던 요청 하나가 취소되어도 다른 요청을 위해 load는 계속 실행함.
+        return await asyncio.shield(task)
+
+    async def __load(
+        self,
+        key: K,
+        load: Callable[[], Awaitable[V]],
+        should_cache: Callable[[V], bool],
+    ) -> V:
+        try:
+            value = await load()
+        finally:
+            del self.inflight[key]
+
+        if should_cache(value):
+            self.entries[key] = _Entry(value, self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"저장 {len(self.entries)}/{self.max_size}개, "
+            f"hit {self.hits}회, 합친 요청 {self.coalesced}회, miss {self.misses}회, "
+            f"hit rate {self.hit_rate():.1%}"
+        )
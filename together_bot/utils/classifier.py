@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import discord
+from discord.ext import commands
+
+# 같은 메세지를 여러 listener가 분류할 때 재사용하기 위해 최근 메세지의 분류 결과를 저장함.
+# discord.Message는 __slots__를 써서 속성을 추가할 수 없기 때문에 메세지 id로 저장함.
+_CACHE_SIZE = 256
+_cache: OrderedDict[int, "MessageClass"] = OrderedDict()
+
+
+class MessageClass(NamedTuple):
+    prefix: Optional[str] = None
+    command: Optional[commands.Command] = None
+
+    @property
+    def is_command(self) -> bool:
+        return self.command is not None
+
+
+async def classify(bot: commands.Bot, message: discord.Message) -> MessageClass:
+    """
+    메세지가 명령어인지 한 번만 확인하고 결과를 저장함.
+    bot.get_context()와 같은 방식으로 prefix와 명령어를 찾지만 Context를 만들지 않음.
+    """
+    result = _cache.get(message.id)
+    if result is None:
+        result = await _classify(bot, message)
+        _cache[message.id] = result
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+async def _classify(bot: commands.Bot, message: discord.Message) -> MessageClass:
+    # bot.process_commands()는 봇의 메세지를 처리하지 않음.
+    if message.author.bot:
+        return MessageClass()
+
+    prefix = await bot.get_prefix(message)
+    prefixes = (prefix,) if isinstance(prefix, str) else tuple(prefix)
+    content = message.content
+    invoked_prefix = discord.utils.find(content.startswith, prefixes)
+    if invoked_prefix is None:
+        return MessageClass()
+
+    rest = content[len(invoked_prefix) :]
+    if bot.strip_after_prefix:
+        rest = rest.lstrip()
+    # StringView.get_word()처럼 공백 전까지만 명령어 이름으로 읽음.
+    invoker = rest.split(maxsplit=1)[0] if rest[:1] and not rest[0].isspace() else ""
+    return MessageClass(invoked_prefix, bot.all_commands.get(invoker))
@@ -1,22 +1,138 @@
 import os
+import time
+from collections import deque
+from statistics import mean
+from typing import Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm.session import sessionmaker
 
-from together_bot.models import Base
+from together_bot.models import Base, import_all
 
 load_dotenv()
 
-Session = sessionmaker()
+# commit 후에도 객체의 값을 읽을 수 있도록 expire_on_commit을 끔.
+# AsyncSession에서는 만료된 값을 읽을 때 암묵적으로 DB에 접근할 수 없음.
+Session = sessionmaker(class_=AsyncSession, expire_on_commit=False)
 
+engine: Optional[AsyncEngine] = None
 
-def setup():
-    DATABASE_URL = os.getenv("DATABASE_URL")
+
+class PoolMetrics:
+    """
+    connection pool 이벤트를 세서 연결이 얼마나 자주 새로 만들어지고 끊기는지 보여줌.
+    checkout 시간은 pool 이벤트로 알 수 없으므로 probe()로 잰 값을 최근 history개만 저장함.
+    """
+
+    def __init__(self, history: int = 100):
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_times: deque[float] = deque(maxlen=history)
+
+    def attach(self, sync_engine: Engine):
+        event.listen(sync_engine, "connect", self.__on_connect)
+        event.listen(sync_engine, "close", self.__on_close)
+        event.listen(sync_engine, "invalidate", self.__on_invalidate)
+        event.listen(sync_engine, "soft_invalidate", self.__on_invalidate)
+        event.listen(sync_engine, "checkout", self.__on_checkout)
+        event.listen(sync_engine, "checkin", self.__on_checkin)
+
+    def __on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def __on_close(self, dbapi_connection, connection_record):
+        self.closes += 1
+
+    def __on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.invalidations += 1
+
+    def __on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+
+    def __on_checkin(self, dbapi_connection, connection_record):
+        self.checkins += 1
+
+    def __str__(self) -> str:
+        if self.checkout_times:
+            checkout_ms = [elapsed * 1000 for elapsed in self.checkout_times]
+            latency = (
+                f"평균 {mean(checkout_ms):.1f}ms, 최대 {max(checkout_ms):.1f}ms"
+                f"(최근 {len(checkout_ms)}회)"
+            )
+        else:
+            latency = "측정값 없음"
+        return (
+            f"checkout 시간: {latency}\n"
+            f"checkout {self.checkouts}회, checkin {self.checkins}회\n"
+            f"새 연결 {self.connects}회, 닫은 연결 {self.closes}회, "
+            f"무효화 {self.invalidations}회"
+        )
+
+
+metrics = PoolMetrics()
+
+
+def to_async_url(database_url: str) -> str:
     # Heroku의 URL을 SQLAlchemy에서 사용하기 위해 수정함.(PR #74)
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    # event loop를 막지 않는 asyncio driver를 씀.
+    for scheme, async_scheme in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if database_url.startswith(scheme):
+            return database_url.replace(scheme, async_scheme, 1)
+    return database_url
+
+
+def pool_options(database_url: str) -> dict:
+    # 오래 쉬는 동안 서버가 끊은 연결을 쓰지 않도록 checkout 때 확인하고 주기적으로 새로 만듦.
+    options = dict(
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() != "false",
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE") or "1800"),
+    )
+    # sqlite는 연결을 모아두지 않는 pool을 쓰므로 크기를 정할 수 없음.
+    if not database_url.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE") or "5"),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW") or "10"),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT") or "30"),
+        )
+    return options
+
 
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
+async def setup(database_url: Optional[str] = None):
+    global engine
+    DATABASE_URL = to_async_url(database_url or os.getenv("DATABASE_URL"))
+
+    engine = create_async_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+    metrics.attach(engine.sync_engine)
+    import_all()
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
     Session.configure(bind=engine)
+
+
+# 연결을 하나 빌려서 간단한 쿼리를 실행하는 데 걸린 시간을 잼.
+async def probe() -> float:
+    begin = time.perf_counter()
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    elapsed_time = time.perf_counter() - begin
+    metrics.checkout_times.append(elapsed_time)
+    return elapsed_time
+
+
+def pool_status() -> str:
+    if engine is None:
+        return "DB 연결 없음"
+    return engine.pool.status()
@@ -0,0 +1,103 @@
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Mapping, NamedTuple, Optional
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: CIMultiDictProxy
+    body: bytes
+    # 서버가 304를 응답해서 저장해둔 응답을 돌려줬는지 여부
+    from_cache: bool = False
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding)
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class HttpClient:
+    """
+    봇 전체에서 함께 쓰는 HTTP client. 연결을 재사용해서 요청마다 DNS 조회와 TLS handshake를 하지 않음.
+    ETag나 Last-Modified가 있는 응답은 저장해두고, 같은 URL을 다시 요청할 때
+    If-None-Match, If-Modified-Since를 보내서 바뀌지 않았으면 본문 없이 304를 받음.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=10, connect=5),
+        cache_size: int = 128,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, HttpResponse] = OrderedDict()
+        self.requests = 0
+        self.not_modified = 0
+        # ClientSession은 event loop 안에서 만들어야 하므로 처음 요청할 때 만듦.
+        self.__session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self.__session
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Mapping[str, str]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> HttpResponse:
+        request_url = URL(url).update_query(params) if params else URL(url)
+        key = str(request_url)
+        request_headers = CIMultiDict(headers or {})
+        cached = self.cache.get(key)
+        if cached is not None:
+            if "ETag" in cached.headers:
+                request_headers["If-None-Match"] = cached.headers["ETag"]
+            if "Last-Modified" in cached.headers:
+                request_headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        self.requests += 1
+        async with self.session.get(request_url, headers=request_headers) as response:
+            if response.status == 304 and cached is not None:
+                self.not_modified += 1
+                self.cache.move_to_end(key)
+                return cached._replace(from_cache=True)
+
+            result = HttpResponse(
+                response.status, response.headers, await response.read()
+            )
+
+        if result.status == 200 and (
+            "ETag" in result.headers or "Last-Modified" in result.headers
+        ):
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+            logging.info(
+                f"http client closed - requests: {self.requests}, "
+                f"not modified: {self.not_modified}"
+            )
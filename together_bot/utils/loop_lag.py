@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from collections import deque
+from statistics import mean
+from typing import Optional
+
+
+class LoopLagMonitor:
+    """
+    event loop가 다른 작업 때문에 늦게 깨어나는 시간(lag)을 주기적으로 잼.
+    interval만큼 잠든 후 실제로 깨어난 시각과 예정된 시각의 차이를 최근 history개만 저장함.
+    """
+
+    def __init__(self, interval: float = 0.5, history: int = 240):
+        self.interval = interval
+        self.samples: deque[float] = deque(maxlen=history)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self.__sample())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def __sample(self):
+        loop = asyncio.get_running_loop()
+        logging.info("loop lag monitor: start")
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - scheduled))
+
+    def percentile(self, ratio: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+    def __str__(self) -> str:
+        if not self.samples:
+            return "loop lag: 측정값 없음"
+        return (
+            f"loop lag(최근 {len(self.samples)}회): "
+            f"평균 {mean(self.samples) * 1000:.1f}ms, "
+            f"p50 {self.percentile(0.5) * 1000:.1f}ms, "
+            f"p99 {self.percentile(0.99) * 1000:.1f}ms, "
+            f"최대 {max(self.samples) * 1000:.1f}ms"
+        )
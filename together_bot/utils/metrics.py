@@ -0,0 +1,240 @@
+import functools
+import logging
+import math
+import resource
+import sys
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from aiohttp import web
+
+from together_bot.utils.loop_lag import LoopLagMonitor
+
+F = TypeVar("F", bound=Callable[..., Awaitable[object]])
+
+# 초 단위. 마지막 구간(+Inf)은 따로 셈.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    걸린 시간을 구간별로 셈. 값을 모두 저장하지 않으므로 오래 켜 두어도 메모리가 늘지 않음.
+    Prometheus의 histogram과 같은 구간 규칙(le: 이하)을 씀.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # 구간마다 들어온 수. 마지막 칸은 가장 큰 구간보다 큰 값
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # ratio번째 값이 들어 있는 구간의 상한. 가장 큰 구간을 넘으면 최댓값을 반환함.
+    def quantile(self, ratio: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = ratio * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def __str__(self) -> str:
+        if self.count == 0:
+            return "측정값 없음"
+        return (
+            f"{self.count}회, 평균 {self.sum / self.count * 1000:.1f}ms, "
+            f"p50 {self.quantile(0.5) * 1000:.0f}ms, "
+            f"p99 {self.quantile(0.99) * 1000:.0f}ms, "
+            f"최대 {self.max * 1000:.1f}ms"
+        )
+
+
+class BotMetrics:
+    """
+    명령어와 이벤트 리스너마다 걸린 시간, event loop lag을 모음.
+    명령어는 bot의 before_invoke, after_invoke에서, 리스너는 TogetherBot.add_listener에서 잼.
+    """
+
+    def __init__(self):
+        self.commands: dict[str, Histogram] = {}
+        self.listeners: dict[str, Histogram] = {}
+        self.loop_lag = LoopLagMonitor()
+        # shard마다 마지막 연결 상태(connected, ready, disconnected)
+        self.shard_states: dict[int, str] = {}
+        # shard마다 heartbeat 응답 시간을 반환하는 함수. Stats cog가 설정함.
+        self.shard_latencies: Callable[[], list[tuple[int, float]]] = list
+
+    def observe_command(self, name: str, elapsed_time: float):
+        self.commands.setdefault(name, Histogram()).observe(elapsed_time)
+
+    def observe_listener(self, name: str, elapsed_time: float):
+        self.listeners.setdefault(name, Histogram()).observe(elapsed_time)
+
+    def timed_listener(self, name: str) -> Callable[[F], F]:
+        """
+        코루틴 함수를 감싸서 걸린 시간을 name으로 기록함.
+        예외는 그대로 다시 던지므로 discord.py의 on_error가 받음.
+        """
+
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                begin = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe_listener(name, time.perf_counter() - begin)
+
+            return wrapper
+
+        return decorator
+
+    def report(self, limit: int = 10) -> str:
+        return "\n".join(
+            [
+                "**명령어**",
+                *_report_lines(self.commands, limit),
+                "**리스너**",
+                *_report_lines(self.listeners, limit),
+                str(self.loop_lag),
+                f"RSS: {rss_bytes() / 2**20:.1f}MiB",
+            ]
+        )
+
+    def to_prometheus(self) -> str:
+        lines: list[str] = []
+        _append_histograms(
+            lines,
+            "together_bot_command_latency_seconds",
+            "Time spent invoking a command.",
+            "command",
+            self.commands,
+        )
+        _append_histograms(
+            lines,
+            "together_bot_listener_latency_seconds",
+            "Time spent in an event listener.",
+            "listener",
+            self.listeners,
+        )
+        lines.append("# HELP together_bot_loop_lag_seconds Recent event loop lag.")
+        lines.append("# TYPE together_bot_loop_lag_seconds summary")
+        for ratio in (0.5, 0.99):
+            lines.append(
+                f'together_bot_loop_lag_seconds{{quantile="{ratio}"}} '
+                f"{self.loop_lag.percentile(ratio)}"
+            )
+        lines.append(f"together_bot_loop_lag_seconds_sum {sum(self.loop_lag.samples)}")
+        lines.append(
+            f"together_bot_loop_lag_seconds_count {len(self.loop_lag.samples)}"
+        )
+        lines.append("# HELP process_resident_memory_bytes Resident memory size.")
+        lines.append("# TYPE process_resident_memory_bytes gauge")
+        lines.append(f"process_resident_memory_bytes {rss_bytes()}")
+        lines.append("# HELP together_bot_shard_ready Whether a shard is ready.")
+        lines.append("# TYPE together_bot_shard_ready gauge")
+        for shard_id, state in sorted(self.shard_states.items()):
+            ready = int(state == "ready")
+            lines.append(f'together_bot_shard_ready{{shard="{shard_id}"}} {ready}')
+        lines.append(
+            "# HELP together_bot_shard_latency_seconds Gateway heartbeat latency."
+        )
+        lines.append("# TYPE together_bot_shard_latency_seconds gauge")
+        for shard_id, latency in self.shard_latencies():
+            if not math.isfinite(latency):
+                continue
+            lines.append(
+                f'together_bot_shard_latency_seconds{{shard="{shard_id}"}} {latency}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+# 전체 시간이 긴 순서대로 limit개만 보여줌.
+def _report_lines(histograms: dict[str, Histogram], limit: int) -> list[str]:
+    if not histograms:
+        return ["측정값 없음"]
+    ordered = sorted(histograms.items(), key=lambda item: item[1].sum, reverse=True)
+    return [f"`{name}`: {histogram}" for name, histogram in ordered[:limit]]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _append_histograms(
+    lines: list[str],
+    metric: str,
+    description: str,
+    label: str,
+    histograms: dict[str, Histogram],
+):
+    lines.append(f"# HELP {metric} {description}")
+    lines.append(f"# TYPE {metric} histogram")
+    for name, histogram in sorted(histograms.items()):
+        name = _escape_label(name)
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(
+                f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+
+class MetricsServer:
+    """
+    Prometheus가 읽을 수 있는 text format으로 /metrics를 제공함.
+    봇 밖으로 노출하지 않도록 기본적으로 localhost에서만 받음.
+    """
+
+    def __init__(self, metrics: BotMetrics, host: str, port: int):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"metrics server: listen on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def __handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.metrics.to_prometheus().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+
+def rss_bytes() -> int:
+    # Linux에서는 현재 RSS를 읽고, /proc이 없으면 지금까지의 최대 RSS를 씀.
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS는 byte, 그 외에는 KiB 단위임.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+metrics = BotMetrics()
@@ -0,0 +1,120 @@
+import asyncio
+from typing import Iterable, Iterator, Optional
+
+import discord
+from discord.ext import commands
+
+# 메세지 한 개에 보낼 수 있는 최대 글자 수
+MESSAGE_LIMIT = 2000
+
+PREVIOUS_EMOJI = "\N{Black Left-Pointing Triangle}"
+NEXT_EMOJI = "\N{Black Right-Pointing Triangle}"
+
+
+def paginate(items: Iterable[str], limit: int, separator: str = ", ") -> Iterator[str]:
+    """
+    items를 separator로 이어 붙이되 limit 글자를 넘지 않는 페이지로 나눠서 하나씩 반환함.
+    전체 문자열을 만들지 않고 한 페이지 분량만 들고 있음.
+    """
+    page: list[str] = []
+    size = 0
+    for item in items:
+        if len(item) > limit:
+            item = item[: limit - 1] + "…"
+        added = len(item) + (len(separator) if page else 0)
+        if page and size + added > limit:
+            yield separator.join(page)
+            page = [item]
+            size = len(item)
+        else:
+            page.append(item)
+            size += added
+    if page:
+        yield separator.join(page)
+
+
+class LazyPages:
+    """
+    필요한 페이지까지만 pages에서 꺼내고, 꺼낸 페이지는 이전 페이지로 돌아갈 수 있도록 보관함.
+    """
+
+    def __init__(self, pages: Iterable[str]):
+        self.pages = iter(pages)
+        self.cache: list[str] = []
+        self.exhausted = False
+
+    def get(self, index: int) -> Optional[str]:
+        while len(self.cache) <= index and not self.exhausted:
+            try:
+                self.cache.append(next(self.pages))
+            except StopIteration:
+                self.exhausted = True
+        if 0 <= index < len(self.cache):
+            return self.cache[index]
+        return None
+
+    # 끝까지 꺼내기 전에는 전체 페이지 수를 알 수 없음.
+    def total(self) -> Optional[int]:
+        return len(self.cache) if self.exhausted else None
+
+
+def _format_page(header: str, pages: LazyPages, index: int) -> str:
+    total = pages.total()
+    page_number = f"{index + 1}/{total if total is not None else '?'}"
+    return f"{header} ({page_number})\n{pages.get(index)}"
+
+
+async def send_pages(
+    ctx: commands.Context, header: str, pages: Iterable[str], timeout: float = 120.0
+) -> Optional[discord.Message]:
+    """
+    첫 페이지를 보내고, 페이지가 더 있으면 명령어를 보낸 사람이 반응으로 페이지를 넘길 수 있게 함.
+    timeout초 동안 반응이 없으면 페이지 넘기기를 끝냄.
+    pages의 각 페이지는 header와 합쳐서 MESSAGE_LIMIT을 넘지 않아야 함.
+    """
+    lazy_pages = LazyPages(pages)
+    if lazy_pages.get(0) is None:
+        return None
+
+    index = 0
+    # 다음 페이지가 있는지 알아야 하므로 두 번째 페이지까지 꺼냄.
+    has_next = lazy_pages.get(1) is not None
+    message = await ctx.send(_format_page(header, lazy_pages, index))
+    if not has_next:
+        return message
+
+    for emoji in (PREVIOUS_EMOJI, NEXT_EMOJI):
+        await message.add_reaction(emoji)
+
+    # 메세지 캐시를 끄거나 줄여도 동작하도록 raw 이벤트를 기다림.
+    def check(payload: discord.RawReactionActionEvent):
+        return (
+            payload.user_id == ctx.author.id
+            and payload.message_id == message.id
+            and str(payload.emoji) in (PREVIOUS_EMOJI, NEXT_EMOJI)
+        )
+
+    while True:
+        try:
+            payload = await ctx.bot.wait_for(
+                "raw_reaction_add", check=check, timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            break
+
+        step = 1 if str(payload.emoji) == NEXT_EMOJI else -1
+        if lazy_pages.get(index + step) is not None:
+            index += step
+            await message.edit(content=_format_page(header, lazy_pages, index))
+        try:
+            await message.remove_reaction(
+                payload.emoji, discord.Object(payload.user_id)
+            )
+        except discord.Forbidden:
+            pass
+
+    try:
+        await message.clear_reactions()
+    except discord.HTTPException:
+        pass
+    return message
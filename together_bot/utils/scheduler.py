@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, time, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+KST = timezone(timedelta(hours=9), "KST")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# at의 시간대 기준으로 now 다음에 처음 오는 at 시각을 반환함. at은 tzinfo가 있어야 함.
+def next_run_time(now: datetime, at: time) -> datetime:
+    local_now = now.astimezone(at.tzinfo)
+    candidate = datetime.combine(local_now.date(), at.replace(tzinfo=None), at.tzinfo)
+    if candidate <= local_now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        at: time,
+        callback: Callable[[], Awaitable[object]],
+        misfire_grace: timedelta,
+        catch_up: bool = False,
+        last_run: Optional[datetime] = None,
+    ):
+        self.name = name
+        self.at = at
+        self.callback = callback
+        self.misfire_grace = misfire_grace
+        self.catch_up = catch_up
+        self.task: Optional[asyncio.Task] = None
+        self.next_run: Optional[datetime] = None
+        self.last_run = last_run
+        self.runs = 0
+        self.missed = 0
+        self.caught_up = 0
+
+    def __str__(self) -> str:
+        next_run = (
+            self.next_run.astimezone(KST).strftime("%Y-%m-%d %H:%M:%S KST")
+            if self.next_run is not None
+            else "없음"
+        )
+        return (
+            f"{self.name}: 다음 실행 {next_run}, 실행 {self.runs}회, "
+            f"늦게 실행 {self.caught_up}회, 놓침 {self.missed}회"
+        )
+
+
+class Scheduler:
+    """
+    매일 정해진 시각에 작업을 실행함. 작업마다 다음 실행 시각까지 잠들었다가 깨어남.
+    오래 잠드는 동안 시계가 바뀔 수 있으므로 최대 max_sleep초씩 나눠 자면서 남은 시간을 다시 계산함.
+    event loop가 멈춰서 늦게 깨어나도 misfire_grace 안이면 실행하고, 넘으면 건너뜀.
+    catch_up인 작업은 넘어도 한 번 실행하고, 시작할 때 마지막 예정 시각의 실행을 놓쳤으면 바로 실행함.
+    """
+
+    def __init__(
+        self, clock: Callable[[], datetime] = utcnow, max_sleep: float = 600.0
+    ):
+        self.clock = clock
+        self.max_sleep = max_sleep
+        self.jobs: dict[str, Job] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        for job in self.jobs.values():
+            self.__start_job(job)
+
+    def stop(self):
+        for job in self.jobs.values():
+            if job.task is not None:
+                job.task.cancel()
+                job.task = None
+        self.loop = None
+
+    # 같은 이름의 작업이 있으면 바꿈. start() 전에 등록하면 start()할 때 시작함.
+    def every_day(
+        self,
+        name: str,
+        at: time,
+        callback: Callable[[], Awaitable[object]],
+        misfire_grace: timedelta = timedelta(minutes=10),
+        catch_up: bool = False,
+        last_run: Optional[datetime] = None,
+    ) -> Job:
+        """
+        last_run은 이전 process에서 마지막으로 실행한 시각이고 catch_up인 작업에서만 씀.
+        없으면 아직 실행하지 않은 것으로 봄.
+        """
+        if at.tzinfo is None:
+            raise ValueError("at must have tzinfo")
+
+        self.remove(name)
+        job = Job(name, at, callback, misfire_grace, catch_up, last_run)
+        self.jobs[name] = job
+        if self.loop is not None:
+            self.__start_job(job)
+        return job
+
+    def remove(self, name: str):
+        job = self.jobs.pop(name, None)
+        if job is not None and job.task is not None:
+            job.task.cancel()
+
+    def __start_job(self, job: Job):
+        if job.task is None or job.task.done():
+            job.task = self.loop.create_task(self.__run(job))
+
+    async def __run(self, job: Job):
+        job.next_run = next_run_time(self.clock(), job.at)
+        # 재시작이나 장애로 마지막 예정 시각의 실행을 놓쳤으면 다음 예정 시각까지 기다리지 않음.
+        previous_run = job.next_run - timedelta(days=1)
+        if job.catch_up and (job.last_run is None or job.last_run < previous_run):
+            logging.warning(
+                f"scheduler: job {job.name} catches up the run at {previous_run}"
+            )
+            job.caught_up += 1
+            await self.__execute(job)
+
+        while True:
+            await self.__sleep_until(job.next_run)
+
+            late = self.clock() - job.next_run
+            if late <= job.misfire_grace:
+                await self.__execute(job)
+            elif job.catch_up:
+                # 여러 번 놓쳤어도 한 번만 실행함.
+                job.caught_up += 1
+                logging.warning(f"scheduler: job {job.name} runs late by {late}")
+                await self.__execute(job)
+            else:
+                job.missed += 1
+                logging.warning(f"scheduler: job {job.name} missed by {late}")
+
+            # 실행이 오래 걸렸어도 같은 날 다시 실행하지 않도록 예정 시각 기준으로 계산함.
+            job.next_run = next_run_time(max(self.clock(), job.next_run), job.at)
+
+    async def __execute(self, job: Job):
+        job.runs += 1
+        job.last_run = self.clock()
+        try:
+            await job.callback()
+        except Exception:
+            logging.exception(f"scheduler: job {job.name} failed")
+
+    async def __sleep_until(self, target: datetime):
+        while True:
+            remaining = (target - self.clock()).total_seconds()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, self.max_sleep))
+
+    def __str__(self) -> str:
+        if not self.jobs:
+            return "예약된 작업 없음"
+        return "\n".join(map(str, self.jobs.values()))
+
+
+# 봇 전체에서 함께 쓰는 scheduler. bot.py에서 bot.loop로 시작함.
+scheduler = Scheduler()
+
+
+async def poll(
+    check: Callable[[], Awaitable[bool]],
+    interval: float,
+    jitter: float,
+    timeout: float,
+) -> bool:
+    """
+    check가 True를 반환하거나 timeout초가 지날 때까지 반복해서 실행함.
+    여러 봇이 같은 API를 동시에 부르지 않도록 interval에 0~jitter초를 더해서 기다림.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        if await check():
+            return True
+        delay = interval + random.uniform(0, jitter)
+        if loop.time() + delay > deadline:
+            return False
+        await asyncio.sleep(delay)
@@ -0,0 +1,55 @@
+import discord
+from discord.ext import commands
+
+# 같은 bucket의 IDENTIFY는 이 시간(초)에 한 번만 보낼 수 있음.
+IDENTIFY_INTERVAL = 5.0
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    # Discord가 guild를 shard에 나누는 규칙
+    return (guild_id >> 22) % shard_count
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """
+    shard를 processes개의 연속된 범위로 최대한 고르게 나눔.
+    shard보다 process가 많으면 남는 process는 만들지 않음.
+    """
+    processes = max(1, min(processes, shard_count))
+    size, remainder = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        stop = start + size + (1 if index < remainder else 0)
+        ranges.append(list(range(start, stop)))
+        start = stop
+    return ranges
+
+
+def owns_all_shards(bot: commands.Bot) -> bool:
+    # shard_ids가 없으면 이 process가 모든 shard에 연결함.
+    return getattr(bot, "shard_ids", None) is None
+
+
+# 이 process가 연결한 shard의 guild인지 확인함.
+def owns_guild(bot: commands.Bot, guild_id: int) -> bool:
+    if owns_all_shards(bot):
+        return True
+    return shard_id_for(guild_id, bot.shard_count) in bot.shard_ids
+
+
+# shard마다 heartbeat 응답 시간(초)을 반환함. 연결 전이면 nan임.
+def shard_latencies(bot: commands.Bot) -> list[tuple[int, float]]:
+    if isinstance(bot, discord.AutoShardedClient):
+        return bot.latencies
+    return [(bot.shard_id or 0, bot.latency)]
+
+
+async def fetch_recommended_shard_count(token: str) -> int:
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token, bot=True)
+        shard_count, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shard_count
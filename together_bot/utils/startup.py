@@ -0,0 +1,104 @@
+import sys
+import time
+from importlib.machinery import ModuleSpec
+from typing import Callable, NamedTuple, Optional
+
+
+class ImportTime(NamedTuple):
+    # 이 모듈만 실행한 시간
+    self_time: float
+    # 이 모듈이 import한 모듈까지 포함한 시간
+    cumulative: float
+
+
+class ImportProfiler:
+    """
+    -X importtime처럼 with 안에서 새로 import한 모듈마다 걸린 시간을 잼.
+    sys.meta_path 맨 앞에서 다른 finder가 찾은 spec을 받아 loader의 exec_module만 감쌈.
+    builtin, frozen 모듈처럼 loader가 클래스 자체인 모듈은 재지 않음.
+    """
+
+    def __init__(self):
+        self.times: dict[str, ImportTime] = {}
+        # import 중인 모듈마다 그 모듈이 import한 모듈의 시간 합
+        self.children: list[float] = []
+
+    def __enter__(self) -> "ImportProfiler":
+        sys.meta_path.insert(0, self)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.meta_path.remove(self)
+
+    def find_spec(self, fullname: str, path=None, target=None) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type):
+            if hasattr(loader, "exec_module"):
+                loader.exec_module = self.__timed(fullname, loader.exec_module)
+        return spec
+
+    def __timed(self, name: str, exec_module: Callable) -> Callable:
+        def timed_exec_module(module):
+            self.children.append(0.0)
+            begin = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - begin
+                children = self.children.pop()
+                if self.children:
+                    self.children[-1] += cumulative
+                self.times[name] = ImportTime(cumulative - children, cumulative)
+
+        return timed_exec_module
+
+    def report(self, limit: int = 20) -> str:
+        # 자신의 실행 시간이 긴 모듈부터 보여줌.
+        ordered = sorted(self.times.items(), key=lambda item: -item[1].self_time)
+        lines = [
+            f"import time - {len(self.times)} modules, self [ms] | cumulative [ms]"
+        ]
+        for name, import_time in ordered[:limit]:
+            lines.append(
+                f"{import_time.self_time * 1000:8.1f} | "
+                f"{import_time.cumulative * 1000:8.1f} | {name}"
+            )
+        return "\n".join(lines)
+
+
+class StartupReport:
+    """
+    cog마다 extension을 읽는 데(import와 setup) 걸린 시간과
+    연결 후 prepare()에 걸린 시간을 모음.
+    """
+
+    def __init__(self):
+        self.load_times: dict[str, float] = {}
+        self.prepare_times: dict[str, float] = {}
+        self.imports = ImportProfiler()
+
+    def __str__(self) -> str:
+        lines = ["cog load time - load [ms] | prepare [ms]"]
+        for name in sorted(
+            self.load_times.keys() | self.prepare_times.keys(),
+            key=lambda name: -self.load_times.get(name, 0.0),
+        ):
+            load_time = self.load_times.get(name)
+            prepare_time = self.prepare_times.get(name)
+            lines.append(
+                f"{_format_ms(load_time)} | {_format_ms(prepare_time)} | {name}"
+            )
+        return "\n".join(lines)
+
+
+def _format_ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:8.1f}" if seconds is not None else f"{'-':>8}"
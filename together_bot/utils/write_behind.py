@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from types import ModuleType
+from typing import Iterator, Optional
+
+from discord.ext import tasks
+
+from together_bot.utils.db_toolkit import Session
+
+
+class WriteBehindSet:
+    """
+    DB에 저장된 discord id 집합을 메모리에 들고 있고, 바뀐 내용은 모았다가 한 번에 저장함.
+    model은 find_all_discord_ids, save_all, delete_all 함수를 가진 together_bot.models의 모듈임.
+    저장 전에 같은 id를 여러 번 바꾸면 마지막 상태만 저장함.
+    여러 process가 같은 테이블을 바꾸면 reload_interval마다 DB를 다시 읽어서 맞춤.
+    """
+
+    def __init__(
+        self,
+        model: ModuleType,
+        flush_interval: float = 10.0,
+        reload_interval: Optional[float] = None,
+    ):
+        self.model = model
+        self.items: set[int] = set()
+        # 아직 저장하지 않은 id와 마지막 상태. True면 추가, False면 삭제.
+        self.pending: dict[int, bool] = {}
+        self.lock = asyncio.Lock()
+        self.flush_loop.change_interval(seconds=flush_interval)
+        self.reload_interval = reload_interval
+        if reload_interval is not None:
+            self.reload_loop.change_interval(seconds=reload_interval)
+
+    def __contains__(self, discord_id: int) -> bool:
+        return discord_id in self.items
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    # 추가했으면 True, 이미 있으면 False를 반환함.
+    def add(self, discord_id: int) -> bool:
+        if discord_id in self.items:
+            return False
+        self.items.add(discord_id)
+        self.pending[discord_id] = True
+        return True
+
+    # 삭제했으면 True, 원래 없었으면 False를 반환함.
+    def discard(self, discord_id: int) -> bool:
+        if discord_id not in self.items:
+            return False
+        self.items.discard(discord_id)
+        self.pending[discord_id] = False
+        return True
+
+    async def load(self):
+        async with Session() as session:
+            loaded = set(await self.model.find_all_discord_ids(session))
+        # 읽는 동안 바뀐 id는 바뀐 상태를 유지함.
+        added = {
+            discord_id for discord_id, is_added in self.pending.items() if is_added
+        }
+        self.items = (loaded - self.pending.keys()) | added
+
+    def start(self):
+        self.flush_loop.start()
+        if self.reload_interval is not None:
+            self.reload_loop.start()
+
+    # 남은 변경 사항을 저장하는 task를 반환함.
+    def stop(self) -> asyncio.Task:
+        self.flush_loop.cancel()
+        self.reload_loop.cancel()
+        return asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+
+            changes, self.pending = self.pending, {}
+            added = [discord_id for discord_id, is_added in changes.items() if is_added]
+            deleted = [
+                discord_id for discord_id, is_added in changes.items() if not is_added
+            ]
+            try:
+                async with Session() as session:
+                    await self.model.delete_all(session, deleted)
+                    await self.model.save_all(session, added)
+                    await session.commit()
+            except Exception:
+                # 저장하는 동안 다시 바뀐 id가 아니면 다음 저장 때 다시 시도함.
+                logging.exception(
+                    f"{self.model.__name__} flush failed: {len(changes)} changes"
+                )
+                for discord_id, is_added in changes.items():
+                    self.pending.setdefault(discord_id, is_added)
+
+    @tasks.loop(seconds=10.0)
+    async def flush_loop(self):
+        await self.flush()
+
+    @tasks.loop(seconds=60.0)
+    async def reload_loop(self):
+        # 저장 중인 변경 사항을 읽기 전 상태로 덮어쓰지 않도록 저장이 끝난 후에 읽음.
+        async with self.lock:
+            # tasks.loop는 DB 오류가 나면 멈추므로 기록만 하고 다음 간격에 다시 읽음.
+            try:
+                await self.load()
+            except Exception:
+                logging.exception(f"{self.model.__name__} reload failed")
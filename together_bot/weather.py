@@ -1,12 +1,14 @@
 import asyncio
-import json
 import logging
 import os
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-import aiohttp
 from discord.ext import commands
 
+from together_bot.utils.cache import TtlCache
+from together_bot.utils.http import HttpClient, HttpResponse
+
 _OPEN_WEATHER_API_BASE = "https://api.openweathermap.org/data/2.5/"
 
 _APP_ID = os.getenv("OPEN_WEATHER_API_KEY")
@@ -22,6 +24,14 @@ _OPEN_WEATHER_API_ENDPOINT = dict(
 )
 
 
+# 같은 도시의 날씨를 ttl초 동안 다시 요청하지 않음.
+_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL") or "600")
+_weather_cache: TtlCache[tuple, HttpResponse] = TtlCache(ttl=_CACHE_TTL, max_size=256)
+
+# 서울
+_DEFAULT_CITY_ID = "1835848"
+
+
 @commands.group(brief="Show weather")
 async def weather(ctx: commands.Context):
     if ctx.invoked_subcommand is None:
@@ -30,33 +40,135 @@ async def weather(ctx: commands.Context):
 
 @weather.command()
 async def current(ctx: commands.Context, *, city: Optional[str]):
-    async with aiohttp.ClientSession() as session:
-        url = _OPEN_WEATHER_API_ENDPOINT["current"]
-        query = {
-            "appid": _APP_ID,
-            "units": "metric",
-            "lang": "kr",
-        }
-
-        if city is None:
-            query |= {"id": "1835848"}
-        else:
-            query |= {"q": city}
-
-        async with session.get(url, params=query) as response:
-            logging.info("Response status : {}".format(response.status))
-            if response.status == 200:
-                content = await response.text()
-                res = json.loads(content)
-
-                name = res["name"]
-                weather = res["weather"][0]
-
-                weather_main = weather["main"]
-                weather_desc = weather["description"]
-                await ctx.send(f"{name} : {weather_main} - {weather_desc}")
-            elif response.status == 404:
-                await ctx.send(f"{city} is not found.")
+    response = await get_current_weather(ctx.bot.http_client, _APP_ID, city)
+    logging.info("Response status : {}".format(response.status))
+    if response.status == 200:
+        await ctx.send(format_current_weather(response.json()))
+    elif response.status == 404:
+        await ctx.send(f"{city} is not found.")
+
+
+@weather.command(brief="Show daily forecast")
+async def forecast(ctx: commands.Context, *, city: Optional[str]):
+    # one call API는 좌표로만 검색할 수 있으므로 현재 날씨에서 좌표를 얻음.
+    response = await get_current_weather(ctx.bot.http_client, _APP_ID, city)
+    if response.status == 404:
+        await ctx.send(f"{city} is not found.")
+    if response.status != 200:
+        return
+
+    current_weather = response.json()
+    coord = current_weather["coord"]
+    response = await get_forecast(
+        ctx.bot.http_client, _APP_ID, coord["lat"], coord["lon"]
+    )
+    logging.info("Response status : {}".format(response.status))
+    if response.status == 200:
+        await ctx.send(format_forecast(current_weather["name"], response.json()))
+
+
+@weather.command(name="cache", brief="Show weather cache stats")
+async def cache_stats(ctx: commands.Context):
+    await ctx.send(str(_weather_cache))
+
+
+# 캐시에서 찾고, 없으면 요청함. 같은 도시는 대소문자와 공백을 무시함.
+async def get_current_weather(
+    http_client: HttpClient,
+    app_id: str,
+    city: Optional[str] = None,
+    url: str = _OPEN_WEATHER_API_ENDPOINT["current"],
+    cache: TtlCache[tuple, HttpResponse] = _weather_cache,
+) -> HttpResponse:
+    if city is not None:
+        city = " ".join(city.split()).casefold()
+    return await cache.get_or_load(
+        ("current", city),
+        lambda: fetch_current_weather(http_client, app_id, city, url),
+        _is_cacheable,
+    )
+
+
+async def get_forecast(
+    http_client: HttpClient,
+    app_id: str,
+    lat: float,
+    lon: float,
+    url: str = _OPEN_WEATHER_API_ENDPOINT["one_call"],
+    cache: TtlCache[tuple, HttpResponse] = _weather_cache,
+) -> HttpResponse:
+    return await cache.get_or_load(
+        ("one_call", lat, lon),
+        lambda: fetch_forecast(http_client, app_id, lat, lon, url),
+        _is_cacheable,
+    )
+
+
+# 일시적인 오류는 저장하지 않음.
+def _is_cacheable(response: HttpResponse) -> bool:
+    return response.status in (200, 404)
+
+
+async def fetch_current_weather(
+    http_client: HttpClient,
+    app_id: str,
+    city: Optional[str] = None,
+    url: str = _OPEN_WEATHER_API_ENDPOINT["current"],
+) -> HttpResponse:
+    query = {
+        "appid": app_id,
+        "units": "metric",
+        "lang": "kr",
+    }
+
+    if city is None:
+        query |= {"id": _DEFAULT_CITY_ID}
+    else:
+        query |= {"q": city}
+
+    return await http_client.get(url, params=query)
+
+
+async def fetch_forecast(
+    http_client: HttpClient,
+    app_id: str,
+    lat: float,
+    lon: float,
+    url: str = _OPEN_WEATHER_API_ENDPOINT["one_call"],
+) -> HttpResponse:
+    query = {
+        "appid": app_id,
+        "units": "metric",
+        "lang": "kr",
+        "lat": str(lat),
+        "lon": str(lon),
+        "exclude": "current,minutely,hourly,alerts",
+    }
+    return await http_client.get(url, params=query)
+
+
+def format_current_weather(res: dict) -> str:
+    name = res["name"]
+    weather = res["weather"][0]
+
+    weather_main = weather["main"]
+    weather_desc = weather["description"]
+    return f"{name} : {weather_main} - {weather_desc}"
+
+
+def format_forecast(name: str, res: dict, days: int = 3) -> str:
+    # 날짜는 그 도시의 시간대로 표시함.
+    tz = timezone(timedelta(seconds=res["timezone_offset"]))
+    lines = [f"{name} 예보"]
+    for daily in res["daily"][:days]:
+        date = datetime.fromtimestamp(daily["dt"], tz)
+        weather = daily["weather"][0]
+        temp = daily["temp"]
+        lines.append(
+            f"{date:%m/%d} : {weather['main']} - {weather['description']}, "
+            f"{temp['min']:.0f}~{temp['max']:.0f}°C"
+        )
+    return "\n".join(lines)
 
 
 def setup(bot: commands.Bot):
@@ -68,28 +180,14 @@ def setup(bot: commands.Bot):
 
 # Use for test
 async def _main(app_id: str):
-    async with aiohttp.ClientSession() as session:
-        url = _OPEN_WEATHER_API_ENDPOINT["current"]
-        query = {
-            "appid": app_id,
-            "units": "metric",
-            "lang": "kr",
-        }
-
-        query |= {"id": "1835848"}
-
-        async with session.get(url, params=query) as response:
-            logging.info("Response status : %s", response.status)
-            if response.status == 200:
-                content = await response.text()
-                res = json.loads(content)
-
-                name = res["name"]
-                weather = res["weather"][0]
-
-                weather_main = weather["main"]
-                weather_desc = weather["description"]
-                print(f"{name} : {weather_main} - {weather_desc}")
+    http_client = HttpClient()
+    try:
+        response = await fetch_current_weather(http_client, app_id)
+        logging.info("Response status : %s", response.status)
+        if response.status == 200:
+            print(format_current_weather(response.json()))
+    finally:
+        await http_client.close()
 
 
 if __name__ == "__main__":
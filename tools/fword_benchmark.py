@@ -0,0 +1,309 @@
+import argparse
+import datetime
+import gc
+import json
+import pathlib
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+from together_bot.fword import (
+    FWORD_INDEX_PATH,
+    FWORD_LIST_PATH,
+    MATCHERS,
+    DoubleArrayTrie,
+    Prefilter,
+    normalize,
+    read_fwords,
+)
+
+# 채팅에 자주 나오는 단어. 비속어 사전의 단어가 우연히 포함되지 않도록 고름.
+_KOREAN_WORDS = [
+    "오늘",
+    "내일",
+    "진짜",
+    "그냥",
+    "근데",
+    "아니",
+    "우리",
+    "같이",
+    "게임",
+    "던전",
+    "레이드",
+    "파티",
+    "모집",
+    "몇시",
+    "저녁",
+    "먹고",
+    "올게",
+    "ㅋㅋㅋ",
+    "ㅎㅎ",
+    "ㅠㅠ",
+    "감사합니다",
+    "수고하셨습니다",
+    "날씨",
+    "좋네요",
+    "확인",
+    "했어요",
+    "잠깐만",
+    "기다려",
+]
+_ENGLISH_WORDS = [
+    "hello",
+    "thanks",
+    "party",
+    "raid",
+    "tonight",
+    "ready",
+    "lol",
+    "gg",
+    "nice",
+    "wait",
+    "brb",
+    "ok",
+    "check",
+    "discord",
+    "weather",
+]
+
+# 메세지 길이(글자 수)와 비속어가 들어간 메세지의 비율
+_LENGTHS = {"short": 20, "medium": 100, "long": 1000}
+_DENSITIES = {"clean": 0.0, "sparse": 0.05, "dense": 0.3}
+
+
+def init_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="비속어 탐색기의 생성 시간, 메모리, 처리량을 측정해서 JSON으로 기록함."
+    )
+    parser.add_argument("--fword-list", type=pathlib.Path, default=FWORD_LIST_PATH)
+    parser.add_argument(
+        "--index",
+        type=pathlib.Path,
+        default=FWORD_INDEX_PATH,
+        help="있으면 double_array를 이 파일에서 읽는 시간도 측정함.",
+    )
+    parser.add_argument(
+        "--matcher",
+        action="append",
+        choices=sorted(MATCHERS),
+        help="측정할 탐색기. 생략하면 전부 측정함.",
+    )
+    parser.add_argument("--messages", type=int, default=1000, help="말뭉치마다 만들 메세지 수")
+    parser.add_argument("--repeat", type=int, default=3, help="측정을 반복해서 가장 빠른 값을 씀.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="결과를 쓸 JSON 파일. 생략하면 stdout에 씀."
+    )
+    parser.add_argument(
+        "--baseline", type=pathlib.Path, help="이전 결과와 비교해서 바뀐 비율을 stderr에 씀."
+    )
+    return parser
+
+
+def generate_corpus(
+    fwords: list[str], length: int, density: float, count: int, rng: random.Random
+) -> list[str]:
+    """
+    한국어와 영어 단어를 섞어 length 글자 정도의 메세지를 count개 만듦.
+    density의 비율만큼 비속어를 하나씩 넣고, 그 중 일부는 띄어 쓰거나 대문자로 바꿔서 가림.
+    """
+    corpus = []
+    for _ in range(count):
+        words: list[str] = []
+        size = 0
+        while size < length:
+            pool = _KOREAN_WORDS if rng.random() < 0.7 else _ENGLISH_WORDS
+            word = rng.choice(pool)
+            words.append(word)
+            size += len(word) + 1
+        if rng.random() < density:
+            words.insert(
+                rng.randrange(len(words) + 1), _obfuscate(rng.choice(fwords), rng)
+            )
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def _obfuscate(word: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.2:
+        return " ".join(word)
+    if roll < 0.3:
+        return word.upper()
+    return word
+
+
+def best_of(repeat: int, run: Callable[[], object]) -> float:
+    elapsed_times = []
+    for _ in range(repeat):
+        gc.collect()
+        begin = time.perf_counter()
+        run()
+        elapsed_times.append(time.perf_counter() - begin)
+    return min(elapsed_times)
+
+
+def measure_build(name: str, build: Callable[[], object], repeat: int) -> dict:
+    elapsed_time = best_of(repeat, build)
+    # 시간을 잴 때는 tracemalloc이 느리게 만들기 때문에 메모리는 따로 한 번 더 만들어서 잼.
+    gc.collect()
+    tracemalloc.start()
+    search_tree = build()
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "name": name,
+        "elapsed_time": elapsed_time,
+        "memory_usage": search_tree.memory_usage(),
+        "allocated": allocated,
+        "peak": peak,
+    }
+
+
+def measure_scan(
+    matcher: str,
+    search_tree,
+    prefilter: Prefilter,
+    corpus_name: str,
+    corpus: list[str],
+    repeat: int,
+) -> dict:
+    chars = sum(map(len, corpus))
+
+    def scan():
+        return [search_tree.find_all_occurrences(message) for message in corpus]
+
+    # 봇의 on_message와 같은 순서: 정규화, 사전 필터, 탐색
+    def scan_prefiltered():
+        for message in corpus:
+            normalized = normalize(message, search_tree)
+            if prefilter.may_match(normalized.text):
+                search_tree.find_all_normalized(normalized.text)
+
+    elapsed_time = best_of(repeat, scan)
+    prefiltered_time = best_of(repeat, scan_prefiltered)
+    matched = sum(1 for occurrences in scan() if occurrences)
+    passed = sum(
+        1
+        for message in corpus
+        if prefilter.may_match(normalize(message, search_tree).text)
+    )
+    return {
+        "matcher": matcher,
+        "corpus": corpus_name,
+        "messages": len(corpus),
+        "chars": chars,
+        "matched_messages": matched,
+        "prefilter_passed": passed,
+        "elapsed_time": elapsed_time,
+        "messages_per_sec": len(corpus) / elapsed_time,
+        "chars_per_sec": chars / elapsed_time,
+        "prefiltered_elapsed_time": prefiltered_time,
+        "prefiltered_messages_per_sec": len(corpus) / prefiltered_time,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run(args: argparse.Namespace) -> dict:
+    fword_list: pathlib.Path = args.fword_list
+    matchers = args.matcher or sorted(MATCHERS)
+    fwords = list(read_fwords(fword_list))
+    rng = random.Random(args.seed)
+    corpora = {
+        f"{length_name}-{density_name}": generate_corpus(
+            fwords, length, density, args.messages, rng
+        )
+        for length_name, length in _LENGTHS.items()
+        for density_name, density in _DENSITIES.items()
+    }
+
+    builds = []
+    scans = []
+    for matcher in matchers:
+        builds.append(
+            measure_build(
+                matcher, lambda: MATCHERS[matcher].from_file(fword_list), args.repeat
+            )
+        )
+        search_tree = MATCHERS[matcher].from_file(fword_list)
+        prefilter = Prefilter(search_tree.words())
+        for corpus_name, corpus in corpora.items():
+            scans.append(
+                measure_scan(
+                    matcher, search_tree, prefilter, corpus_name, corpus, args.repeat
+                )
+            )
+    if "double_array" in matchers and args.index.exists():
+        builds.append(
+            measure_build(
+                "double_array_index",
+                lambda: DoubleArrayTrie.from_index(args.index, fword_list),
+                args.repeat,
+            )
+        )
+
+    return {
+        "revision": git_revision(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "word_count": len(fwords),
+        "build": builds,
+        "scan": scans,
+    }
+
+
+# 같은 항목의 시간을 이전 결과와 비교함. 양수는 느려진 것임.
+def compare(baseline: dict, result: dict) -> list[str]:
+    def index(entries: list[dict], keys: tuple[str, ...]) -> dict:
+        return {tuple(entry[key] for key in keys): entry for entry in entries}
+
+    lines = []
+    for section, keys in (("build", ("name",)), ("scan", ("matcher", "corpus"))):
+        old_entries = index(baseline.get(section, []), keys)
+        for key, entry in index(result[section], keys).items():
+            if (old := old_entries.get(key)) is None:
+                continue
+            change = entry["elapsed_time"] / old["elapsed_time"] - 1
+            lines.append(f"{section} {'/'.join(key)}: {change:+.1%}")
+    return lines
+
+
+def main() -> None:
+    parser = init_argparse()
+    args = parser.parse_args()
+    if not args.fword_list.exists():
+        parser.error(f"{args.fword_list} does not exist")
+
+    result = run(args)
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output + "\n", encoding="utf-8")
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        for line in compare(baseline, result):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
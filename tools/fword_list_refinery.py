@@ -2,14 +2,35 @@ import argparse
 import csv
 import pathlib
 
+from together_bot.fword import DoubleArrayTrie, read_fwords
+
 
 def init_argparse() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="비속어 데이터가 담긴 파일을 bot에서 읽을 수 있도록 수정함.")
     parser.add_argument("input_file", type=pathlib.Path)
-    parser.add_argument("output_file", type=pathlib.Path)
+    parser.add_argument(
+        "output_file",
+        type=pathlib.Path,
+        nargs="?",
+        help="생략하면 input_file을 수정하지 않고 --index 파일만 만듦.",
+    )
+    parser.add_argument(
+        "--index",
+        type=pathlib.Path,
+        help="bot이 시작할 때 mmap으로 읽을 double array 파일을 함께 만듦.",
+    )
     return parser
 
 
+# 가공된 csv로부터 bot이 그대로 읽을 수 있는 파일을 만듦.
+# 파일에 csv의 checksum이 들어가기 때문에 csv가 바뀌면 bot은 이 파일을 무시하고 csv를 읽음.
+def write_index(csv_file: pathlib.Path, index_file: pathlib.Path) -> None:
+    double_array = DoubleArrayTrie()
+    for word in read_fwords(csv_file):
+        double_array.insert(word)
+    double_array.save(index_file, csv_file)
+
+
 # 욕설 필터링 데이터 가공용 스크립트
 # csv에 행렬에 상관없이 들어있는 단어들의 앞뒤공백 제거와 대소문자 구분 제거를 한 후,
 # 콜론으로만 구분하도록 파일 크기를 줄임
@@ -17,6 +38,12 @@ def main() -> None:
     parser = init_argparse()
     args = parser.parse_args()
 
+    if args.output_file is None:
+        if args.index is None:
+            parser.error("output_file or --index is required")
+        write_index(args.input_file, args.index)
+        return
+
     ignored_fword = ["캐시", "캐쉬", "010"]
     # 여기 단어가 포함된 모든 비속어를 제거하고, 여기 단어만 추가함.
     # 이 단어가 포함된 것 만으로도 비속어이고, 접두어나 접미사 이외로도 쓸 수 있는 경우에 해당됨.
@@ -50,6 +77,9 @@ def main() -> None:
         for word in sorted_words:
             csv_writer.writerow([word])
 
+    if args.index is not None:
+        write_index(args.output_file, args.index)
+
 
 if __name__ == "__main__":
     main()